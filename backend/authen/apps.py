@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class AuthenConfig(AppConfig):
+    name = "backend.authen"
+    label = "authen"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,53 @@
+"""
+Per-request JWT authentication.
+
+The access token of a request is decoded, verified and resolved to a user
+once. The result is stored on the underlying ``HttpRequest``, so
+``IsBlacklisted``, ``permission_required`` and the views that need the
+requesting user all share a single signature check and user lookup.
+"""
+
+from django.utils.functional import SimpleLazyObject
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from backend.users.claims import PERMISSIONS_CLAIM
+
+AUTH_RESULT_ATTR = "_jwt_auth_result"
+
+
+class RequestCachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that memoizes its ``(user, validated_token)`` result
+    on the request object.
+    """
+
+    def authenticate(self, request):
+        # DRF wraps the Django request; cache on the inner one so that every
+        # wrapper created for the same request sees the result.
+        http_request = getattr(request, "_request", request)
+        if hasattr(http_request, AUTH_RESULT_ATTR):
+            return getattr(http_request, AUTH_RESULT_ATTR)
+
+        auth_result = super().authenticate(request)
+        setattr(http_request, AUTH_RESULT_ATTR, auth_result)
+        return auth_result
+
+    def get_user(self, validated_token):
+        # Tokens with permission claims can be authorized without the user
+        # row, so only load it once something actually needs it
+        get_user = super().get_user
+        if PERMISSIONS_CLAIM in validated_token:
+            return SimpleLazyObject(lambda: get_user(validated_token))
+        return get_user(validated_token)
+
+
+def authenticate_request(request):
+    """
+    Authenticates a request through its bearer token.
+
+    :param request: A Django ``HttpRequest`` or DRF ``Request``.
+    :return: A ``(user, validated_token)`` tuple, or None if the request
+        carries no token.
+    :raises InvalidToken: If the token fails validation.
+    """
+    return RequestCachedJWTAuthentication().authenticate(request)
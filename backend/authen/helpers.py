@@ -0,0 +1,27 @@
+import hashlib
+
+import jwt
+
+
+def hash_token(token):
+    """
+    Returns the hex encoded SHA-256 digest of a raw JWT.
+
+    Accepts the token either as ``str`` (as stored at login) or as ``bytes``
+    (as read from the ``Authorization`` header).
+    """
+    if isinstance(token, str):
+        token = token.encode("utf-8")
+    return hashlib.sha256(token).hexdigest()
+
+
+def get_token_jti(token):
+    """
+    Returns the ``jti`` claim of a raw JWT without verifying its signature,
+    or None if the value is not a decodable JWT.
+    """
+    try:
+        payload = jwt.decode(token, options={"verify_signature": False})
+    except jwt.InvalidTokenError:
+        return None
+    return payload.get("jti")
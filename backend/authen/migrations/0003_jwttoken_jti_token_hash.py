@@ -0,0 +1,45 @@
+# Generated by Django 5.0.7 on 2024-08-12 10:14
+
+from django.db import migrations, models
+
+from backend.authen.helpers import get_token_jti, hash_token
+
+
+def populate_jti_and_hash(apps, schema_editor):
+    JWTToken = apps.get_model("authen", "JWTToken")
+    seen = set()
+    for token in JWTToken.objects.all().iterator():
+        jti = get_token_jti(token.token)
+        token.jti = jti if jti not in seen else None
+        token.token_hash = hash_token(token.token)
+        token.save(update_fields=["jti", "token_hash"])
+        seen.add(jti)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("authen", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="jwttoken",
+            name="jti",
+            field=models.CharField(editable=False, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name="jwttoken",
+            name="token_hash",
+            field=models.CharField(default="", editable=False, max_length=64),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_jti_and_hash, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="jwttoken",
+            name="jti",
+            field=models.CharField(
+                editable=False, max_length=255, null=True, unique=True
+            ),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 
+from .helpers import get_token_jti, hash_token
+
 
 class JWTToken(models.Model):
     """
@@ -9,6 +11,8 @@ class JWTToken(models.Model):
         token_id (AutoField): The primary key for the token.
         user (ForeignKey): The user associated with the token.
         token (TextField): The actual token value.
+        jti (CharField): The ``jti`` claim of the token, used for lookups.
+        token_hash (CharField): SHA-256 digest of the token value.
         created_at (DateTimeField): The timestamp when the token was created.
         expires_at (DateTimeField): The timestamp when the token expires.
         is_blacklisted (BooleanField): Indicates if the token is blacklisted.
@@ -17,9 +21,16 @@ class JWTToken(models.Model):
     token_id = models.AutoField(primary_key=True)
     user = models.ForeignKey("users.User", on_delete=models.CASCADE)
     token = models.TextField()
+    jti = models.CharField(max_length=255, unique=True, null=True, editable=False)
+    token_hash = models.CharField(max_length=64, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
     is_blacklisted = models.BooleanField(default=False)
 
+    def save(self, *args, **kwargs):
+        self.jti = get_token_jti(self.token)
+        self.token_hash = hash_token(self.token)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Token ID: {self.token_id} - User: {self.user.username}"
@@ -1,7 +1,10 @@
 from rest_framework import permissions
-from rest_framework_simplejwt.authentication import JWTAuthentication
 
-from .models import JWTToken
+from backend.instrumentation import timed
+from backend.users.claims import PERMISSIONS_CLAIM, get_permissions_version
+
+from .authentication import authenticate_request
+from .revocation import is_token_revoked
 
 
 class IsBlacklisted(permissions.BasePermission):
@@ -16,10 +19,13 @@ class IsBlacklisted(permissions.BasePermission):
     """
 
     def has_permission(self, request, view):
+        with timed("auth"):
+            return self.check_token(request)
 
-        # Step 1: Authenticate the request using JWTAuthentication
-        jwt_auth = JWTAuthentication()
-        auth_result = jwt_auth.authenticate(request)
+    def check_token(self, request):
+        # Step 1: Authenticate the request, reusing the result if another
+        # check already did so for this request
+        auth_result = authenticate_request(request)
 
         # Step 2: If authentication fails or no valid token is found, log the failure
         if auth_result is None:
@@ -28,18 +34,17 @@ class IsBlacklisted(permissions.BasePermission):
         # Step 3: If authentication is successful, retrieve the user and token
         user, token = auth_result
 
-        # Step 4: Query the JWTToken model to check if the token is blacklisted
-        jwt_token = JWTToken.objects.filter(user=user, token=token).last()
-
-        if jwt_token:
-            # Step 5: If the token is blacklisted, deny access and log the event
-            if jwt_token.is_blacklisted:
-                return False
-            # Step 6: If the token is not blacklisted, grant access and log the event
-        else:
+        # Step 4: Tokens with permission claims are authenticated without
+        # loading the user, so deactivated users are caught by their cached
+        # permissions version, which is None for inactive users
+        if PERMISSIONS_CLAIM in token and (
+            get_permissions_version(token.get("user_id")) is None
+        ):
             return False
 
-        return True
+        # Step 5: Check the token against the revocation cache, falling back to
+        # the JWTToken table on a miss. Unknown and blacklisted tokens are denied.
+        return not is_token_revoked(token)
 
 
 class IsSuperUser(permissions.BasePermission):
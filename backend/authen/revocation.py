@@ -0,0 +1,86 @@
+"""
+Revocation lookups for JWT access tokens.
+
+Every authenticated request has to know whether its access token has been
+issued by us and not blacklisted since. The answer is looked up in the
+``JWTToken`` table through the unique ``jti`` column and verified against
+the stored token hash, then kept in the ``auth`` cache:
+
+- Tokens known to be valid are cached for ``VALID_TIMEOUT`` seconds, so the
+  common path costs no database round-trip.
+- Revoked tokens are cached for ``REVOKED_TIMEOUT`` seconds, bounded by the
+  token's own expiry.
+
+Changes to ``JWTToken`` rows evict the matching entry through the signal
+handlers in ``signals.py``. Other worker processes pick the change up once
+their cached entry times out.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .helpers import hash_token
+from .models import JWTToken
+
+DEFAULTS = {
+    "CACHE_ALIAS": "auth",
+    "VALID_TIMEOUT": 60,
+    "REVOKED_TIMEOUT": 3600,
+}
+
+VALID = "valid"
+REVOKED = "revoked"
+
+
+def get_setting(name):
+    return getattr(settings, "TOKEN_REVOCATION", {}).get(name, DEFAULTS[name])
+
+
+def get_cache():
+    return caches[get_setting("CACHE_ALIAS")]
+
+
+def get_cache_key(jti):
+    return f"jwt-revocation:{jti}"
+
+
+def is_token_revoked(token):
+    """
+    Checks whether a validated access token has been revoked.
+
+    :param token: A validated ``rest_framework_simplejwt`` token.
+    :return: True if the token is unknown or blacklisted, False otherwise.
+    """
+    jti = token.get("jti")
+    if not jti:
+        return True
+
+    cache = get_cache()
+    key = get_cache_key(jti)
+    state = cache.get(key)
+    if state is not None:
+        return state == REVOKED
+
+    revoked = not JWTToken.objects.filter(
+        jti=jti,
+        token_hash=hash_token(token.token),
+        is_blacklisted=False,
+    ).exists()
+
+    if revoked:
+        remaining = int(token.get("exp", 0) - time.time())
+        timeout = max(min(get_setting("REVOKED_TIMEOUT"), remaining), 1)
+        cache.set(key, REVOKED, timeout)
+    else:
+        cache.set(key, VALID, get_setting("VALID_TIMEOUT"))
+    return revoked
+
+
+def forget_token(jti):
+    """
+    Evicts the cached revocation state of a token.
+    """
+    if jti:
+        get_cache().delete(get_cache_key(jti))
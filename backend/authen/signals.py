@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import JWTToken
+from .revocation import forget_token
+
+
+@receiver(post_save, sender=JWTToken)
+@receiver(post_delete, sender=JWTToken)
+def invalidate_revocation_cache(sender, instance, **kwargs):
+    forget_token(instance.jti)
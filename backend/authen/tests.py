@@ -15,18 +15,26 @@ Test Cases:
 - test_get_jwt_token_details: Tests GET request to retrieve details of a JWT token.
 - test_update_jwt_token: Tests PUT request to update details of a JWT token.
 - test_delete_jwt_token: Tests DELETE request to delete a JWT token.
+- TokenRevocationTests: Tests the cached revocation lookup used by IsBlacklisted.
+- RequestAuthenticationTests: Tests that a request's token is verified only once.
 """
 
 import unittest
 from datetime import datetime, timedelta
 
+from django.core.cache import caches
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
 
+from backend.authen.authentication import authenticate_request
 from backend.authen.models import JWTToken
+from backend.authen.permissions import IsBlacklisted
+from backend.authen.revocation import is_token_revoked
 from backend.users.models import User
+from backend.users.serializers import UserLoginSerializer
 
 
 class JWTTokenTests(TestCase):
@@ -112,5 +120,72 @@ class JWTTokenTests(TestCase):
         self.assertFalse(JWTToken.objects.filter(pk=token.pk).exists())
 
 
+def issue_access_token(username):
+    User.objects.create(
+        username=username,
+        email=f"{username}@example.com",
+        password="Str0ng!Password",
+        role="staff",
+        first_name="Test",
+        last_name="User",
+    )
+    serializer = UserLoginSerializer(
+        data={"username": username, "password": "Str0ng!Password"}
+    )
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data["tokens"]["access_token"]
+
+
+class TokenRevocationTests(TestCase):
+    def setUp(self):
+        caches["auth"].clear()
+        self.token = AccessToken(issue_access_token("revoker").encode())
+
+    def test_valid_token_is_served_from_cache(self):
+        self.assertFalse(is_token_revoked(self.token))
+
+        with self.assertNumQueries(0):
+            self.assertFalse(is_token_revoked(self.token))
+
+    def test_blacklisting_invalidates_cache(self):
+        self.assertFalse(is_token_revoked(self.token))
+
+        jwt_token = JWTToken.objects.get(jti=self.token["jti"])
+        jwt_token.is_blacklisted = True
+        jwt_token.save()
+
+        self.assertTrue(is_token_revoked(self.token))
+
+    def test_unknown_token_is_revoked(self):
+        JWTToken.objects.all().delete()
+
+        self.assertTrue(is_token_revoked(self.token))
+
+
+class RequestAuthenticationTests(TestCase):
+    def setUp(self):
+        caches["auth"].clear()
+        self.access_token = issue_access_token("authenticated")
+
+    def test_request_is_authenticated_once(self):
+        request = APIRequestFactory().get(
+            "/", HTTP_AUTHORIZATION=f"Bearer {self.access_token}"
+        )
+
+        # Only the initial revocation and permissions version lookups;
+        # permission claims make the user row unnecessary
+        with self.assertNumQueries(2):
+            user, token = authenticate_request(request)
+            self.assertIs(authenticate_request(request)[0], user)
+            self.assertTrue(IsBlacklisted().has_permission(request, None))
+            self.assertTrue(IsBlacklisted().has_permission(request, None))
+
+    def test_missing_token_is_not_cached_as_user(self):
+        request = APIRequestFactory().get("/")
+
+        self.assertIsNone(authenticate_request(request))
+        self.assertFalse(IsBlacklisted().has_permission(request, None))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,344 @@
+"""
+Per-request performance instrumentation.
+
+`ServerTimingMiddleware` measures every request and breaks it down into
+phases, recorded with `timed(phase)` by the code doing the work:
+
+- auth: `IsBlacklisted` token checks.
+- db: every SQL query, through a database execute wrapper.
+- search: search lookups of `SearchAndLimitMixin`.
+- serialize: serializer `to_representation` calls.
+- render: DRF renderers.
+
+Phases overlap; a query run while serializing counts towards db and
+serialize. The breakdown and the query count are returned in a
+`Server-Timing` header.
+
+Each request is also added to its route's latency histogram, which with
+the per-phase totals lives in a memory-mapped file per process under
+`METRICS["DIRECTORY"]`. Files are only written by their own process, so
+no cross-process locking is needed; `/metrics` sums the files of all
+workers into the Prometheus text format. Files of processes that are no
+longer running are removed when the apps load, see `clear_stale_metrics`,
+so counters of previous runs are not added in.
+"""
+
+import glob
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+
+DEFAULTS = {
+    "DIRECTORY": os.path.join(tempfile.gettempdir(), "backend-metrics"),
+    "ALLOWED_IPS": ["127.0.0.1", "::1"],
+    # Distinct (route, method) pairs tracked per process
+    "MAX_ROUTES": 512,
+}
+
+PHASES = ("auth", "db", "search", "serialize", "render")
+
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# A slot is a route key followed by the request count, the latency sum,
+# the bucket counts, the phase sums and the query count
+SLOT = struct.Struct(f"<200s{2 + len(BUCKETS) + len(PHASES) + 1}d")
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def get_setting(name):
+    return getattr(settings, "METRICS", {}).get(name, DEFAULTS[name])
+
+
+class RequestTimings:
+    def __init__(self):
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.active = set()
+        self.queries = 0
+
+
+current_timings = ContextVar("current_timings", default=None)
+
+
+@contextmanager
+def timed(phase):
+    """
+    Adds the time spent in the block to `phase` of the current request.
+    Nested blocks of the same phase are only counted once.
+    """
+    timings = current_timings.get()
+    if timings is None or phase in timings.active:
+        yield
+        return
+
+    timings.active.add(phase)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.phases[phase] += time.perf_counter() - started
+        timings.active.discard(phase)
+
+
+def time_query(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is not None:
+        timings.queries += 1
+    with timed("db"):
+        return execute(sql, params, many, context)
+
+
+class MetricsFile:
+    """
+    The route histograms of one process, in a memory-mapped file.
+    """
+
+    def __init__(self, directory, max_routes):
+        os.makedirs(directory, exist_ok=True)
+        self.pid = os.getpid()
+        self.directory = directory
+        self.path = os.path.join(directory, f"metrics-{self.pid}.bin")
+        self.max_routes = max_routes
+        with open(self.path, "w+b") as file:
+            file.truncate(SLOT.size * max_routes)
+            self.map = mmap.mmap(file.fileno(), SLOT.size * max_routes)
+        self.slots = {}
+        self.lock = threading.Lock()
+
+    def observe(self, key, duration, timings):
+        with self.lock:
+            index = self.slots.get(key)
+            if index is None:
+                if len(self.slots) >= self.max_routes:
+                    return
+                index = self.slots[key] = len(self.slots)
+            offset = index * SLOT.size
+            _, *values = SLOT.unpack_from(self.map, offset)
+
+            values[0] += 1
+            values[1] += duration
+            for position, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    values[2 + position] += 1
+                    break
+            for position, phase in enumerate(PHASES):
+                values[2 + len(BUCKETS) + position] += timings.phases[phase]
+            values[-1] += timings.queries
+            SLOT.pack_into(self.map, offset, key.encode("utf-8"), *values)
+
+
+metrics_file = None
+metrics_file_lock = threading.Lock()
+
+
+def is_current(metrics_file):
+    # Forked workers must not write to their parent's file
+    return (
+        metrics_file is not None
+        and metrics_file.pid == os.getpid()
+        and metrics_file.directory == get_setting("DIRECTORY")
+    )
+
+
+def get_metrics_file():
+    global metrics_file
+    if not is_current(metrics_file):
+        with metrics_file_lock:
+            if not is_current(metrics_file):
+                metrics_file = MetricsFile(
+                    get_setting("DIRECTORY"), get_setting("MAX_ROUTES")
+                )
+    return metrics_file
+
+
+def record_request(route, method, duration, timings):
+    get_metrics_file().observe(f"{route}\t{method}", duration, timings)
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def clear_stale_metrics(directory=None):
+    """
+    Removes the metrics files of processes that are no longer running.
+
+    :return: The number of files removed.
+    """
+    removed = 0
+    pattern = os.path.join(directory or get_setting("DIRECTORY"), "metrics-*.bin")
+    for path in glob.glob(pattern):
+        pid = os.path.basename(path)[len("metrics-") : -len(".bin")]
+        if pid.isdigit() and not is_running(int(pid)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Removed by another process starting
+                continue
+            removed += 1
+    return removed
+
+
+def collect_metrics(directory=None):
+    """
+    Sums the route histograms of every process.
+
+    :return: A {(route, method): values} dict, with values laid out as in
+        `SLOT` after the key.
+    """
+    totals = {}
+    pattern = os.path.join(directory or get_setting("DIRECTORY"), "metrics-*.bin")
+    for path in glob.glob(pattern):
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size < SLOT.size:
+                continue
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for offset in range(0, len(data) - SLOT.size + 1, SLOT.size):
+                    key, *values = SLOT.unpack_from(data, offset)
+                    key = key.rstrip(b"\0").decode("utf-8")
+                    if not key:
+                        break
+                    route, method = key.split("\t")
+                    total = totals.setdefault((route, method), [0.0] * len(values))
+                    for position, value in enumerate(values):
+                        total[position] += value
+    return totals
+
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(**labels):
+    return (
+        "{"
+        + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels.items())
+        + "}"
+    )
+
+
+def render_metrics(totals):
+    """
+    Formats collected metrics in the Prometheus text exposition format.
+    """
+    duration = [
+        "# HELP http_request_duration_seconds Request latency by route.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    phases = [
+        "# HELP http_request_phase_seconds_total Time spent per request phase.",
+        "# TYPE http_request_phase_seconds_total counter",
+    ]
+    queries = [
+        "# HELP http_request_queries_total SQL queries run by requests.",
+        "# TYPE http_request_queries_total counter",
+    ]
+    for (route, method), values in sorted(totals.items()):
+        count, total, *rest = values
+        buckets = rest[: len(BUCKETS)]
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS, buckets):
+            cumulative += bucket
+            labels = format_labels(route=route, method=method, le=str(bound))
+            duration.append(
+                f"http_request_duration_seconds_bucket{labels} {cumulative:g}"
+            )
+        labels = format_labels(route=route, method=method)
+        duration += [
+            "http_request_duration_seconds_bucket"
+            + format_labels(route=route, method=method, le="+Inf")
+            + f" {count:g}",
+            f"http_request_duration_seconds_sum{labels} {total:.6f}",
+            f"http_request_duration_seconds_count{labels} {count:g}",
+        ]
+        for phase, value in zip(PHASES, rest[len(BUCKETS) :]):
+            phase_labels = format_labels(route=route, method=method, phase=phase)
+            phases.append(f"http_request_phase_seconds_total{phase_labels} {value:.6f}")
+        queries.append(f"http_request_queries_total{labels} {rest[-1]:g}")
+    return "\n".join(duration + phases + queries) + "\n"
+
+
+def metrics(request):
+    """
+    Serves the metrics of all workers to local scrapers.
+    """
+    if request.META.get("REMOTE_ADDR") not in get_setting("ALLOWED_IPS"):
+        return HttpResponseForbidden("Metrics are only served to allowed hosts.")
+    return HttpResponse(
+        render_metrics(collect_metrics()), content_type=METRICS_CONTENT_TYPE
+    )
+
+
+class ServerTimingMiddleware:
+    """
+    Times every request, adds a `Server-Timing` header and records the
+    request in its route's histogram.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(time_query))
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        duration = time.perf_counter() - started
+
+        entries = [
+            f"{phase};dur={seconds * 1000:.1f}"
+            for phase, seconds in timings.phases.items()
+            if seconds
+        ]
+        entries.append(f'queries;desc="{timings.queries}"')
+        entries.append(f"total;dur={duration * 1000:.1f}")
+        response["Server-Timing"] = ", ".join(entries)
+
+        match = request.resolver_match
+        route = match.view_name if match else "unmatched"
+        if route != "metrics":
+            record_request(route, request.method, duration, timings)
+        return response
+
+
+class TimedSerializerMixin:
+    def to_representation(self, instance):
+        with timed("serialize"):
+            return super().to_representation(instance)
+
+
+class TimedRendererMixin:
+    def render(self, *args, **kwargs):
+        with timed("render"):
+            return super().render(*args, **kwargs)
+
+
+class TimedJSONRenderer(TimedRendererMixin, JSONRenderer):
+    pass
+
+
+class TimedBrowsableAPIRenderer(TimedRendererMixin, BrowsableAPIRenderer):
+    pass
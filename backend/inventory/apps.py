@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+
+class InventoryConfig(AppConfig):
+    name = "backend.inventory"
+    label = "inventory"
+
+    def ready(self):
+        from backend.instrumentation import clear_stale_metrics
+
+        from . import signals  # noqa: F401
+
+        clear_stale_metrics()
@@ -0,0 +1,336 @@
+"""
+Latency benchmarks of the inventory API, used by the `benchmark_api` command.
+
+Each scenario sends one kind of request through the Django test client, so
+the full middleware, authentication and permission stack is measured
+without a network in between. Scenarios run at every dataset size; the
+database grows to each size with `generate_dataset` rows before its
+scenarios run.
+
+Results are plain dicts, one per size and scenario, with latency
+percentiles in milliseconds and the sequential throughput in requests per
+second. `compare_results` flags results whose p95 latency grew by more
+than a threshold against a baseline run.
+
+Searches use the database backend, see db_search.py, so that they need no
+index files outside the benchmark database. Metrics are recorded in a
+temporary directory, see instrumentation.py, not in those of the server.
+
+Scenarios run with the response cache off, so lists are computed on every
+request. With `cached`, the scenarios the response cache serves also run
+with it on, against an inventory cache in a temporary directory; those
+results are marked ``"cached": true``.
+"""
+
+import platform
+import random
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from backend.test_runner import temporary_metrics_directory
+from backend.users.models import User
+from backend.users.serializers import UserLoginSerializer
+from backend.users.utils import allPermissions
+
+from . import db_search
+from .helpers.dataset import create_dataset
+from .models import Device
+
+BENCHMARK_USERNAME = "benchmark"
+BENCHMARK_PASSWORD = "Str0ng!Password"
+
+# Devices edited per batch_operations request
+BATCH_SIZE = 50
+
+# p95 regressions smaller than this are treated as noise
+MIN_REGRESSION_MS = 1.0
+
+
+class BenchmarkContext:
+    """
+    State shared by the scenarios: an authenticated client and a sample of
+    device ids to retrieve and edit.
+    """
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.client = Client()
+        self.device_ids = []
+        self.edit_count = 0
+
+        if not User.objects.filter(username=BENCHMARK_USERNAME).exists():
+            User.objects.create(
+                username=BENCHMARK_USERNAME,
+                email=f"{BENCHMARK_USERNAME}@example.com",
+                password=BENCHMARK_PASSWORD,
+                role="staff",
+                first_name="Bench",
+                last_name="Mark",
+                permissions=allPermissions,
+            )
+        serializer = UserLoginSerializer(
+            data={"username": BENCHMARK_USERNAME, "password": BENCHMARK_PASSWORD}
+        )
+        serializer.is_valid(raise_exception=True)
+        self.authorization = (
+            f"Bearer {serializer.validated_data['tokens']['access_token']}"
+        )
+
+    def refresh(self, sample_size=1000):
+        self.device_ids = [
+            str(pk)
+            for pk in Device.objects.order_by("?").values_list("pk", flat=True)[
+                :sample_size
+            ]
+        ]
+
+    def get(self, path, params=None):
+        return self.client.get(path, params, HTTP_AUTHORIZATION=self.authorization)
+
+
+def device_list(context):
+    return context.get(reverse("device-list"), {"page_size": 50})
+
+
+def device_retrieve(context):
+    device_id = context.rng.choice(context.device_ids)
+    return context.get(reverse("device-detail", args=[device_id]))
+
+
+def device_filter(context):
+    return context.get(
+        reverse("device-list"),
+        {"type": "Laptop", "physical_condition": "Good", "page_size": 50},
+    )
+
+
+def device_search(context):
+    return context.get(reverse("device-list"), {"search": "Dell", "page_size": 50})
+
+
+def device_order(context):
+    return context.get(
+        reverse("device-list"), {"ordering": "-date_received", "page_size": 50}
+    )
+
+
+def batch_edit(context):
+    context.edit_count += 1
+    device_ids = context.rng.sample(
+        context.device_ids, min(BATCH_SIZE, len(context.device_ids))
+    )
+    return context.client.patch(
+        f"{reverse('batch-operations')}?model=device",
+        {
+            "objects": [
+                {"id": device_id, "notes": f"Benchmark edit {context.edit_count}"}
+                for device_id in device_ids
+            ]
+        },
+        content_type="application/json",
+        HTTP_AUTHORIZATION=context.authorization,
+    )
+
+
+def login(context):
+    return context.client.post(
+        reverse("user-login"),
+        {"username": BENCHMARK_USERNAME, "password": BENCHMARK_PASSWORD},
+        content_type="application/json",
+    )
+
+
+def protected_call(context):
+    # A small unpaginated response, so authentication and IsBlacklisted
+    # dominate the latency
+    return context.get(reverse("location-list"), {"fields": "location_id"})
+
+
+SCENARIOS = {
+    "device-list": device_list,
+    "device-retrieve": device_retrieve,
+    "device-filter": device_filter,
+    "device-search": device_search,
+    "device-order": device_order,
+    "batch-edit": batch_edit,
+    "login": login,
+    "protected-call": protected_call,
+}
+
+# Scenarios served by the response cache, see response_cache.py
+CACHED_SCENARIOS = ("device-list", "device-filter", "device-order", "protected-call")
+
+
+def summarize(timings_ns):
+    """
+    Returns latency percentiles in milliseconds and the throughput of a
+    list of sequential request durations in nanoseconds.
+    """
+    timings = sorted(ns / 1e6 for ns in timings_ns)
+    if len(timings) > 1:
+        percentiles = statistics.quantiles(timings, n=100, method="inclusive")
+    else:
+        percentiles = timings * 99
+    return {
+        "p50_ms": round(percentiles[49], 3),
+        "p95_ms": round(percentiles[94], 3),
+        "p99_ms": round(percentiles[98], 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "throughput_rps": round(len(timings) / (sum(timings) / 1000), 1),
+    }
+
+
+def run_scenario(context, name, requests, warmup):
+    """
+    Sends `warmup` untimed and `requests` timed requests of scenario `name`.
+    """
+    scenario = SCENARIOS[name]
+    for _ in range(warmup):
+        scenario(context)
+
+    timings = []
+    errors = 0
+    for _ in range(requests):
+        started = time.perf_counter_ns()
+        response = scenario(context)
+        timings.append(time.perf_counter_ns() - started)
+        if response.status_code >= 400:
+            errors += 1
+    return {"scenario": name, "requests": requests, "errors": errors} | summarize(
+        timings
+    )
+
+
+def grow_dataset(size, seed):
+    """
+    Adds generated devices until the database holds `size` of them.
+    """
+    missing = size - Device.objects.count()
+    if missing > 0:
+        create_dataset(
+            seed, missing, locations=20, donors=200, shipments=max(missing // 10, 1)
+        )
+        for model in db_search.SEARCH_MODELS:
+            db_search.rebuild_search_documents(model)
+
+
+def set_response_cache(enabled):
+    return override_settings(
+        INVENTORY_RESPONSE_CACHE={
+            **getattr(settings, "INVENTORY_RESPONSE_CACHE", {}),
+            "ENABLED": enabled,
+        }
+    )
+
+
+@contextmanager
+def shared_response_cache():
+    """
+    Turns the response cache on, with the inventory cache in a temporary
+    directory: lists are only cached while generations are shared.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        inventory_cache = {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": directory,
+        }
+        with override_settings(
+            CACHES={**settings.CACHES, "inventory": inventory_cache}
+        ):
+            with set_response_cache(True):
+                yield
+
+
+def run_benchmarks(
+    sizes, scenarios=None, requests=50, warmup=5, progress=None, cached=False
+):
+    """
+    Runs `scenarios` (all by default) at each dataset size in `sizes`.
+
+    Must run against a disposable database; rows are added and edited.
+
+    :param progress: Optional callable, called with each result.
+    :param cached: Whether to also run the `CACHED_SCENARIOS` among
+        `scenarios` with the response cache on.
+    :return: The results document.
+    """
+    scenarios = scenarios or list(SCENARIOS)
+    context = BenchmarkContext()
+    results = []
+
+    def run(size, name, cached):
+        result = {"size": size, "cached": cached} | run_scenario(
+            context, name, requests, warmup
+        )
+        results.append(result)
+        if progress:
+            progress(result)
+
+    with temporary_metrics_directory(), set_response_cache(False):
+        with override_settings(INVENTORY_SEARCH={"BACKEND": "database"}):
+            for step, size in enumerate(sorted(sizes)):
+                # Dataset seeds only need to differ from each other
+                grow_dataset(size, seed=1000 + step)
+                context.refresh()
+                for name in scenarios:
+                    run(size, name, cached=False)
+                if cached:
+                    with shared_response_cache():
+                        for name in scenarios:
+                            if name in CACHED_SCENARIOS:
+                                run(size, name, cached=True)
+
+    return {
+        "created_at": timezone.now().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+        },
+        "requests": requests,
+        "results": results,
+    }
+
+
+def compare_results(results, baseline, threshold=0.2):
+    """
+    Compares the p95 latencies of `results` with those of `baseline`, two
+    results documents.
+
+    :return: A list of regressions; results missing from the baseline are
+        not compared.
+    """
+
+    def get_key(result):
+        return result["size"], result["scenario"], result.get("cached", False)
+
+    baseline_p95 = {get_key(result): result["p95_ms"] for result in baseline["results"]}
+    regressions = []
+    for result in results["results"]:
+        previous = baseline_p95.get(get_key(result))
+        if previous is None:
+            continue
+        if (
+            result["p95_ms"] > previous * (1 + threshold)
+            and result["p95_ms"] - previous >= MIN_REGRESSION_MS
+        ):
+            regressions.append(
+                {
+                    "size": result["size"],
+                    "scenario": result["scenario"],
+                    "cached": result.get("cached", False),
+                    "baseline_p95_ms": previous,
+                    "p95_ms": result["p95_ms"],
+                    "change": round(result["p95_ms"] / previous - 1, 3),
+                }
+            )
+    return regressions
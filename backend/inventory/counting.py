@@ -0,0 +1,138 @@
+"""
+Count strategies for paginated list responses.
+
+Strategies:
+- ExactCount ("exact"): Runs COUNT(*) on every request.
+- CachedCount ("cached"): Caches the exact count per query signature. The
+  cache key includes the generations of every table the query reads, so
+  writes to any of them invalidate it; entries also expire after
+  `COUNT_CACHE_TIMEOUT` seconds.
+- EstimatedCount ("estimated"): Reads the row count of unfiltered lists from
+  database statistics (MySQL `information_schema.TABLES`, SQLite
+  `sqlite_stat1`). Filtered lists, tables without statistics and tables
+  smaller than `ESTIMATE_THRESHOLD` rows use the cached count instead.
+
+Each strategy returns the count together with the name of the strategy that
+actually produced it.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.db.models import QuerySet
+
+from .generations import CACHE_ALIAS, get_generations, get_queryset_tables
+
+DEFAULTS = {
+    "COUNT_STRATEGY": "exact",
+    "COUNT_CACHE_TIMEOUT": 300,
+    "ESTIMATE_THRESHOLD": 10000,
+}
+
+
+def get_setting(name):
+    return getattr(settings, "INVENTORY_PAGINATION", {}).get(name, DEFAULTS[name])
+
+
+class ExactCount:
+    name = "exact"
+
+    def count(self, object_list):
+        """
+        Counts `object_list`.
+
+        :return: A `(count, strategy_name)` tuple.
+        """
+        if isinstance(object_list, QuerySet):
+            return object_list.count(), ExactCount.name
+        # Search results and other sequences know their own length
+        counter = getattr(object_list, "count", None)
+        if callable(counter):
+            return counter(), ExactCount.name
+        return len(object_list), ExactCount.name
+
+
+class CachedCount(ExactCount):
+    name = "cached"
+
+    def get_cache_key(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        signature = hashlib.md5(f"{sql}{params!r}".encode("utf-8")).hexdigest()
+        tables = get_queryset_tables(queryset)
+        generations = "-".join(str(g) for g in get_generations(tables))
+        return f"count:{queryset.model._meta.label_lower}:{signature}:{generations}"
+
+    def count(self, object_list):
+        if not isinstance(object_list, QuerySet):
+            return super().count(object_list)
+
+        cache = caches[CACHE_ALIAS]
+        key = self.get_cache_key(object_list)
+        count = cache.get(key)
+        if count is None:
+            count, _ = super().count(object_list)
+            cache.set(key, count, get_setting("COUNT_CACHE_TIMEOUT"))
+        return count, CachedCount.name
+
+
+class EstimatedCount(CachedCount):
+    name = "estimated"
+
+    def is_unfiltered(self, queryset):
+        query = queryset.query
+        return not (query.where or query.is_sliced or query.distinct)
+
+    def get_estimate(self, queryset):
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == "mysql":
+                cursor.execute(
+                    "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                    [table],
+                )
+                row = cursor.fetchone()
+                return row[0] if row else None
+            if connection.vendor == "sqlite":
+                # sqlite_stat1 only exists once ANALYZE has been run
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+                )
+                if cursor.fetchone() is None:
+                    return None
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s", [table])
+                row = cursor.fetchone()
+                # The first number of every index's stat is the table's row count
+                return int(row[0].split()[0]) if row else None
+        return None
+
+    def count(self, object_list):
+        if not isinstance(object_list, QuerySet) or not self.is_unfiltered(object_list):
+            return super().count(object_list)
+
+        cache = caches[CACHE_ALIAS]
+        key = f"count-estimate:{object_list.model._meta.label_lower}"
+        estimate = cache.get(key)
+        if estimate is None:
+            estimate = self.get_estimate(object_list)
+            if estimate is not None:
+                cache.set(key, estimate, get_setting("COUNT_CACHE_TIMEOUT"))
+        if estimate is None or estimate < get_setting("ESTIMATE_THRESHOLD"):
+            return super().count(object_list)
+        return estimate, EstimatedCount.name
+
+
+COUNT_STRATEGIES = {
+    strategy.name: strategy for strategy in (ExactCount, CachedCount, EstimatedCount)
+}
+
+
+def get_count_strategy(name=None):
+    """
+    Returns the count strategy registered under `name`, defaulting to the
+    `INVENTORY_PAGINATION["COUNT_STRATEGY"]` setting.
+    """
+    return COUNT_STRATEGIES[name or get_setting("COUNT_STRATEGY")]()
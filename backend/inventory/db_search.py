@@ -0,0 +1,162 @@
+"""
+Full-text search in the database, an alternative to Haystack and Whoosh
+selected with `INVENTORY_SEARCH["BACKEND"] = "database"`.
+
+Every device, donor and location has a `SearchDocument` holding the text
+rendered from its search template (`search/indexes/inventory/*_text.txt`),
+kept current by signals. Documents are matched with:
+
+- SQLite: an FTS5 table over the documents, maintained by triggers.
+- MySQL: a FULLTEXT index on `body`, queried in boolean mode.
+- Other databases: a case-insensitive substring match.
+
+`search_filter` returns a subquery of matching primary keys, so searches
+combine with filters, ordering and pagination in a single SQL statement and
+no index files live on the API hosts.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from django.template.loader import render_to_string
+
+from .models import Device, Donor, Location, SearchDocument
+
+DEFAULTS = {
+    "BACKEND": "haystack",
+}
+
+# Related objects rendered by each model's search template
+SEARCH_MODELS = {
+    Device: ["donor", "start_location", "end_location", "created_by", "received_by"],
+    Donor: [],
+    Location: [],
+}
+
+FTS_TABLE = "inventory_searchdocument_fts"
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def get_setting(name):
+    return getattr(settings, "INVENTORY_SEARCH", {}).get(name, DEFAULTS[name])
+
+
+def is_enabled():
+    return get_setting("BACKEND") == "database"
+
+
+def get_document_pk(model, pk, using="default"):
+    # UUIDs are compared with the stored column value, e.g. hex on SQLite
+    return str(model._meta.pk.get_db_prep_value(pk, connections[using]))
+
+
+def render_document(obj):
+    opts = obj._meta
+    return render_to_string(
+        f"search/indexes/{opts.app_label}/{opts.model_name}_text.txt",
+        {"object": obj},
+    )
+
+
+def update_search_documents(model, objects):
+    """
+    Renders and stores the search documents of `objects`.
+    """
+    label = model._meta.label_lower
+    documents = [
+        SearchDocument(
+            model=label,
+            object_pk=get_document_pk(model, obj.pk),
+            body=render_document(obj),
+        )
+        for obj in objects
+    ]
+    SearchDocument.objects.bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=["model", "object_pk"],
+        update_fields=["body"],
+    )
+
+
+def delete_search_documents(model, pks):
+    SearchDocument.objects.filter(
+        model=model._meta.label_lower,
+        object_pk__in=[get_document_pk(model, pk) for pk in pks],
+    ).delete()
+
+
+def refresh_search_documents(model, pks):
+    """
+    Reloads the objects with primary keys `pks` and stores their documents.
+    """
+    update_search_documents(
+        model,
+        model._default_manager.select_related(*SEARCH_MODELS[model]).filter(pk__in=pks),
+    )
+
+
+def rebuild_search_documents(model, chunk_size=2000):
+    """
+    Stores the search document of every `model` object and drops documents
+    of objects that no longer exist.
+
+    :return: The number of documents written.
+    """
+    queryset = model._default_manager.select_related(*SEARCH_MODELS[model])
+    count = 0
+    batch = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        batch.append(obj)
+        if len(batch) >= chunk_size:
+            update_search_documents(model, batch)
+            count += len(batch)
+            batch = []
+    update_search_documents(model, batch)
+    count += len(batch)
+
+    SearchDocument.objects.filter(model=model._meta.label_lower).exclude(
+        object_pk__in=model._default_manager.values("pk")
+    ).delete()
+    return count
+
+
+def get_match_sql(query, vendor):
+    """
+    Returns the SQL selecting the ids of search documents matching every
+    word of `query` as a prefix, with its parameters.
+    """
+    tokens = TOKEN_RE.findall(query)
+    if vendor == "sqlite":
+        match = " ".join(f'"{token}"*' for token in tokens)
+        return f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+    if vendor == "mysql":
+        match = " ".join(f"+{token}*" for token in tokens)
+        return (
+            "SELECT id FROM inventory_searchdocument "
+            "WHERE MATCH(body) AGAINST (%s IN BOOLEAN MODE)",
+            [match],
+        )
+    return None, None
+
+
+def search_filter(model, query, using="default"):
+    """
+    Returns a subquery of the primary keys of `model` objects matching
+    `query`, for use as `queryset.filter(pk__in=...)`.
+    """
+    documents = SearchDocument.objects.using(using).filter(
+        model=model._meta.label_lower
+    )
+    if not TOKEN_RE.search(query):
+        return documents.none().values("object_pk")
+
+    sql, params = get_match_sql(query, connections[using].vendor)
+    if sql is None:
+        documents = documents.filter(body__icontains=query)
+    else:
+        documents = documents.filter(id__in=RawSQL(sql, params))
+    return documents.values("object_pk")
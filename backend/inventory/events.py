@@ -0,0 +1,224 @@
+"""
+The device change log.
+
+Every write to a device appends a `DeviceEvent` with the fields it changed,
+as `[old, new]` pairs:
+
+- Saves compare the values a device was loaded with (recorded by
+  `Device.from_db`) with the ones it is saved with.
+- Deletes record the values the device was deleted with.
+- `bulk_changed` writes, such as batch edits, imports and shipment
+  arrivals, use the `previous` values sent with the signal; links to
+  shipments are recorded as dispatches.
+
+Writes do not insert events themselves. The events of a transaction are
+added to an in-process buffer once it commits, and dropped if it rolls
+back. The buffer is flushed with bulk inserts when a request finishes,
+after its response was sent, and whenever it holds `FLUSH_SIZE` events.
+Code writing devices outside requests, such as scripts, calls
+`flush_events` when it is done.
+
+`recording_events` sets the source and user recorded with the events of
+the writes in its block.
+"""
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+from functools import partial
+
+from django.db import transaction
+from django.db.models.base import DEFERRED
+from django.utils import timezone
+
+from .models import Device, DeviceEvent
+
+# Device fields recorded in events; `updated_at` changes with every write
+LOGGED_FIELDS = tuple(
+    field
+    for field in Device._meta.concrete_fields
+    if not field.primary_key and not getattr(field, "auto_now", False)
+)
+LOGGED_ATTNAMES = frozenset(field.attname for field in LOGGED_FIELDS)
+
+# Events kept in memory before the buffer flushes itself, and rows per INSERT
+FLUSH_SIZE = 1000
+
+current_context = ContextVar("current_context", default=("", None))
+
+
+@contextmanager
+def recording_events(source, user_id=None):
+    """
+    Records `source` and `user_id` with the events of the writes in the
+    block.
+    """
+    token = current_context.set((source, user_id))
+    try:
+        yield
+    finally:
+        current_context.reset(token)
+
+
+def clean_value(field, value):
+    if value is None:
+        return None
+    if field.get_internal_type() == "DecimalField" and not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return field.to_python(value)
+
+
+def get_diff(old, new):
+    """
+    Returns the `[old, new]` pairs of the logged fields that differ between
+    two {attname: value} dicts, by field name. Fields missing from either
+    are skipped.
+    """
+    changes = {}
+    for field in LOGGED_FIELDS:
+        if field.attname not in old or field.attname not in new:
+            continue
+        before = clean_value(field, old[field.attname])
+        after = clean_value(field, new[field.attname])
+        if before != after:
+            changes[field.name] = [before, after]
+    return changes
+
+
+def get_values(instance):
+    return {field.attname: getattr(instance, field.attname) for field in LOGGED_FIELDS}
+
+
+def get_loaded_values(instance):
+    loaded = getattr(instance, "_loaded_values", None) or {}
+    return {
+        name: value
+        for name, value in loaded.items()
+        if name in LOGGED_ATTNAMES and value is not DEFERRED
+    }
+
+
+def make_event(device_id, action, changes):
+    source, user_id = current_context.get()
+    return DeviceEvent(
+        device_id=device_id,
+        action=action,
+        changes=changes,
+        source=source,
+        user_id=user_id,
+        recorded_at=timezone.now(),
+    )
+
+
+def without_blanks(values):
+    return {name: value for name, value in values.items() if value not in (None, "")}
+
+
+def get_created_event(instance):
+    values = without_blanks(get_values(instance))
+    return make_event(instance.pk, "create", get_diff(dict.fromkeys(values), values))
+
+
+def get_deleted_event(instance):
+    values = without_blanks(get_loaded_values(instance) or get_values(instance))
+    return make_event(instance.pk, "delete", get_diff(values, dict.fromkeys(values)))
+
+
+def get_saved_events(instance, created, update_fields=None):
+    """
+    Returns the events of saving `instance`: none if nothing changed.
+    """
+    if created:
+        return [get_created_event(instance)]
+    new = get_values(instance)
+    if update_fields is not None:
+        new = {
+            field.attname: new[field.attname]
+            for field in LOGGED_FIELDS
+            if field.name in update_fields or field.attname in update_fields
+        }
+    changes = get_diff(get_loaded_values(instance), new)
+    return [make_event(instance.pk, "update", changes)] if changes else []
+
+
+def get_bulk_events(action, instances, fields, previous):
+    """
+    Returns the events of a `bulk_changed` write to devices.
+    """
+    if action == "create":
+        return [get_created_event(instance) for instance in instances]
+    if action == "delete":
+        return [get_deleted_event(instance) for instance in instances]
+
+    events = []
+    for instance in instances:
+        changed = previous.get(instance.pk, {})
+        old = {}
+        for name, value in changed.items():
+            field = Device._meta.get_field(name)
+            if field in LOGGED_FIELDS:
+                old[field.attname] = value
+        changes = get_diff(old, get_values(instance))
+        if changes:
+            events.append(make_event(instance.pk, "update", changes))
+    return events
+
+
+def get_dispatch_events(links):
+    """
+    Returns the events of linking devices to shipments, given the rows of
+    the `Device.shipping_infos` through table.
+    """
+    return [
+        make_event(link.device_id, "dispatch", {"shipment": [None, link.shipping_id]})
+        for link in links
+    ]
+
+
+class EventBuffer:
+    """
+    Committed events waiting to be inserted, shared by the threads of the
+    process.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def add(self, events):
+        with self.lock:
+            self.events.extend(events)
+            full = len(self.events) >= FLUSH_SIZE
+        if full:
+            self.flush()
+
+    def flush(self):
+        """
+        Inserts the buffered events.
+
+        :return: The number of events inserted.
+        """
+        with self.lock:
+            events, self.events = self.events, []
+        if events:
+            DeviceEvent.objects.bulk_create(events, batch_size=FLUSH_SIZE)
+        return len(events)
+
+
+event_buffer = EventBuffer()
+
+
+def record_events(events):
+    """
+    Buffers `events` once the current transaction commits.
+    """
+    if events:
+        transaction.on_commit(partial(event_buffer.add, events))
+
+
+def flush_events(**kwargs):
+    """
+    Inserts the buffered events; also a `request_finished` receiver.
+    """
+    return event_buffer.flush()
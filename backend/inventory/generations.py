@@ -0,0 +1,123 @@
+"""
+Per-table generation counters.
+
+Every write to a tracked table bumps its generation. Cache entries that
+embed the generations of the tables they were computed from become
+unreachable after a write, which makes invalidation O(1) regardless of how
+many entries depend on a table.
+
+Generations are stored without expiry in the ``inventory`` cache. A missing
+counter is seeded from the clock, so a counter that was evicted never
+repeats a value it had before. Processes only see each other's bumps when
+the ``inventory`` cache is shared between them.
+
+Bumps also record the time of the write, read with `get_modified_times`
+for ``Last-Modified`` headers.
+
+Writes bump with `bump_generation_on_commit`, before and after their
+transaction commits, so entries computed from uncommitted state do not
+outlive it.
+
+With the default local-memory ``inventory`` cache, `is_process_local` is
+true and list ETags and cached lists are turned off, see
+`ConditionalGetMixin` and `CachedListMixin`, as they would serve lists
+other processes have written to. Configure a cache shared by the workers,
+such as Redis or a file-based cache, to use them.
+"""
+
+import time
+from functools import partial
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+CACHE_ALIAS = "inventory"
+
+
+def get_cache_key(table):
+    return f"generation:{table}"
+
+
+def get_modified_cache_key(table):
+    return f"modified:{table}"
+
+
+def get_table(model_or_table):
+    if isinstance(model_or_table, str):
+        return model_or_table
+    return model_or_table._meta.db_table
+
+
+def is_process_local():
+    """
+    Checks whether generations live in the memory of this process, unseen
+    by the writes of other processes.
+    """
+    return isinstance(caches[CACHE_ALIAS], LocMemCache)
+
+
+def get_generations(tables):
+    """
+    Returns the current generations of `tables` as a tuple, in order.
+    """
+    cache = caches[CACHE_ALIAS]
+    tables = [get_table(table) for table in tables]
+    keys = [get_cache_key(table) for table in tables]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return tuple(found[key] for key in keys)
+
+
+def bump_generation(model_or_table):
+    """
+    Moves the generation of a table forward, invalidating dependent entries.
+    """
+    cache = caches[CACHE_ALIAS]
+    key = get_cache_key(get_table(model_or_table))
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+    cache.set(get_modified_cache_key(get_table(model_or_table)), time.time(), None)
+
+
+def bump_generation_on_commit(model_or_table):
+    """
+    Bumps the generation of a table now, and again once the current
+    transaction commits. Readers in between still see the rows from before
+    the write and may cache them under the first bump; the second makes
+    those entries unreachable.
+    """
+    bump_generation(model_or_table)
+    transaction.on_commit(partial(bump_generation, model_or_table))
+
+
+def get_modified_times(tables):
+    """
+    Returns the times of the last writes to `tables` as a tuple of
+    timestamps, in order. Tables not written to since the cache was emptied
+    report the time they were first asked about.
+    """
+    cache = caches[CACHE_ALIAS]
+    keys = [get_modified_cache_key(get_table(table)) for table in tables]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time(), None)
+            found[key] = cache.get(key)
+    return tuple(found[key] for key in keys)
+
+
+def get_queryset_tables(queryset):
+    """
+    Returns the names of the tables a queryset reads from, including joins
+    introduced by its filters.
+    """
+    query = queryset.query
+    tables = {query.get_meta().db_table}
+    tables.update(join.table_name for join in query.alias_map.values())
+    return sorted(tables)
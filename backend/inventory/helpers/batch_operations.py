@@ -1,4 +1,14 @@
+from collections import defaultdict
+
 from django.apps import apps
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+
+from ..signals import bulk_changed
+
+# Number of rows written per UPDATE statement by bulk_edit
+BATCH_CHUNK_SIZE = 500
 
 
 def validate_ids(data, id_key):
@@ -16,3 +26,182 @@ def get_model(model_path):
         return None
     except LookupError:
         return None
+
+
+def resolve_related(serializer_class, items):
+    """
+    Loads every related object referenced by `items` with one query per
+    relation, keyed by primary key.
+
+    :return: A dict mapping field name to {pk: related object}.
+    """
+    fields = serializer_class().fields
+    resolved = {}
+    for name, field in fields.items():
+        if not isinstance(field, PrimaryKeyRelatedField) or field.read_only:
+            continue
+        values = {item[name] for item in items if item.get(name) is not None}
+        if values:
+            pk_field = field.queryset.model._meta.pk
+            try:
+                values = [pk_field.to_python(value) for value in values]
+            except DjangoValidationError:
+                values = []
+            resolved[name] = field.get_queryset().in_bulk(values)
+        else:
+            resolved[name] = {}
+    return resolved
+
+
+def validate_item(serializer_class, instance, data, related):
+    """
+    Validates the changes of a single object.
+
+    Related fields are looked up in `related` instead of being fetched one by
+    one; all other fields go through the serializer.
+
+    :return: A `(validated_data, errors)` tuple.
+    """
+    errors = {}
+    validated = {}
+    scalar_data = {}
+    for name, value in data.items():
+        if name not in related:
+            scalar_data[name] = value
+        elif value is None:
+            validated[name] = None
+        else:
+            pk_field = instance._meta.get_field(name).related_model._meta.pk
+            try:
+                validated[name] = related[name][pk_field.to_python(value)]
+            except (DjangoValidationError, KeyError, TypeError):
+                errors[name] = [f'Invalid pk "{value}" - object does not exist.']
+
+    serializer = serializer_class(instance, data=scalar_data, partial=True)
+    if not serializer.is_valid():
+        errors.update(serializer.errors)
+    for name in scalar_data:
+        if isinstance(serializer.fields.get(name), ManyRelatedField):
+            errors[name] = ["Many-to-many fields cannot be batch edited."]
+    if not errors:
+        validated.update(serializer.validated_data)
+    return validated, errors
+
+
+def bulk_edit(model, serializer_class, items, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    Applies partial updates to many objects of `model`.
+
+    Targets are loaded with one `pk__in` query and validated through
+    `serializer_class`. Items setting a unique field to the same value as
+    another item are invalid, since each only checks the database. Objects
+    are grouped by the set of fields that actually changed and written with
+    `bulk_update` in chunks, all inside a single transaction; when another
+    writer takes a unique value first, nothing is written and the changed
+    items are reported as conflicts.
+
+    :param items: A list of dicts, each with an "id" and the new field values.
+    :return: A list with one result per item, in order.
+    """
+    pk_field = model._meta.pk
+    unique_fields = [
+        field
+        for field in model._meta.concrete_fields
+        if field.unique and not field.primary_key
+    ]
+    ids = []
+    for item in items:
+        try:
+            ids.append(pk_field.to_python(item["id"]))
+        except DjangoValidationError:
+            ids.append(None)
+    instances = model._default_manager.in_bulk([pk for pk in ids if pk is not None])
+    related = resolve_related(serializer_class, items)
+
+    results = []
+    changes = []
+    # Objects setting each (unique field, value)
+    claims = defaultdict(set)
+    for item, pk in zip(items, ids):
+        instance = instances.get(pk)
+        if instance is None:
+            results.append({"id": item["id"], "status": "not_found"})
+            continue
+
+        data = {key: value for key, value in item.items() if key != "id"}
+        validated, errors = validate_item(serializer_class, instance, data, related)
+        if errors:
+            results.append({"id": item["id"], "status": "invalid", "errors": errors})
+            continue
+
+        changed = {}
+        for name, value in validated.items():
+            attname = model._meta.get_field(name).attname
+            old = getattr(instance, attname)
+            setattr(instance, name, value)
+            if getattr(instance, attname) != old:
+                changed[name] = old
+        for field in unique_fields:
+            value = getattr(instance, field.attname)
+            if field.name in changed and value is not None:
+                claims[field.name, value].add(instance.pk)
+        results.append(None)
+        changes.append((len(results) - 1, item, instance, changed))
+
+    groups = defaultdict(list)
+    previous = {}
+    for position, item, instance, changed in changes:
+        clashes = {
+            field.name: [f"Duplicate {field.name} within the batch."]
+            for field in unique_fields
+            if field.name in changed
+            and len(claims[field.name, getattr(instance, field.attname)]) > 1
+        }
+        if clashes:
+            results[position] = {
+                "id": item["id"],
+                "status": "invalid",
+                "errors": clashes,
+            }
+            continue
+        if changed:
+            groups[frozenset(changed)].append(instance)
+            previous[instance.pk] = changed
+        results[position] = {
+            "id": item["id"],
+            "status": "updated" if changed else "unchanged",
+        }
+
+    # bulk_update does not touch auto_now fields such as `updated_at`
+    auto_now = [
+        field
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False)
+    ]
+    try:
+        with transaction.atomic():
+            for fields, objs in groups.items():
+                for obj in objs:
+                    for field in auto_now:
+                        field.pre_save(obj, add=False)
+                model._default_manager.bulk_update(
+                    objs,
+                    [*fields, *(field.name for field in auto_now)],
+                    batch_size=chunk_size,
+                )
+    except IntegrityError as e:
+        # Another writer took a unique value since the validation
+        for result in results:
+            if result["status"] == "updated":
+                result.update(status="conflict", errors={"non_field_errors": [str(e)]})
+        return results
+
+    if groups:
+        bulk_changed.send(
+            sender=model,
+            action="update",
+            instances=[obj for objs in groups.values() for obj in objs],
+            fields=set().union(*groups, (field.name for field in auto_now)),
+            previous=previous,
+        )
+    return results
@@ -0,0 +1,362 @@
+"""
+Seeded synthetic datasets for load testing, used by the `generate_dataset`
+command.
+
+Every row is derived from the seed and its own index: chunk `n` of devices
+is built from a random generator seeded with `(seed, n)`. The same seed and
+chunk size therefore produce the same dataset whether chunks are generated
+in order or by a pool of worker processes. Names, serial numbers and MAC
+ids embed the seed, so datasets of different seeds can share a database.
+
+Devices are written in chunks of `chunk_size` rows. A chunk is built as
+tuples of database values, without model instances, and inserted with one
+`executemany` into the device table and one into the `Device.shipping_infos`
+through table, in one transaction. Building rows costs more than inserting
+them, so worker processes build chunks and a single process inserts them;
+SQLite allows no concurrent writers anyway. Only the primary keys of the
+parent rows and a few chunks are held in memory.
+
+Counts and distributions are skewed the way real inventories are: a few
+locations and donors account for most devices, laptops and desktops
+dominate, and most devices have never been shipped.
+"""
+
+import multiprocessing
+import random
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import repeat
+
+from django import db
+from django.db import transaction
+from django.utils import timezone
+
+from ..generations import bump_generation
+from ..models import Device, Donor, Location, Shipping, User
+from ..rollups import backfill_history_rollups, rebuild_inventory_rollups
+
+# Rows written per INSERT and per transaction
+DATASET_CHUNK_SIZE = 5000
+
+# Dates are spread back from a fixed day, so datasets do not depend on when
+# they were generated
+BASE_DATE = date(2024, 8, 1)
+
+DEVICE_TYPES = {
+    # type: (weight, makes, value range)
+    "Laptop": (45, ["Dell", "HP", "Lenovo", "Apple"], (150, 1200)),
+    "Desktop": (25, ["Dell", "HP", "Lenovo"], (100, 800)),
+    "Tablet": (15, ["Apple", "Samsung", "Lenovo"], (80, 600)),
+    "Smartphone": (10, ["Apple", "Samsung"], (50, 700)),
+    "Monitor": (5, ["Dell", "HP", "Samsung"], (30, 250)),
+}
+
+OPERATING_SYSTEMS = {
+    "Laptop": ["Windows 10", "Windows 11", "macOS", "Linux"],
+    "Desktop": ["Windows 10", "Windows 11", "Linux"],
+    "Tablet": ["Android", "iPadOS"],
+    "Smartphone": ["Android", "iOS"],
+    "Monitor": ["None"],
+}
+
+PHYSICAL_CONDITIONS = ["Excellent", "Good", "Fair", "Poor"]
+CONDITION_WEIGHTS = [15, 45, 30, 10]
+
+LOCATION_TYPES = ["Warehouse", "Distribution Center", "Repair Center"]
+COUNTRIES = ["Kenya", "Uganda", "Tanzania", "Rwanda", "USA"]
+
+# Chance of a device having 0, 1, 2 or 3 shipments
+SHIPMENT_COUNT_WEIGHTS = [55, 30, 12, 3]
+
+
+def get_rng(seed, *keys):
+    return random.Random(f"{seed}:{':'.join(map(str, keys))}")
+
+
+def get_skewed_weights(count):
+    """
+    Zipf-like weights: the k-th row is picked about 1/k as often as the first.
+    """
+    return [1 / (rank + 1) for rank in range(count)]
+
+
+def get_cumulative_weights(count):
+    total = 0
+    cumulative = []
+    for weight in get_skewed_weights(count):
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+def random_date(rng, max_days_back):
+    return BASE_DATE - timedelta(days=rng.randrange(max_days_back))
+
+
+def build_location(seed, index):
+    rng = get_rng(seed, "location", index)
+    return Location(
+        name=f"Location {seed}-{index}",
+        type=rng.choice(LOCATION_TYPES),
+        address=f"{rng.randint(1, 999)} Street {index}",
+        country=rng.choice(COUNTRIES),
+        city=f"City {seed}-{index % 50}",
+        postal_code=f"{rng.randint(10000, 99999)}",
+        phone=f"+1-{rng.randint(200, 999)}-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+    )
+
+
+def build_donor(seed, index):
+    rng = get_rng(seed, "donor", index)
+    return Donor(
+        name=f"Donor {seed}-{index}",
+        contact_info=f"Contact {seed}-{index}",
+        address=f"{rng.randint(1, 999)} Avenue {index}",
+        email=f"donor-{seed}-{index}@example.com",
+        phone=f"+1-{rng.randint(200, 999)}-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+    )
+
+
+def build_shipment(seed, index, location_ids):
+    rng = get_rng(seed, "shipment", index)
+    date_shipped = random_date(rng, 3 * 365)
+    arrived = date_shipped < BASE_DATE - timedelta(days=30) or rng.random() < 0.5
+    return Shipping(
+        destination_id=rng.choices(
+            location_ids, cum_weights=get_cumulative_weights(len(location_ids))
+        )[0],
+        arrived=arrived,
+        date_shipped=date_shipped,
+        date_delivered=(
+            date_shipped + timedelta(days=rng.randint(1, 21)) if arrived else None
+        ),
+        tracking_identifier=f"TRACK-{seed}-{index}",
+    )
+
+
+def create_parents(model, build, seed, count, chunk_size, *args):
+    """
+    Creates `count` rows of `model` built by `build(seed, index, *args)`.
+
+    :return: The primary keys of the rows, in index order.
+    """
+    for start in range(0, count, chunk_size):
+        model.objects.bulk_create(
+            [
+                build(seed, index, *args)
+                for index in range(start, min(start + chunk_size, count))
+            ]
+        )
+    # Read back by name, as not every backend returns primary keys from
+    # bulk inserts of AutoFields
+    name_field = "tracking_identifier" if model is Shipping else "name"
+    prefix = "TRACK-" if model is Shipping else f"{model.__name__} "
+    pks = dict(
+        model.objects.filter(
+            **{f"{name_field}__startswith": f"{prefix}{seed}-"}
+        ).values_list(name_field, "pk")
+    )
+    return [pks[f"{prefix}{seed}-{index}"] for index in range(count)]
+
+
+def build_device(rng, seed, index, parents):
+    """
+    Returns the values of device `index` as a {column attname: value} dict.
+    """
+    device_type = rng.choices(
+        list(DEVICE_TYPES), weights=[spec[0] for spec in DEVICE_TYPES.values()]
+    )[0]
+    _, makes, (low, high) = DEVICE_TYPES[device_type]
+    make = rng.choice(makes)
+    date_of_donation = random_date(rng, 5 * 365)
+    locations = parents["locations"]
+    location_weights = parents["location_weights"]
+    donors = parents["donors"]
+    users = parents["users"]
+    return {
+        "device_id": uuid.UUID(int=rng.getrandbits(128), version=4),
+        "type": device_type,
+        "make": make,
+        "model": f"{make} {device_type} {rng.randint(1, 40)}",
+        "serial_number": f"SN-{seed}-{index:09d}",
+        "mac_id": f"MAC-{seed}-{index:09d}",
+        "year_of_manufacture": round(rng.triangular(2012, 2024, 2020)),
+        "date_received": date_of_donation + timedelta(days=rng.randint(0, 60)),
+        "created_by_id": rng.choice(users) if users else None,
+        "received_by_id": rng.choice(users) if users else None,
+        "physical_condition": rng.choices(
+            PHYSICAL_CONDITIONS, weights=CONDITION_WEIGHTS
+        )[0],
+        "specifications": f"{rng.choice([4, 8, 8, 16, 32])}GB RAM",
+        "operating_system": rng.choice(OPERATING_SYSTEMS[device_type]),
+        # One in ten devices has no recorded donor
+        "donor_id": (
+            rng.choices(donors, cum_weights=parents["donor_weights"])[0]
+            if donors and rng.random() >= 0.1
+            else None
+        ),
+        "date_of_donation": date_of_donation,
+        "value": Decimal(rng.randint(low * 100, high * 100)) / 100,
+        "start_location_id": rng.choices(locations, cum_weights=location_weights)[0],
+        "end_location_id": rng.choices(locations, cum_weights=location_weights)[0],
+        "notes": "",
+    }
+
+
+def get_insert_sql(model, fields):
+    qn = db.connection.ops.quote_name
+    return (
+        f"INSERT INTO {qn(model._meta.db_table)} "
+        f"({', '.join(qn(field.column) for field in fields)}) "
+        f"VALUES ({', '.join(['%s'] * len(fields))})"
+    )
+
+
+def build_device_chunk(seed, chunk_index, chunk_size, count, parents, updated_at):
+    """
+    Builds the rows of chunk `chunk_index` of devices and of their shipment
+    links, as tuples of database values in the column order of
+    `get_insert_sql`.
+
+    :return: A `(device_rows, link_rows)` tuple.
+    """
+    rng = get_rng(seed, "devices", chunk_index)
+    start = chunk_index * chunk_size
+    shipments = parents["shipments"]
+    # The connection proxy is resolved once, not per value
+    connection = db.connections[db.DEFAULT_DB_ALIAS]
+    device_fields = Device._meta.concrete_fields
+
+    device_rows = []
+    link_rows = []
+    for index in range(start, min(start + chunk_size, count)):
+        values = build_device(rng, seed, index, parents)
+        values["updated_at"] = updated_at
+        device_id = Device._meta.pk.get_db_prep_save(values["device_id"], connection)
+        device_rows.append(
+            tuple(
+                field.get_db_prep_save(values[field.attname], connection)
+                for field in device_fields
+            )
+        )
+        if shipments:
+            shipment_count = rng.choices(
+                range(len(SHIPMENT_COUNT_WEIGHTS)), weights=SHIPMENT_COUNT_WEIGHTS
+            )[0]
+            for shipping_id in sorted(
+                {rng.choice(shipments) for _ in range(shipment_count)}
+            ):
+                link_rows.append((device_id, shipping_id))
+    return device_rows, link_rows
+
+
+def get_link_fields():
+    through = Device.shipping_infos.through
+    return [through._meta.get_field("device"), through._meta.get_field("shipping")]
+
+
+def insert_device_chunk(device_rows, link_rows):
+    """
+    Inserts a chunk built by `build_device_chunk` in one transaction.
+    """
+    with transaction.atomic(), db.connection.cursor() as cursor:
+        cursor.executemany(
+            get_insert_sql(Device, Device._meta.concrete_fields), device_rows
+        )
+        if link_rows:
+            cursor.executemany(
+                get_insert_sql(Device.shipping_infos.through, get_link_fields()),
+                link_rows,
+            )
+
+
+def create_dataset(
+    seed,
+    devices,
+    locations=50,
+    donors=1000,
+    shipments=10000,
+    chunk_size=None,
+    workers=1,
+    progress=None,
+):
+    """
+    Creates a synthetic dataset for seed `seed`.
+
+    Device chunks are built by `workers` processes when `workers` > 1 and
+    inserted by this one, so that inserts never contend for the database.
+
+    :param progress: Optional callable, called with the number of devices
+        created so far after each chunk.
+    :return: A dict of the number of rows created per table.
+    """
+    chunk_size = chunk_size or DATASET_CHUNK_SIZE
+    parents = {
+        "locations": create_parents(
+            Location, build_location, seed, locations, chunk_size
+        ),
+        "donors": create_parents(Donor, build_donor, seed, donors, chunk_size),
+        # Existing users only; their passwords are too slow to hash in bulk
+        "users": list(User.objects.order_by("pk").values_list("pk", flat=True)[:100]),
+    }
+    parents["shipments"] = create_parents(
+        Shipping, build_shipment, seed, shipments, chunk_size, parents["locations"]
+    )
+    parents["location_weights"] = get_cumulative_weights(len(parents["locations"]))
+    parents["donor_weights"] = get_cumulative_weights(len(parents["donors"]))
+
+    chunk_count = -(-devices // chunk_size)
+    args = (
+        repeat(seed),
+        range(chunk_count),
+        repeat(chunk_size),
+        repeat(devices),
+        repeat(parents),
+        repeat(timezone.now()),
+    )
+    created_devices = created_links = 0
+
+    def insert(device_rows, link_rows):
+        nonlocal created_devices, created_links
+        insert_device_chunk(device_rows, link_rows)
+        created_devices += len(device_rows)
+        created_links += len(link_rows)
+        if progress:
+            progress(created_devices)
+
+    if workers > 1 and chunk_count > 1:
+        # Workers only build rows; connections are closed before forking so
+        # that they are not shared with them
+        db.connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")
+        ) as pool:
+            # At most two chunks per worker are built ahead of the inserts
+            pending = deque()
+            for chunk_args in zip(*args):
+                pending.append(pool.submit(build_device_chunk, *chunk_args))
+                if len(pending) >= 2 * workers:
+                    insert(*pending.popleft().result())
+            while pending:
+                insert(*pending.popleft().result())
+    else:
+        for chunk_args in zip(*args):
+            insert(*build_device_chunk(*chunk_args))
+
+    # Bulk inserts send no signals; cached pages and counts are dropped and
+    # the rollups recomputed here. Search documents are rebuilt separately,
+    # see the command.
+    for model in (Location, Donor, Shipping, Device, Device.shipping_infos.through):
+        bump_generation(model)
+    rebuild_inventory_rollups()
+    backfill_history_rollups()
+    return {
+        "locations": len(parents["locations"]),
+        "donors": len(parents["donors"]),
+        "shipments": len(parents["shipments"]),
+        "devices": created_devices,
+        "shipment_links": created_links,
+    }
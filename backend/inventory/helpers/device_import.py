@@ -0,0 +1,258 @@
+"""
+Streaming import of devices from CSV or JSONL files.
+
+Rows are read one at a time from the upload, so memory use is bounded by the
+chunk size rather than the file size:
+
+- Scalar fields are validated with `DeviceImportSerializer`.
+- The `donor`, `start_location` and `end_location` columns hold names, which
+  are resolved through lookup maps loaded once per import.
+- Serial numbers and MAC IDs are deduplicated against earlier rows of the
+  file and, once per chunk, against the database.
+- Valid rows are written with `bulk_create`, one transaction per chunk.
+
+Rows that fail are reported by line number together with their errors.
+"""
+
+import codecs
+import csv
+import json
+import os
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from ..models import Device, Donor, Location
+from ..serializers import DeviceImportSerializer
+from ..signals import bulk_changed
+from .batch_operations import BATCH_CHUNK_SIZE
+
+IMPORT_FORMATS = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    "text/csv": "csv",
+    "application/jsonl": "jsonl",
+    "application/x-ndjson": "jsonl",
+}
+
+# Columns holding names of related objects, and the model they name
+RELATION_COLUMNS = {
+    "donor": Donor,
+    "start_location": Location,
+    "end_location": Location,
+}
+
+UNIQUE_FIELDS = ["serial_number", "mac_id"]
+
+# Failed rows beyond this many are counted but not listed in the report
+MAX_REPORTED_ERRORS = 1000
+
+AMBIGUOUS = object()
+
+
+def get_import_format(uploaded_file):
+    """
+    Returns "csv" or "jsonl" from the file extension or content type, or None
+    if the format is not supported.
+    """
+    extension = os.path.splitext(uploaded_file.name or "")[1].lower()
+    return IMPORT_FORMATS.get(extension) or IMPORT_FORMATS.get(
+        (uploaded_file.content_type or "").split(";")[0].strip()
+    )
+
+
+def iter_rows(uploaded_file, file_format):
+    """
+    Reads an uploaded file line by line.
+
+    :return: An iterator of `(line_number, data, error)` tuples, where `error`
+        is set instead of `data` for lines that cannot be parsed.
+    """
+    lines = codecs.iterdecode(uploaded_file, "utf-8-sig")
+    if file_format == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            # Empty cells are treated as missing so model defaults apply
+            data = {
+                key.strip(): value.strip()
+                for key, value in row.items()
+                if isinstance(key, str) and isinstance(value, str) and value.strip()
+            }
+            yield reader.line_num, data, None
+        return
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, {"non_field_errors": [f"Invalid JSON: {e}"]}
+            continue
+        if not isinstance(data, dict):
+            yield line_number, None, {
+                "non_field_errors": ["Each line must be a JSON object."]
+            }
+            continue
+        yield line_number, data, None
+
+
+def build_name_lookup(model):
+    """
+    Maps the names of all `model` objects to their primary keys. Names shared
+    by several objects map to `AMBIGUOUS`.
+    """
+    lookup = {}
+    for name, pk in model._default_manager.values_list("name", "pk").iterator():
+        lookup[name] = AMBIGUOUS if name in lookup else pk
+    return lookup
+
+
+class DeviceImporter:
+    """
+    Validates rows and writes them as devices in chunks.
+
+    :param created_by_id: Primary key of the user recorded as `created_by`.
+    :param chunk_size: Number of rows written per transaction, defaults to
+        `BATCH_CHUNK_SIZE`.
+    """
+
+    def __init__(self, created_by_id=None, chunk_size=None):
+        self.created_by_id = created_by_id
+        self.chunk_size = chunk_size or BATCH_CHUNK_SIZE
+        lookups = {
+            model: build_name_lookup(model) for model in set(RELATION_COLUMNS.values())
+        }
+        self.lookups = {
+            column: lookups[model] for column, model in RELATION_COLUMNS.items()
+        }
+        self.seen = {field: set() for field in UNIQUE_FIELDS}
+        self.pending = []
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, rows):
+        """
+        Imports `rows`, as produced by `iter_rows`.
+
+        :return: The import report, see `get_report`.
+        """
+        for line_number, data, error in rows:
+            device = None
+            if error is None:
+                device, error = self.build_device(data)
+            if error:
+                self.add_error(line_number, error)
+                continue
+            self.pending.append((line_number, device))
+            if len(self.pending) >= self.chunk_size:
+                self.flush()
+        self.flush()
+        return self.get_report()
+
+    def build_device(self, data):
+        """
+        Validates a row.
+
+        :return: A `(device, errors)` tuple; `device` is unsaved.
+        """
+        data = dict(data)
+        errors = {}
+        relations = {}
+        for column, model in RELATION_COLUMNS.items():
+            name = data.pop(column, None)
+            if name is None or name == "":
+                continue
+            pk = self.lookups[column].get(str(name).strip())
+            if pk is None:
+                errors[column] = [f'No {model.__name__.lower()} named "{name}".']
+            elif pk is AMBIGUOUS:
+                errors[column] = [
+                    f'More than one {model.__name__.lower()} is named "{name}".'
+                ]
+            else:
+                relations[f"{column}_id"] = pk
+
+        serializer = DeviceImportSerializer(data=data)
+        if not serializer.is_valid():
+            errors.update(serializer.errors)
+        if errors:
+            return None, errors
+
+        device = Device(
+            **serializer.validated_data,
+            **relations,
+            created_by_id=self.created_by_id,
+        )
+        for field in UNIQUE_FIELDS:
+            if getattr(device, field) in self.seen[field]:
+                errors[field] = [f"Duplicate {field} within the file."]
+        if errors:
+            return None, errors
+        for field in UNIQUE_FIELDS:
+            self.seen[field].add(getattr(device, field))
+        return device, None
+
+    def flush(self):
+        """
+        Writes the pending rows that do not clash with existing devices.
+        """
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+
+        rows = []
+        try:
+            with transaction.atomic():
+                existing = {field: set() for field in UNIQUE_FIELDS}
+                lookup = Q()
+                for field in UNIQUE_FIELDS:
+                    lookup |= Q(
+                        **{f"{field}__in": [getattr(d, field) for _, d in pending]}
+                    )
+                for values in Device.objects.filter(lookup).values_list(*UNIQUE_FIELDS):
+                    for field, value in zip(UNIQUE_FIELDS, values):
+                        existing[field].add(value)
+
+                for line_number, device in pending:
+                    clashes = {
+                        field: [f"A device with this {field} already exists."]
+                        for field in UNIQUE_FIELDS
+                        if getattr(device, field) in existing[field]
+                    }
+                    if clashes:
+                        self.add_error(line_number, clashes)
+                    else:
+                        rows.append((line_number, device))
+
+                devices = Device.objects.bulk_create([device for _, device in rows])
+        except IntegrityError as e:
+            # Another writer inserted a clashing device since the check
+            for line_number, _ in rows:
+                self.add_error(line_number, {"non_field_errors": [str(e)]})
+            return
+
+        self.created += len(devices)
+        if devices:
+            bulk_changed.send(
+                sender=Device,
+                action="create",
+                instances=devices,
+                fields={field.name for field in Device._meta.concrete_fields},
+                previous={},
+            )
+
+    def add_error(self, line_number, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": line_number, "errors": errors})
+
+    def get_report(self):
+        return {
+            "created": self.created,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
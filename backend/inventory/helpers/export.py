@@ -0,0 +1,78 @@
+"""
+Streaming export of devices as CSV or JSONL.
+
+Rows are read with `values_list(...).iterator(chunk_size=...)`, so only one
+chunk of tuples is held in memory at a time and no model instances are
+built. The CSV header is sent before the query runs.
+"""
+
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Rows fetched from the database per round trip
+EXPORT_CHUNK_SIZE = 2000
+
+# (column, lookup) pairs, in output order
+EXPORT_COLUMNS = [
+    ("device_id", "device_id"),
+    ("type", "type"),
+    ("make", "make"),
+    ("model", "model"),
+    ("serial_number", "serial_number"),
+    ("mac_id", "mac_id"),
+    ("year_of_manufacture", "year_of_manufacture"),
+    ("date_received", "date_received"),
+    ("physical_condition", "physical_condition"),
+    ("operating_system", "operating_system"),
+    ("value", "value"),
+    ("donor", "donor__name"),
+    ("date_of_donation", "date_of_donation"),
+    ("start_location", "start_location__name"),
+    ("end_location", "end_location__name"),
+    ("created_by", "created_by__username"),
+]
+
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+
+class Echo:
+    """
+    A file-like object whose `write` returns what it is given, so csv.writer
+    produces the encoded line instead of buffering it.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_export_rows(queryset, chunk_size=None):
+    """
+    Yields one tuple of `EXPORT_COLUMNS` values per device of `queryset`.
+    """
+    return (
+        queryset.prefetch_related(None)
+        .values_list(*[lookup for _, lookup in EXPORT_COLUMNS])
+        .iterator(chunk_size=chunk_size or EXPORT_CHUNK_SIZE)
+    )
+
+
+def stream_export(queryset, file_format, chunk_size=None):
+    """
+    Renders the devices of `queryset` as CSV or JSONL lines.
+    """
+    columns = [column for column, _ in EXPORT_COLUMNS]
+    rows = iter_export_rows(queryset, chunk_size)
+    if file_format == "csv":
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(row)
+        return
+
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + "\n"
@@ -5,6 +5,7 @@ from django.db.models import Max
 from django.utils import timezone
 
 from ..models import Device, Donor, Location, Shipping, User
+from ..signals import bulk_changed
 
 
 def generate_mock_location(num_locations):
@@ -130,13 +131,33 @@ def create_mock_data(num_locations=5, num_donors=10, num_devices=50, num_shippin
         num_devices, all_locations, all_donors, all_users, created_shippings
     )
     created_devices = Device.objects.bulk_create([Device(**d) for d in new_devices])
-
-    # Add shipping information to devices
-    for device in created_devices:
-        device.shipping_infos.set(
-            random.sample(created_shippings, random.randint(0, 3))
+    if created_devices:
+        bulk_changed.send(
+            sender=Device,
+            action="create",
+            instances=created_devices,
+            fields={field.name for field in Device._meta.concrete_fields},
+            previous={},
         )
 
+    # Add shipping information to devices, with one insert into the through
+    # table. Shipments are read back as MySQL does not return bulk insert ids.
+    shipping_ids = list(
+        Shipping.objects.order_by("-shipping_id").values_list("shipping_id", flat=True)[
+            : len(created_shippings)
+        ]
+    )
+    Through = Device.shipping_infos.through
+    Through.objects.bulk_create(
+        [
+            Through(device_id=device.device_id, shipping_id=shipping_id)
+            for device in created_devices
+            for shipping_id in random.sample(
+                shipping_ids, min(random.randint(0, 3), len(shipping_ids))
+            )
+        ]
+    )
+
     return {
         "locations_created": len(created_locations),
         "donors_created": len(created_donors),
@@ -0,0 +1,87 @@
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import Device, Shipping
+from ..signals import bulk_changed
+
+# Rows written per INSERT into the shipping through table
+DISPATCH_CHUNK_SIZE = 1000
+
+
+def dispatch_devices(shipment_data, device_ids, chunk_size=DISPATCH_CHUNK_SIZE):
+    """
+    Creates a shipment and links the given devices to it.
+
+    The devices are checked with one query and linked with bulk inserts into
+    the `Device.shipping_infos` through table.
+
+    :param shipment_data: Validated Shipping fields.
+    :param device_ids: Primary keys of the devices in the shipment.
+    :return: A `(shipment, missing_ids)` tuple; nothing is written and
+        `shipment` is None if any device does not exist.
+    """
+    device_ids = list(dict.fromkeys(device_ids))
+    found = set(Device.objects.filter(pk__in=device_ids).values_list("pk", flat=True))
+    missing = [pk for pk in device_ids if pk not in found]
+    if missing:
+        return None, missing
+
+    Through = Device.shipping_infos.through
+    with transaction.atomic():
+        shipment = Shipping.objects.create(**shipment_data)
+        links = Through.objects.bulk_create(
+            [Through(device_id=pk, shipping_id=shipment.pk) for pk in device_ids],
+            batch_size=chunk_size,
+        )
+
+    bulk_changed.send(
+        sender=Through,
+        action="create",
+        instances=links,
+        fields={"device", "shipping"},
+        previous={},
+    )
+    return shipment, []
+
+
+def mark_arrived(shipment, date_delivered=None):
+    """
+    Marks a shipment as delivered and moves all of its devices to the
+    shipment's destination with one UPDATE statement.
+
+    The shipment row is locked and re-read first, so concurrent arrivals of
+    the same shipment move its devices once.
+
+    :return: The number of devices moved, or None if the shipment has
+        already arrived.
+    """
+    date_delivered = date_delivered or timezone.localdate()
+    devices = Device.objects.filter(shipping_infos=shipment)
+
+    with transaction.atomic():
+        if Shipping.objects.select_for_update().get(pk=shipment.pk).arrived:
+            return None
+
+        # Loaded for the bulk_changed receivers, before they are moved
+        moved = list(devices.select_for_update())
+        now = timezone.now()
+        count = devices.update(end_location=shipment.destination_id, updated_at=now)
+
+        shipment.arrived = True
+        shipment.date_delivered = date_delivered
+        shipment.save(update_fields=["arrived", "date_delivered"])
+
+    previous = {}
+    for device in moved:
+        previous[device.pk] = {"end_location": device.end_location_id}
+        device.end_location_id = shipment.destination_id
+        device.updated_at = now
+    if moved:
+        bulk_changed.send(
+            sender=Device,
+            action="update",
+            instances=moved,
+            fields={"end_location", "updated_at"},
+            previous=previous,
+        )
+    return count
@@ -0,0 +1,212 @@
+"""
+QR codes and printable label sheets for devices.
+
+Each label carries a QR code of the device UUID, which the scan endpoint
+resolves, and the device's serial number, type, make and model.
+
+Rendered QR codes are stored as SVG files named after the SHA-256 of their
+content (the payload and `QR_VERSION`) under
+`INVENTORY_LABELS["QR_CACHE_DIR"]`, ``qr_cache`` under BASE_DIR by default,
+so reprinting a label never renders it again. Cached files are embedded in
+the sheets unescaped, so files holding anything but the elements and
+attributes `render_qr` writes are rendered again. `prerender_qr_codes`
+fills the cache with a pool of worker processes; `stream_label_sheets`
+renders HTML sheets one page at a time.
+"""
+
+import hashlib
+import itertools
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+
+import qrcode
+import qrcode.image.svg
+from django.conf import settings
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+DEFAULTS = {
+    # None for qr_cache under BASE_DIR
+    "QR_CACHE_DIR": None,
+}
+
+# Part of every cache key; bump when the rendering below changes
+QR_VERSION = 1
+
+LABELS_PER_SHEET = 30
+
+# Rows fetched per round trip when walking a queryset
+LABEL_CHUNK_SIZE = 2000
+
+LABEL_FIELDS = ["device_id", "serial_number", "type", "make", "model"]
+
+# Elements of the SVG written by render_qr, with their allowed attributes
+QR_ELEMENTS = {
+    "{http://www.w3.org/2000/svg}svg": {"width", "height", "version", "viewBox"},
+    "{http://www.w3.org/2000/svg}path": {
+        "d",
+        "id",
+        "fill",
+        "fill-opacity",
+        "fill-rule",
+        "stroke",
+    },
+}
+
+SHEET_STYLE = """
+@page { size: A4; margin: 10mm; }
+body { margin: 0; font-family: sans-serif; }
+.sheet { display: grid; grid-template-columns: repeat(3, 1fr);
+  grid-auto-rows: 27mm; gap: 2mm; break-after: page; }
+.label { display: flex; align-items: center; gap: 2mm; overflow: hidden;
+  font-size: 8pt; }
+.label svg { width: 25mm; height: 25mm; flex: none; }
+"""
+
+
+def get_setting(name):
+    return getattr(settings, "INVENTORY_LABELS", {}).get(name, DEFAULTS[name])
+
+
+def get_qr_payload(device_id):
+    return str(device_id)
+
+
+def get_cache_dir():
+    return get_setting("QR_CACHE_DIR") or os.path.join(settings.BASE_DIR, "qr_cache")
+
+
+def get_qr_path(payload):
+    digest = hashlib.sha256(f"{QR_VERSION}:{payload}".encode("utf-8")).hexdigest()
+    return os.path.join(get_cache_dir(), digest[:2], f"{digest}.svg")
+
+
+def is_qr_svg(svg):
+    """
+    Returns whether `svg` only holds the elements and attributes of a
+    rendered QR code, so it is safe to embed unescaped.
+    """
+    try:
+        root = ElementTree.fromstring(svg)
+    except ElementTree.ParseError:
+        return False
+    return all(
+        element.tag in QR_ELEMENTS
+        and set(element.attrib) <= QR_ELEMENTS[element.tag]
+        and not (element.text or "").strip()
+        and not (element.tail or "").strip()
+        for element in root.iter()
+    )
+
+
+def render_qr(payload):
+    """
+    Renders `payload` as an SVG QR code and stores it in the cache.
+
+    :return: The SVG markup.
+    """
+    image = qrcode.make(payload, image_factory=qrcode.image.svg.SvgPathImage)
+    svg = image.to_string(encoding="unicode")
+
+    path = get_qr_path(payload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written under a temporary name so readers never see partial files
+    fd, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as file:
+        file.write(svg)
+    os.replace(temporary_path, path)
+    return svg
+
+
+def get_qr(payload):
+    """
+    Returns the SVG QR code of `payload`, rendering it on a cache miss or
+    when the cached file is not a QR code.
+    """
+    try:
+        with open(get_qr_path(payload), encoding="utf-8") as file:
+            svg = file.read()
+    except FileNotFoundError:
+        return render_qr(payload)
+    return svg if is_qr_svg(svg) else render_qr(payload)
+
+
+def iter_chunks(queryset, fields, chunk_size=LABEL_CHUNK_SIZE):
+    """
+    Yields lists of `fields` tuples of `queryset`, `chunk_size` rows at a time.
+    """
+    chunk = []
+    for row in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def prerender_qr_codes(queryset, workers=1):
+    """
+    Renders the QR codes of the devices of `queryset` that are not cached
+    yet, across `workers` processes.
+
+    :return: A `(rendered, cached)` tuple of counts.
+    """
+    rendered = cached = 0
+    pool = None
+    if workers > 1:
+        # Workers only render and write files; they never use the database
+        pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")
+        )
+    try:
+        for chunk in iter_chunks(queryset, ["device_id"]):
+            payloads = [get_qr_payload(device_id) for (device_id,) in chunk]
+            missing = [p for p in payloads if not os.path.exists(get_qr_path(p))]
+            cached += len(payloads) - len(missing)
+            if pool is not None:
+                for _ in pool.map(render_qr, missing, chunksize=64):
+                    rendered += 1
+            else:
+                for payload in missing:
+                    render_qr(payload)
+                    rendered += 1
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return rendered, cached
+
+
+def render_label(device_id, serial_number, device_type, make, model):
+    return format_html(
+        '<div class="label">{}<div><strong>{}</strong><br>{} {} {}</div></div>',
+        mark_safe(get_qr(get_qr_payload(device_id))),
+        serial_number,
+        device_type,
+        make,
+        model,
+    )
+
+
+def stream_label_sheets(queryset, labels_per_sheet=LABELS_PER_SHEET):
+    """
+    Yields a printable HTML document of the devices of `queryset`, one sheet
+    of `labels_per_sheet` labels at a time. Rows are fetched
+    `LABEL_CHUNK_SIZE` at a time, independently of the sheet size.
+    """
+    yield (
+        '<!DOCTYPE html><html><head><meta charset="utf-8">'
+        f"<title>Device labels</title><style>{SHEET_STYLE}</style>"
+        "</head><body>"
+    )
+    rows = queryset.values_list(*LABEL_FIELDS).iterator(chunk_size=LABEL_CHUNK_SIZE)
+    while True:
+        sheet = list(itertools.islice(rows, labels_per_sheet))
+        if not sheet:
+            break
+        labels = "".join(render_label(*row) for row in sheet)
+        yield f'<section class="sheet">{labels}</section>'
+    yield "</body></html>"
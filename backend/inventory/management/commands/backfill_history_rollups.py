@@ -0,0 +1,47 @@
+"""
+Backfills the intake and donation history rollups from the devices, see
+backend/inventory/rollups.py.
+
+Run once after migrating, and after writes that bypass the signals keeping
+the rollups current. Devices are read `--chunk-size` at a time; run it
+while devices are not written to.
+
+Usage:
+    python manage.py backfill_history_rollups
+    python manage.py backfill_history_rollups --chunk-size 20000
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.inventory.rollups import HISTORY_CHUNK_SIZE, backfill_history_rollups
+
+
+class Command(BaseCommand):
+    help = "Recomputes the devices received and donated per day, week and month."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=HISTORY_CHUNK_SIZE,
+            help="Devices read per query.",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive.")
+
+        started = time.monotonic()
+
+        def progress(count):
+            self.stdout.write(f"{count} devices read")
+
+        count = backfill_history_rollups(options["chunk_size"], progress=progress)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Backfilled the history of {count} devices "
+                f"in {time.monotonic() - started:.1f}s."
+            )
+        )
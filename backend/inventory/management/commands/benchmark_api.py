@@ -0,0 +1,152 @@
+"""
+Benchmarks the latency of the inventory API, see
+backend/inventory/benchmarks.py.
+
+The benchmarks run in a throwaway test database, created like the test
+runner does and destroyed afterwards, so the configured database is never
+written to. Results are written as JSON to `--output`. With `--baseline`,
+p95 latencies are compared with a previous results file and the command
+fails when any grew by more than `--threshold`.
+
+Lists are benchmarked with the response cache off; `--cached` also runs
+the list scenarios with it on, reported separately. Metrics of the run are
+recorded in a temporary directory.
+
+Usage:
+    python manage.py benchmark_api --sizes 1000 10000 100000 --output bench.json
+    python manage.py benchmark_api --sizes 10000 --baseline bench.json
+    python manage.py benchmark_api --scenarios device-list login --requests 200
+    python manage.py benchmark_api --sizes 10000 --cached
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from backend.inventory.benchmarks import SCENARIOS, compare_results, run_benchmarks
+
+
+def get_name(result):
+    return result["scenario"] + (" (cached)" if result["cached"] else "")
+
+
+class Command(BaseCommand):
+    help = "Measures inventory API latency percentiles at several dataset sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            nargs="+",
+            type=int,
+            default=[1000, 10000],
+            help="Numbers of devices to benchmark at.",
+        )
+        parser.add_argument(
+            "--scenarios",
+            nargs="+",
+            default=[],
+            help=f"Scenarios to run, all by default: {', '.join(SCENARIOS)}.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=50,
+            help="Timed requests per scenario and size.",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=5,
+            help="Untimed requests sent before the timed ones.",
+        )
+        parser.add_argument(
+            "--cached",
+            action="store_true",
+            help="Also run the list scenarios with the response cache on.",
+        )
+        parser.add_argument(
+            "--output",
+            default="benchmark-results.json",
+            help="File the results are written to.",
+        )
+        parser.add_argument(
+            "--baseline",
+            help="A previous results file to compare p95 latencies with.",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help="Relative p95 increase reported as a regression.",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Reuse and keep the benchmark database between runs.",
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options["scenarios"]) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}.")
+        if options["requests"] < 1 or min(options["sizes"]) < 1:
+            raise CommandError("--requests and --sizes must be positive.")
+
+        baseline = None
+        if options["baseline"]:
+            try:
+                with open(options["baseline"]) as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read the baseline: {e}")
+
+        verbosity = options["verbosity"]
+        setup_test_environment()
+        old_config = setup_databases(
+            verbosity, interactive=False, keepdb=options["keepdb"]
+        )
+        try:
+            results = run_benchmarks(
+                options["sizes"],
+                options["scenarios"],
+                options["requests"],
+                options["warmup"],
+                progress=self.write_result,
+                cached=options["cached"],
+            )
+        finally:
+            teardown_databases(old_config, verbosity, keepdb=options["keepdb"])
+            teardown_test_environment()
+
+        with open(options["output"], "w") as file:
+            json.dump(results, file, indent=2)
+        self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            regressions = compare_results(results, baseline, options["threshold"])
+            for regression in regressions:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"{get_name(regression)} at {regression['size']} devices: "
+                        f"p95 {regression['baseline_p95_ms']:.1f} ms -> "
+                        f"{regression['p95_ms']:.1f} ms "
+                        f"(+{regression['change']:.0%})"
+                    )
+                )
+            if regressions:
+                raise CommandError(f"{len(regressions)} latency regressions.")
+            self.stdout.write(self.style.SUCCESS("No latency regressions."))
+
+    def write_result(self, result):
+        self.stdout.write(
+            f"{result['size']:>9} {get_name(result):<25} "
+            f"p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+            f"p99 {result['p99_ms']:8.2f} ms  {result['throughput_rps']:8.1f} req/s"
+            + (f"  {result['errors']} errors" if result["errors"] else "")
+        )
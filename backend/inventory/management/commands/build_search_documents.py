@@ -0,0 +1,27 @@
+"""
+Builds the search documents of the database search backend, see
+backend/inventory/db_search.py. Run once after enabling the backend; the
+documents are kept current by signals afterwards.
+
+Usage:
+    python manage.py build_search_documents
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from backend.inventory.db_search import SEARCH_MODELS, rebuild_search_documents
+
+
+class Command(BaseCommand):
+    help = "Builds the search documents used by the database search backend."
+
+    def handle(self, *args, **options):
+        for model in SEARCH_MODELS:
+            started = time.monotonic()
+            count = rebuild_search_documents(model)
+            self.stdout.write(
+                f"Built {count} {model._meta.verbose_name} documents "
+                f"in {time.monotonic() - started:.1f}s"
+            )
@@ -0,0 +1,68 @@
+"""
+Writes queued search index updates, see backend/inventory/search_queue.py.
+
+Only one drainer runs at a time: the command holds an exclusive lock on
+`SEARCH_QUEUE["LOCK_FILE"]` and exits if another process has it.
+
+Usage:
+    python manage.py drain_search_queue          # Runs until stopped
+    python manage.py drain_search_queue --once   # Drains the queue and exits
+"""
+
+import fcntl
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.inventory.search_queue import drain_batch, get_queue_stats, get_setting
+
+
+class Command(BaseCommand):
+    help = "Writes queued search index updates in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty instead of polling for entries.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Queue entries indexed per commit.",
+        )
+        parser.add_argument(
+            "--using",
+            default="default",
+            help="The Haystack connection to write to.",
+        )
+
+    def handle(self, *args, **options):
+        lock_path = get_setting("LOCK_FILE")
+        if not lock_path:
+            return self.drain(options)
+
+        with open(lock_path, "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise CommandError(f"Another drainer holds {lock_path}.")
+            self.drain(options)
+
+    def drain(self, options):
+        poll_interval = get_setting("POLL_INTERVAL")
+        while True:
+            stats = get_queue_stats()
+            started = time.monotonic()
+            processed = drain_batch(options["using"], options["batch_size"])
+            if processed:
+                self.stdout.write(
+                    f"Indexed {processed} entries in "
+                    f"{time.monotonic() - started:.2f}s "
+                    f"(pending {stats['pending']}, lag {stats['lag']:.1f}s)"
+                )
+            elif options["once"]:
+                return
+            else:
+                time.sleep(poll_interval)
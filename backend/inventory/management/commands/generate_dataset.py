@@ -0,0 +1,104 @@
+"""
+Generates a seeded synthetic dataset for load testing, see
+backend/inventory/helpers/dataset.py.
+
+The same `--seed` and `--chunk-size` always generate the same rows. Rows of
+different seeds do not collide, so several datasets can be loaded into one
+database; a seed that was already loaded is refused.
+
+Bulk inserts bypass the search queue. Run `inventory_reindex --full` (or
+`build_search_documents` with the database search backend) afterwards.
+
+Usage:
+    python manage.py generate_dataset --devices 1000000 --workers 8
+    python manage.py generate_dataset --devices 50000 --seed 7 --donors 200
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.inventory.helpers.dataset import DATASET_CHUNK_SIZE, create_dataset
+from backend.inventory.models import Location
+
+
+class Command(BaseCommand):
+    help = "Generates a reproducible synthetic inventory of any size."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--devices", type=int, default=100000, help="Devices to create."
+        )
+        parser.add_argument(
+            "--locations", type=int, default=50, help="Locations to create."
+        )
+        parser.add_argument(
+            "--donors", type=int, default=1000, help="Donors to create."
+        )
+        parser.add_argument(
+            "--shipments", type=int, default=10000, help="Shipments to create."
+        )
+        parser.add_argument(
+            "--seed", type=int, default=1, help="Seed of the generated rows."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DATASET_CHUNK_SIZE,
+            help="Rows written per INSERT and per transaction.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Processes building device chunks; the command inserts them.",
+        )
+
+    def handle(self, *args, **options):
+        for name in ("devices", "donors", "shipments"):
+            if options[name] < 0:
+                raise CommandError(f"--{name} cannot be negative.")
+        if options["locations"] < 1:
+            raise CommandError("--locations must be at least 1.")
+        if options["chunk_size"] < 1 or options["workers"] < 1:
+            raise CommandError("--chunk-size and --workers must be positive.")
+
+        seed = options["seed"]
+        if Location.objects.filter(name__startswith=f"Location {seed}-").exists():
+            raise CommandError(
+                f"A dataset with seed {seed} was already generated; "
+                "use another --seed."
+            )
+
+        started = time.monotonic()
+
+        def progress(count):
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"{count}/{options['devices']} devices, "
+                f"{count / max(elapsed, 1e-6):.0f} rows/s"
+            )
+
+        counts = create_dataset(
+            seed,
+            options["devices"],
+            locations=options["locations"],
+            donors=options["donors"],
+            shipments=options["shipments"],
+            chunk_size=options["chunk_size"],
+            workers=options["workers"],
+            progress=progress,
+        )
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {counts['devices']} devices, {counts['locations']} "
+                f"locations, {counts['donors']} donors, {counts['shipments']} "
+                f"shipments and {counts['shipment_links']} shipment links "
+                f"in {elapsed:.1f}s."
+            )
+        )
+        self.stdout.write(
+            "Run `inventory_reindex --full` to index the new rows for search."
+        )
@@ -0,0 +1,88 @@
+"""
+Indexes devices, donors and locations, see backend/inventory/reindex.py.
+
+By default only rows changed since the last run are indexed; models that
+have never been indexed are rebuilt. `--full` rebuilds every model with a
+pool of `--workers` processes. Rebuilds replace documents in place and
+remove those of deleted rows last, so search keeps answering meanwhile.
+
+Usage:
+    python manage.py inventory_reindex                      # Changed rows
+    python manage.py inventory_reindex --full --workers 8   # Full rebuild
+    python manage.py inventory_reindex device               # Devices only
+"""
+
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.inventory.models import Device, Donor, Location
+from backend.inventory.reindex import reindex_changed, reindex_full
+
+INDEXED_MODELS = {
+    "device": Device,
+    "donor": Donor,
+    "location": Location,
+}
+
+
+class Command(BaseCommand):
+    help = "Indexes inventory rows changed since the last run, or all of them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models",
+            nargs="*",
+            help="Models to index (device, donor, location), all by default.",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rebuild the documents of every row instead of changed rows.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Processes used by full rebuilds.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=None,
+            help="Rows rendered and written per backend update.",
+        )
+        parser.add_argument(
+            "--using",
+            default="default",
+            help="The Haystack connection to write to.",
+        )
+
+    def handle(self, *args, **options):
+        unknown = set(options["models"]) - set(INDEXED_MODELS)
+        if unknown:
+            raise CommandError(f"Unknown models: {', '.join(sorted(unknown))}.")
+
+        for name in options["models"] or INDEXED_MODELS:
+            model = INDEXED_MODELS[name]
+            started = time.monotonic()
+
+            count = None
+            if not options["full"]:
+                count = reindex_changed(model, options["using"], options["chunk_size"])
+            mode = "changed rows"
+            if count is None:
+                mode = "full rebuild"
+                count = reindex_full(
+                    model,
+                    options["using"],
+                    options["workers"],
+                    options["chunk_size"],
+                )
+
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"Indexed {count} {model._meta.verbose_name_plural} ({mode}) "
+                f"in {elapsed:.1f}s, {count / max(elapsed, 1e-6):.0f} rows/s"
+            )
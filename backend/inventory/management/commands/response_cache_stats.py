@@ -0,0 +1,36 @@
+"""
+Reports the hit rate of the list response cache, see
+backend/inventory/response_cache.py.
+
+Counts are read from the response cache, so the command only sees the
+server's lookups when that cache is shared between processes, as the
+file-based one is.
+
+Usage:
+    python manage.py response_cache_stats
+    python manage.py response_cache_stats --reset
+"""
+
+from django.core.management.base import BaseCommand
+
+from backend.inventory.response_cache import get_cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Prints the hits, misses and hit rate of the list response cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Start counting again after printing.",
+        )
+
+    def handle(self, *args, **options):
+        stats = get_cache_stats()
+        self.stdout.write(
+            f"{stats['hits']} hits, {stats['misses']} misses, "
+            f"hit rate {stats['hit_rate']:.1%}"
+        )
+        if options["reset"]:
+            reset_cache_stats()
@@ -0,0 +1,52 @@
+# Generated by Django 5.0.7 on 2024-08-16 11:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0002_location_remove_device_location_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="device",
+            index=models.Index(
+                fields=["type", "device_id"], name="device_type_keyset_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="device",
+            index=models.Index(
+                fields=["make", "device_id"], name="device_make_keyset_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="device",
+            index=models.Index(
+                fields=["model", "device_id"], name="device_model_keyset_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="device",
+            index=models.Index(
+                fields=["year_of_manufacture", "device_id"],
+                name="device_year_keyset_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="donor",
+            index=models.Index(
+                fields=["name", "donor_id"], name="donor_name_keyset_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="location",
+            index=models.Index(
+                fields=["name", "location_id"], name="location_name_keyset_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.0.7 on 2024-08-23 16:40
+
+from django.db import migrations, models
+
+SQLITE_FULL_TEXT = [
+    # External content FTS5 table over inventory_searchdocument.body
+    "CREATE VIRTUAL TABLE inventory_searchdocument_fts USING fts5("
+    "body, content='inventory_searchdocument', content_rowid='id')",
+    "CREATE TRIGGER inventory_searchdocument_ai "
+    "AFTER INSERT ON inventory_searchdocument BEGIN "
+    "INSERT INTO inventory_searchdocument_fts(rowid, body) "
+    "VALUES (new.id, new.body); END",
+    "CREATE TRIGGER inventory_searchdocument_ad "
+    "AFTER DELETE ON inventory_searchdocument BEGIN "
+    "INSERT INTO inventory_searchdocument_fts"
+    "(inventory_searchdocument_fts, rowid, body) "
+    "VALUES ('delete', old.id, old.body); END",
+    "CREATE TRIGGER inventory_searchdocument_au "
+    "AFTER UPDATE ON inventory_searchdocument BEGIN "
+    "INSERT INTO inventory_searchdocument_fts"
+    "(inventory_searchdocument_fts, rowid, body) "
+    "VALUES ('delete', old.id, old.body); "
+    "INSERT INTO inventory_searchdocument_fts(rowid, body) "
+    "VALUES (new.id, new.body); END",
+]
+
+SQLITE_DROP_FULL_TEXT = [
+    "DROP TRIGGER IF EXISTS inventory_searchdocument_au",
+    "DROP TRIGGER IF EXISTS inventory_searchdocument_ad",
+    "DROP TRIGGER IF EXISTS inventory_searchdocument_ai",
+    "DROP TABLE IF EXISTS inventory_searchdocument_fts",
+]
+
+MYSQL_FULL_TEXT = [
+    "CREATE FULLTEXT INDEX search_document_body_ft "
+    "ON inventory_searchdocument (body)",
+]
+
+MYSQL_DROP_FULL_TEXT = [
+    "DROP INDEX search_document_body_ft ON inventory_searchdocument",
+]
+
+
+def run_for_vendor(sqlite, mysql):
+    def run(apps, schema_editor):
+        statements = {"sqlite": sqlite, "mysql": mysql}
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0005_updated_at_search_index_watermark"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model", models.CharField(max_length=100)),
+                ("object_pk", models.CharField(max_length=64)),
+                ("body", models.TextField()),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("model", "object_pk"),
+                        name="search_document_object_unique",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(
+            run_for_vendor(SQLITE_FULL_TEXT, MYSQL_FULL_TEXT),
+            run_for_vendor(SQLITE_DROP_FULL_TEXT, MYSQL_DROP_FULL_TEXT),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.0.7 on 2024-08-27 09:12
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def build_rollups(apps, schema_editor):
+    Device = apps.get_model("inventory", "Device")
+    InventoryRollup = apps.get_model("inventory", "InventoryRollup")
+    groups = (
+        Device.objects.values("end_location", "type", "physical_condition")
+        .annotate(device_count=Count("pk"), total_value=Sum("value"))
+        .order_by()
+    )
+    InventoryRollup.objects.bulk_create(
+        [
+            InventoryRollup(
+                end_location_id=group["end_location"] or 0,
+                type=group["type"],
+                physical_condition=group["physical_condition"],
+                device_count=group["device_count"],
+                total_value=group["total_value"] or 0,
+            )
+            for group in groups
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0006_search_document"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InventoryRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("end_location_id", models.IntegerField(default=0)),
+                ("type", models.CharField(max_length=100)),
+                ("physical_condition", models.CharField(max_length=100)),
+                ("device_count", models.IntegerField(default=0)),
+                (
+                    "total_value",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("end_location_id", "type", "physical_condition"),
+                        name="inventory_rollup_group_unique",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.0.7 on 2024-08-28 10:31
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+TRUNCATIONS = {"day": TruncDay, "week": TruncWeek, "month": TruncMonth}
+
+
+def build_rollups(apps, schema_editor):
+    Device = apps.get_model("inventory", "Device")
+    HistoryRollup = apps.get_model("inventory", "HistoryRollup")
+    rows = {}
+    for granularity, trunc in TRUNCATIONS.items():
+        for date_field, count_field, value_field in (
+            ("date_received", "received_count", "received_value"),
+            ("date_of_donation", "donated_count", "donated_value"),
+        ):
+            groups = (
+                Device.objects.filter(**{f"{date_field}__isnull": False})
+                .annotate(period_start=trunc(date_field))
+                .values("period_start", "donor", "type")
+                .annotate(device_count=Count("pk"), total_value=Sum("value"))
+                .order_by()
+            )
+            for group in groups:
+                key = (
+                    granularity,
+                    group["period_start"],
+                    group["donor"] or 0,
+                    group["type"],
+                )
+                if key not in rows:
+                    rows[key] = HistoryRollup(
+                        granularity=granularity,
+                        period_start=group["period_start"],
+                        donor_id=group["donor"] or 0,
+                        type=group["type"],
+                    )
+                setattr(rows[key], count_field, group["device_count"])
+                setattr(rows[key], value_field, group["total_value"] or 0)
+    HistoryRollup.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0007_inventory_rollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HistoryRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("granularity", models.CharField(max_length=5)),
+                ("period_start", models.DateField()),
+                ("donor_id", models.IntegerField(default=0)),
+                ("type", models.CharField(max_length=100)),
+                ("received_count", models.IntegerField(default=0)),
+                (
+                    "received_value",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                ("donated_count", models.IntegerField(default=0)),
+                (
+                    "donated_value",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("granularity", "period_start", "donor_id", "type"),
+                        name="history_rollup_period_unique",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
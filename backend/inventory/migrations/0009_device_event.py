@@ -0,0 +1,47 @@
+# Generated by Django 5.0.7 on 2024-08-29 14:05
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0008_history_rollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeviceEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("device_id", models.UUIDField()),
+                ("action", models.CharField(max_length=10)),
+                (
+                    "changes",
+                    models.JSONField(
+                        default=dict,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                    ),
+                ),
+                ("source", models.CharField(blank=True, max_length=20)),
+                ("user_id", models.IntegerField(null=True)),
+                ("recorded_at", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["device_id", "id"], name="device_event_keyset_idx"
+                    )
+                ],
+            },
+        ),
+    ]
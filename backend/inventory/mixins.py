@@ -1,20 +1,80 @@
+import hashlib
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from haystack.query import SearchQuerySet
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from backend.instrumentation import timed
+
+from . import db_search, response_cache
+from .generations import (
+    get_generations,
+    get_modified_times,
+    get_queryset_tables,
+    is_process_local,
+)
+from .query_planning import get_known_fields, get_query_plan
+
+
+def get_rendered_tables(model):
+    """
+    Returns the many-to-many tables rendered with objects of `model`.
+    """
+    return [
+        field.remote_field.through._meta.db_table for field in model._meta.many_to_many
+    ]
+
+
+def get_list_tables(view):
+    """
+    Returns the tables the list of `view` reads and renders.
+    """
+    queryset = view.filter_queryset(view.get_queryset())
+    return sorted(
+        set(get_queryset_tables(queryset))
+        | set(get_rendered_tables(view.queryset.model))
+    )
 
 
 class SearchAndLimitMixin:
+    """
+    Adds Haystack `?search=` and `?limit=` to list views.
+
+    A plain search (optionally with `page`, `page_size` and `fields`) is
+    paged in the search engine: only the hits of the requested page are
+    fetched, in relevance order, and hydrated with one `pk__in` query.
+    Searches combined with filters, ordering, cursors or `limit` intersect
+    the search hits with the database query instead.
+
+    With the database search backend (`INVENTORY_SEARCH["BACKEND"]`), the
+    search is a full-text subquery of the list query, see db_search.py.
+    """
+
     search_fields = []
     filterset_fields = []
     ordering_fields = []
     ordering = []
+    # Parameters that can be served by paging in the search engine
+    search_paging_params = {"search", "page", "page_size", "fields"}
+    search_paged = False
+
+    def get_search_results(self, search_query):
+        return SearchQuerySet().models(self.queryset.model).filter(content=search_query)
 
     def search_queryset(self, queryset, search_query):
-        if search_query:
-            sqs = (
-                SearchQuerySet()
-                .models(self.queryset.model)
-                .filter(content=search_query)
+        if search_query and db_search.is_enabled():
+            return queryset.filter(
+                pk__in=db_search.search_filter(self.queryset.model, search_query)
             )
-            object_ids = [result.pk for result in sqs]
+        if search_query:
+            with timed("search"):
+                sqs = self.get_search_results(search_query)
+                object_ids = [result.pk for result in sqs]
             pk_field = self.get_pk_field()
             queryset = queryset.filter(**{f"{pk_field}__in": object_ids})
         return queryset
@@ -24,13 +84,252 @@ class SearchAndLimitMixin:
 
     def get_queryset(self):
         queryset = super().get_queryset()
+        if self.search_paged:
+            return queryset
+
         search_query = self.request.query_params.get("search", None)
-        limit = self.request.query_params.get("limit", None)
+        return self.search_queryset(queryset, search_query)
 
-        queryset = self.search_queryset(queryset, search_query)
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.search_paged or self.action != "list":
+            return queryset
 
         # Apply limit after all other query modifications
+        limit = self.get_limit()
         if limit:
-            queryset = queryset[: int(limit)]
-
+            queryset = queryset[:limit]
         return queryset
+
+    def get_limit(self):
+        """
+        Returns the `?limit=` of the request, or None. Cursor pages filter
+        the queryset after this, which a sliced queryset cannot be.
+        """
+        limit = self.request.query_params.get("limit", None)
+        if not limit:
+            return None
+        cursor_query_param = getattr(self.paginator, "cursor_query_param", None)
+        if cursor_query_param in self.request.query_params:
+            raise ValidationError(
+                {"limit": "Cannot be combined with a cursor; use page_size."}
+            )
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            raise ValidationError({"limit": "Must be a positive integer."})
+        return limit
+
+    def can_page_search(self, request):
+        """
+        Returns whether a search request can be paged in the search engine.
+        """
+        if db_search.is_enabled():
+            return False
+        return bool(request.query_params.get("search")) and set(
+            request.query_params
+        ) <= set(self.search_paging_params)
+
+    def hydrate_search_results(self, results):
+        """
+        Loads the objects of `results` with one query, keeping their order.
+        Hits whose object no longer exists are dropped.
+        """
+        objects = {
+            str(pk): obj
+            for pk, obj in self.get_queryset()
+            .in_bulk([result.pk for result in results])
+            .items()
+        }
+        return [objects[result.pk] for result in results if result.pk in objects]
+
+    def list(self, request, *args, **kwargs):
+        if not self.can_page_search(request):
+            return super().list(request, *args, **kwargs)
+
+        self.search_paged = True
+        results = self.get_search_results(request.query_params["search"])
+        with timed("search"):
+            page = self.paginate_queryset(results)
+            objects = self.hydrate_search_results(results if page is None else page)
+        serializer = self.get_serializer(objects, many=True)
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+
+class QueryPlanMixin:
+    """
+    Loads everything the serializer renders in a constant number of queries.
+
+    The select_related/prefetch_related/only() plan is derived from the
+    serializer fields, see query_planning.py. `?fields=a,b` limits the
+    rendered fields and, for reads, the selected columns.
+    """
+
+    fields_query_param = "fields"
+
+    def get_requested_fields(self):
+        request = getattr(self, "request", None)
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        fields = request.query_params.get(self.fields_query_param)
+        if not fields:
+            return None
+        return tuple(sorted({field.strip() for field in fields.split(",")} - {""}))
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs.setdefault("fields", fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        fields = get_known_fields(serializer_class, self.get_requested_fields())
+        plan = get_query_plan(serializer_class, fields)
+        return plan.apply(queryset, prune_columns=self.request.method in SAFE_METHODS)
+
+
+class ConditionalGetMixin:
+    """
+    Adds strong `ETag` and `Last-Modified` headers to list and detail
+    responses, and answers requests whose `If-None-Match` or
+    `If-Modified-Since` still match with 304 Not Modified, before the list
+    query runs or anything is serialized.
+
+    Lists are versioned by the generations of the tables they read and
+    render, see generations.py, which costs no query. Details are versioned
+    by their row's `version_field` and foreign keys, which deletes of
+    related objects null without touching it, read with one indexed query,
+    and by the generations of the many-to-many tables they render.
+    Searches are not versioned; the search index changes out of band.
+
+    Generations only see the writes of other processes when the `inventory`
+    cache is shared between them. While it is process-local, lists are not
+    versioned, as a 304 could be answered for a list another process wrote
+    to. Many-to-many links of details made elsewhere stay unseen until the
+    row is saved.
+    """
+
+    version_field = "updated_at"
+
+    def get_list_version(self):
+        """
+        :return: A `(version, last_modified)` tuple, or None while
+            generations are process-local.
+        """
+        if is_process_local():
+            return None
+        tables = get_list_tables(self)
+        return get_generations(tables), max(get_modified_times(tables))
+
+    def get_detail_version(self):
+        """
+        :return: A `(version, last_modified)` tuple, or None if the object
+            does not exist.
+        """
+        model = self.queryset.model
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        columns = [
+            self.version_field,
+            *(
+                field.attname
+                for field in model._meta.concrete_fields
+                if field.is_relation
+            ),
+        ]
+        try:
+            row = (
+                model._default_manager.filter(**{self.lookup_field: lookup})
+                .values_list(*columns)
+                .first()
+            )
+        except (ValueError, DjangoValidationError):
+            return None
+        if row is None:
+            return None
+        tables = get_rendered_tables(model)
+        return (
+            (row, get_generations(tables)),
+            max([row[0].timestamp(), *get_modified_times(tables)]),
+        )
+
+    def get_etag(self, request, version):
+        # Responses differ by URL, including the host of pagination links,
+        # and by renderer
+        signature = repr(
+            (request.build_absolute_uri(), request.accepted_media_type, version)
+        )
+        return f'"{hashlib.md5(signature.encode("utf-8")).hexdigest()}"'
+
+    def respond_conditionally(self, request, get_version, respond):
+        if request.method not in ("GET", "HEAD") or request.query_params.get("search"):
+            return respond()
+        versioned = get_version()
+        if versioned is None:
+            return respond()
+
+        version, last_modified = versioned
+        etag = self.get_etag(request, version)
+        last_modified = int(last_modified)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = respond()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.respond_conditionally(
+            request,
+            self.get_list_version,
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.respond_conditionally(
+            request,
+            self.get_detail_version,
+            lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs),
+        )
+
+
+class CachedListMixin:
+    """
+    Serves list responses from the response cache, see response_cache.py.
+    Cached responses skip filtering, counting and serialization; they carry
+    `X-Cache: HIT`, others `X-Cache: MISS`. Lists are not cached while
+    generations are process-local, as entries would outlive the writes of
+    other processes.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if (
+            not response_cache.get_setting("ENABLED")
+            or is_process_local()
+            or request.query_params.get("search")
+        ):
+            return super().list(request, *args, **kwargs)
+
+        key = response_cache.get_cache_key(
+            self.queryset.model, request, get_list_tables(self)
+        )
+        data = response_cache.get_cached_data(key)
+        if data is not None:
+            response = Response(data)
+            response["X-Cache"] = "HIT"
+            return response
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response_cache.set_cached_data(key, response.data)
+            response["X-Cache"] = "MISS"
+        return response
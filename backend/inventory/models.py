@@ -1,5 +1,6 @@
 import uuid
 
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import EmailValidator
 from django.db import models
 from django.utils.translation import gettext_lazy as _
@@ -50,6 +51,9 @@ class Location(models.Model):
         phone (str): The phone number of the warehouse.
             - Constraints:
                 - Must be between 1 and 20 characters in
+        updated_at (datetime): When the warehouse was last saved.
+            - Constraints:
+                - Set automatically on save (auto_now), indexed.
     """
 
     location_id = models.AutoField(primary_key=True)
@@ -60,6 +64,15 @@ class Location(models.Model):
     city = models.CharField(max_length=100)
     postal_code = models.CharField(max_length=20)
     phone = models.CharField(max_length=20, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination seeks on the ordering plus the primary key
+            models.Index(
+                fields=["name", "location_id"], name="location_name_keyset_idx"
+            ),
+        ]
 
 
 class Donor(models.Model):
@@ -86,6 +99,9 @@ class Donor(models.Model):
         phone (str): The phone number of the donor.
             - Constraints:
                 - Must be between 1 and 20 characters in length.
+        updated_at (datetime): When the donor was last saved.
+            - Constraints:
+                - Set automatically on save (auto_now), indexed.
     """
 
     donor_id = models.AutoField(primary_key=True)
@@ -98,6 +114,13 @@ class Donor(models.Model):
         validators=[EmailValidator()],
     )
     phone = models.CharField(max_length=20)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination seeks on the ordering plus the primary key
+            models.Index(fields=["name", "donor_id"], name="donor_name_keyset_idx"),
+        ]
 
 
 class Device(models.Model):
@@ -171,6 +194,9 @@ class Device(models.Model):
         notes (TextField): Additional notes about the device.
             - Constraints:
                 - No specific constraints.
+        updated_at (DateTimeField): When the device was last saved.
+            - Constraints:
+                - Set automatically on save (auto_now), indexed.
     """
 
     device_id = models.UUIDField(primary_key=True, default=uuid.uuid4)
@@ -223,3 +249,173 @@ class Device(models.Model):
     shipping_infos = models.ManyToManyField(
         Shipping, related_name="devices", blank=True
     )
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored values, from which saves compute rollup deltas and
+        # change log diffs, see rollups.py and events.py
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    class Meta:
+        indexes = [
+            # Keyset pagination seeks on the ordering plus the primary key
+            models.Index(fields=["type", "device_id"], name="device_type_keyset_idx"),
+            models.Index(fields=["make", "device_id"], name="device_make_keyset_idx"),
+            models.Index(fields=["model", "device_id"], name="device_model_keyset_idx"),
+            models.Index(
+                fields=["year_of_manufacture", "device_id"],
+                name="device_year_keyset_idx",
+            ),
+        ]
+
+
+class SearchIndexQueue(models.Model):
+    """
+    An object whose search index document is out of date.
+
+    Entries are written by `QueuedSignalProcessor` in the transaction that
+    changed the object and removed once the `drain_search_queue` command has
+    indexed them, see search_queue.py.
+    """
+
+    model = models.CharField(max_length=100)
+    object_pk = models.CharField(max_length=64)
+    queued_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+
+class SearchIndexWatermark(models.Model):
+    """
+    The time up to which a model's changes have been indexed by the
+    `inventory_reindex` command, see reindex.py.
+    """
+
+    model = models.CharField(max_length=100, unique=True)
+    indexed_until = models.DateTimeField()
+
+
+class SearchDocument(models.Model):
+    """
+    The searchable text of a device, donor or location, used by the database
+    search backend, see db_search.py.
+
+    Attributes:
+        model (str): The label of the object's model, e.g. "inventory.device".
+        object_pk (str): The object's primary key, as stored by the database.
+        body (str): The text rendered from the model's search template.
+    """
+
+    model = models.CharField(max_length=100)
+    object_pk = models.CharField(max_length=64)
+    body = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["model", "object_pk"], name="search_document_object_unique"
+            ),
+        ]
+
+
+class InventoryRollup(models.Model):
+    """
+    The number and total value of the devices of one end location, type and
+    physical condition, kept current by signals, see rollups.py.
+
+    Attributes:
+        end_location_id (int): The primary key of the devices' end location,
+            0 for devices without one. Not a foreign key, so that deleting a
+            location does not write to the rollups; groups of deleted
+            locations are read as devices without one.
+        type (str): The devices' type.
+        physical_condition (str): The devices' physical condition.
+        device_count (int): The number of devices in the group.
+        total_value (Decimal): The summed value of the devices in the group.
+    """
+
+    end_location_id = models.IntegerField(default=0)
+    type = models.CharField(max_length=100)
+    physical_condition = models.CharField(max_length=100)
+    device_count = models.IntegerField(default=0)
+    total_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["end_location_id", "type", "physical_condition"],
+                name="inventory_rollup_group_unique",
+            ),
+        ]
+
+
+class HistoryRollup(models.Model):
+    """
+    The devices of one donor and type received and donated in one day, week
+    or month, kept current by signals, see rollups.py.
+
+    Attributes:
+        granularity (str): The length of the period, "day", "week" or "month".
+        period_start (date): The first day of the period; weeks start on
+            Mondays.
+        donor_id (int): The primary key of the devices' donor, 0 for devices
+            without one. Not a foreign key, like
+            `InventoryRollup.end_location_id`.
+        type (str): The devices' type.
+        received_count (int): The devices with a `date_received` in the period.
+        received_value (Decimal): The summed value of the devices received.
+        donated_count (int): The devices with a `date_of_donation` in the
+            period.
+        donated_value (Decimal): The summed value of the devices donated.
+    """
+
+    granularity = models.CharField(max_length=5)
+    period_start = models.DateField()
+    donor_id = models.IntegerField(default=0)
+    type = models.CharField(max_length=100)
+    received_count = models.IntegerField(default=0)
+    received_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    donated_count = models.IntegerField(default=0)
+    donated_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # Also serves the period range scans of reports
+            models.UniqueConstraint(
+                fields=["granularity", "period_start", "donor_id", "type"],
+                name="history_rollup_period_unique",
+            ),
+        ]
+
+
+class DeviceEvent(models.Model):
+    """
+    A change to a device, appended to its change log, see events.py.
+
+    Attributes:
+        device_id (UUID): The primary key of the device. Not a foreign key,
+            so that the log of a deleted device is kept.
+        action (str): "create", "update", "delete" or "dispatch".
+        changes (dict): The changed fields, by name, as `[old, new]` pairs;
+            foreign keys are given as primary keys. Creates have no old
+            values and deletes no new ones; dispatches give the shipment.
+        source (str): The write path that made the change, such as "api",
+            "batch" or "shipping"; empty when unknown.
+        user_id (int): The primary key of the user who made the change, if
+            known.
+        recorded_at (datetime): When the change was made.
+    """
+
+    device_id = models.UUIDField()
+    action = models.CharField(max_length=10)
+    changes = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    source = models.CharField(max_length=20, blank=True)
+    user_id = models.IntegerField(null=True)
+    recorded_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Device histories are keyset paged newest first
+            models.Index(fields=["device_id", "id"], name="device_event_keyset_idx"),
+        ]
@@ -5,23 +5,79 @@ Attributes:
     page_size (int): Default number of items per page.
     page_size_query_param (str): Query parameter name for overriding `page_size`.
     max_page_size (int): Maximum number of items per page.
+    cursor_query_param (str): Query parameter name that switches to keyset pagination.
+    page_by_default (bool): Whether requests without paging parameters are paginated.
+    count_strategy (str): Name of the count strategy used for `count`, see
+        counting.py. Views may override it with their own `count_strategy`.
 
 Methods:
     get_paginated_response(data):
         Returns a paginated Response object with links to next and previous pages,
-        total count of items, total number of pages, and the paginated data results.
+        total count of items, the strategy that produced the count, total number
+        of pages, and the paginated data results.
+
+Keyset pagination:
+    Sending `?cursor=` (empty for the first page) switches to keyset pagination.
+    The page is selected with a WHERE clause seeking past the last row of the
+    previous page on the active ordering plus the primary key, so deep pages
+    cost the same as the first one and no COUNT(*) is run. Cursors are opaque;
+    clients follow the `next`/`previous` links. NULLs sort as the lowest value,
+    as they do on MySQL and SQLite.
 """
 
+import base64
+import json
 import math
+from functools import partial
 
+from django.core.paginator import Paginator
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .counting import get_count_strategy
+
+
+def encode_cursor(values, reverse=False):
+    payload = json.dumps({"v": values, "r": int(reverse)}, default=str)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(encoded):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+        return payload["v"], bool(payload["r"])
+    except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+        raise NotFound("Invalid cursor.")
+
+
+class CountingPaginator(Paginator):
+    """
+    Paginator that obtains its count through a count strategy.
+    """
+
+    def __init__(self, *args, count_strategy, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_strategy = count_strategy
+        self.count_strategy_name = None
+
+    @cached_property
+    def count(self):
+        count, self.count_strategy_name = self.count_strategy.count(self.object_list)
+        return count
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 10  # Default number of items per page
     page_size_query_param = "page_size"
     max_page_size = 100  # Maximum number of items per page
+    cursor_query_param = "cursor"
+    page_by_default = True
+    count_strategy = None
 
     def get_page_size(self, request):
         """
@@ -38,7 +94,37 @@ class CustomPagination(PageNumberPagination):
                 pass
         return self.page_size
 
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keyset = self.cursor_query_param in request.query_params
+        if self.keyset:
+            return self.paginate_keyset(queryset, request, view)
+
+        if not self.page_by_default and not any(
+            param in request.query_params
+            for param in (self.page_query_param, self.page_size_query_param)
+        ):
+            return None
+
+        strategy = get_count_strategy(
+            getattr(view, "count_strategy", None) or self.count_strategy
+        )
+        self.django_paginator_class = partial(
+            CountingPaginator, count_strategy=strategy
+        )
+        return super().paginate_queryset(queryset, request, view)
+
     def get_paginated_response(self, data):
+        if self.keyset:
+            return Response(
+                {
+                    "links": {
+                        "next": self.next_cursor_link,
+                        "previous": self.previous_cursor_link,
+                    },
+                    "results": data,
+                }
+            )
         return Response(
             {
                 "links": {
@@ -46,9 +132,138 @@ class CustomPagination(PageNumberPagination):
                     "previous": self.get_previous_link(),
                 },
                 "count": self.page.paginator.count,
+                "count_strategy": self.page.paginator.count_strategy_name,
                 "total_pages": math.ceil(
                     self.page.paginator.count / self.get_page_size(self.request)
                 ),
                 "results": data,
             }
         )
+
+    # Keyset pagination
+
+    def get_keyset_ordering(self, queryset, request, view):
+        """
+        Returns the active ordering, terminated by the primary key so that
+        every row has a unique position.
+        """
+        ordering = None
+        for backend in getattr(view, "filter_backends", []):
+            if issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        if ordering is None:
+            ordering = list(queryset.query.order_by) or list(
+                getattr(view, "ordering", None) or []
+            )
+        if isinstance(ordering, str):
+            ordering = [ordering]
+
+        pk_name = queryset.model._meta.pk.name
+        keyset = []
+        for field in ordering:
+            name = field.lstrip("-")
+            if name in ("pk", pk_name):
+                keyset.append(field.replace("pk", pk_name, 1))
+                return keyset
+            keyset.append(field)
+        keyset.append(pk_name)
+        return keyset
+
+    def get_seek_filter(self, ordering, values):
+        """
+        Builds the WHERE clause selecting the rows positioned after `values`
+        in `ordering`: (a > x) OR (a = x AND b > y) OR ...
+        """
+        seek = Q(pk__in=[])
+        equal = Q()
+        for field, value in zip(ordering, values):
+            descending = field.startswith("-")
+            name = field.lstrip("-")
+            if value is None:
+                after = Q(pk__in=[]) if descending else Q(**{f"{name}__isnull": False})
+                same = Q(**{f"{name}__isnull": True})
+            elif descending:
+                after = Q(**{f"{name}__lt": value}) | Q(**{f"{name}__isnull": True})
+                same = Q(**{name: value})
+            else:
+                after = Q(**{f"{name}__gt": value})
+                same = Q(**{name: value})
+            seek |= equal & after
+            equal &= same
+        return seek
+
+    def paginate_keyset(self, queryset, request, view):
+        page_size = self.get_page_size(request)
+        ordering = self.get_keyset_ordering(queryset, request, view)
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        values, reverse = decode_cursor(encoded) if encoded else (None, False)
+        if values is not None and len(values) != len(ordering):
+            raise NotFound("Invalid cursor.")
+
+        # Walking backwards is walking forwards on the inverted ordering
+        if reverse:
+            ordering = [
+                field[1:] if field.startswith("-") else f"-{field}"
+                for field in ordering
+            ]
+
+        # Selected alongside each row so cursors can be built from the
+        # boundary rows without touching related objects
+        self.cursor_attrs = [f"_cursor_{index}" for index in range(len(ordering))]
+        queryset = queryset.annotate(
+            **{
+                attr: F(field.lstrip("-"))
+                for attr, field in zip(self.cursor_attrs, ordering)
+            }
+        ).order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self.get_seek_filter(ordering, values))
+
+        rows = list(queryset[: page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_cursor_link = None
+        self.previous_cursor_link = None
+        if rows:
+            has_next = values is not None if reverse else has_more
+            has_previous = has_more if reverse else values is not None
+            if has_next:
+                self.next_cursor_link = self.get_cursor_link(rows[-1], reverse=False)
+            if has_previous:
+                self.previous_cursor_link = self.get_cursor_link(rows[0], reverse=True)
+        return rows
+
+    def get_cursor_link(self, row, reverse):
+        values = [getattr(row, name) for name in self.cursor_attrs]
+        url = remove_query_param(
+            self.request.build_absolute_uri(), self.page_query_param
+        )
+        return replace_query_param(
+            url, self.cursor_query_param, encode_cursor(values, reverse)
+        )
+
+
+class OptionalPagination(CustomPagination):
+    """
+    Paginates only when the client asks for a page or a cursor; requests
+    without paging parameters keep receiving the full list.
+    """
+
+    page_by_default = False
+
+
+class KeysetPagination(CustomPagination):
+    """
+    Always pages with keyset pagination, on the queryset's ordering. For
+    append-only logs, whose page numbers shift as rows are added.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keyset = True
+        return self.paginate_keyset(queryset, request, view)
@@ -0,0 +1,150 @@
+"""
+Query planning derived from serializer metadata.
+
+`get_query_plan` inspects the fields a serializer will render and works out
+how to load them in a constant number of queries:
+
+- Related objects whose attributes are rendered are joined with
+  `select_related`.
+- Related fields rendered as primary keys read the foreign key column and
+  need no join.
+- Many-to-many and reverse relations are loaded with `prefetch_related`;
+  when only their primary keys are rendered, only that column is fetched.
+- The columns actually rendered are selected with `only()`, unless a field
+  (e.g. a method field) needs the whole instance.
+"""
+
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, RelatedField
+
+
+def renders_pk_only(field):
+    return isinstance(field, RelatedField) and field.use_pk_only_optimization()
+
+
+class QueryPlan:
+    """
+    The `select_related`, `prefetch_related` and `only()` arguments needed
+    to render a serializer's fields.
+    """
+
+    def __init__(self, model, select_related=(), prefetch_related=(), only=None):
+        self.model = model
+        self.select_related = tuple(select_related)
+        # (lookup, pk_only) pairs; Prefetch objects are built per queryset
+        self.prefetch_related = tuple(prefetch_related)
+        self.only = tuple(only) if only is not None else None
+
+    def get_prefetches(self):
+        prefetches = []
+        for lookup, pk_only in self.prefetch_related:
+            if pk_only:
+                related_model = self.model._meta.get_field(lookup).related_model
+                lookup = Prefetch(
+                    lookup,
+                    queryset=related_model._default_manager.only(
+                        related_model._meta.pk.name
+                    ),
+                )
+            prefetches.append(lookup)
+        return prefetches
+
+    def apply(self, queryset, prune_columns=True):
+        """
+        Applies the plan to a queryset. Column pruning should only be used
+        for querysets whose instances are rendered, not saved.
+        """
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.get_prefetches())
+        if prune_columns and self.only is not None:
+            queryset = queryset.only(*self.only)
+        return queryset
+
+
+@lru_cache(maxsize=None)
+def get_field_names(serializer_class):
+    """
+    Returns the names of the fields a serializer class renders.
+    """
+    return frozenset(
+        name
+        for name, field in serializer_class().fields.items()
+        if not field.write_only
+    )
+
+
+def get_known_fields(serializer_class, fields):
+    """
+    Limits requested `fields` to the ones the serializer renders, so plans
+    are only built for a bounded set of field combinations.
+
+    :return: A sorted tuple, or None if no requested field is known.
+    """
+    if fields is None:
+        return None
+    known = get_field_names(serializer_class)
+    return tuple(sorted(set(fields) & known)) or None
+
+
+@lru_cache(maxsize=256)
+def get_query_plan(serializer_class, fields=None):
+    """
+    Builds the query plan for rendering `fields` (all fields if None) of a
+    model serializer. Callers pass `get_known_fields` of the requested
+    ones.
+    """
+    serializer = serializer_class()
+    model = serializer.Meta.model
+    opts = model._meta
+    if fields is not None and not set(fields) & set(serializer.fields):
+        fields = None
+
+    select_related = set()
+    prefetch_related = []
+    only = {opts.pk.name}
+    prunable = True
+
+    for name, field in serializer.fields.items():
+        if field.write_only or (fields is not None and name not in fields):
+            continue
+        if field.source == "*" or isinstance(field, serializers.SerializerMethodField):
+            prunable = False
+            continue
+
+        path = field.source_attrs
+        try:
+            model_field = opts.get_field(path[0])
+        except FieldDoesNotExist:
+            # Properties and other model attributes may read anything
+            prunable = False
+            continue
+
+        if isinstance(field, ManyRelatedField) or (
+            model_field.is_relation
+            and (model_field.many_to_many or model_field.one_to_many)
+        ):
+            child = getattr(field, "child_relation", None)
+            pk_only = len(path) == 1 and child is not None and renders_pk_only(child)
+            prefetch_related.append((path[0], pk_only))
+            continue
+
+        only.add(path[0])
+        if len(path) > 1:
+            # Dotted sources such as "donor.name" render the related row
+            select_related.add("__".join(path[:-1]))
+        elif model_field.is_relation and not renders_pk_only(field):
+            # Nested serializers and slug/string related fields
+            select_related.add(path[0])
+
+    return QueryPlan(
+        model,
+        select_related=sorted(select_related),
+        prefetch_related=prefetch_related,
+        only=sorted(only) if prunable else None,
+    )
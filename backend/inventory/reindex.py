@@ -0,0 +1,182 @@
+"""
+Incremental and parallel search index rebuilds, used by the
+`inventory_reindex` command.
+
+Incremental runs index the rows whose `updated_at` is at or after the
+model's `SearchIndexWatermark`, then move the watermark to the start of the
+run. Deletions leave no `updated_at` behind; they reach the index through
+the search queue, see search_queue.py.
+
+Full rebuilds split the model's rows into primary key ranges of
+`chunk_size` rows. The ranges are rendered by a pool of worker processes;
+their writes are serialized by the backend's writer lock. Documents are
+replaced in place rather than cleared first, so searches keep returning
+every row during the rebuild; documents of rows that no longer exist are
+removed at the end.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from itertools import repeat
+
+from django import db
+from django.apps import apps
+from django.utils import timezone
+from haystack import connections
+from haystack.query import SearchQuerySet
+
+from .models import SearchIndexWatermark
+
+# Rows rendered and written per backend update
+REINDEX_CHUNK_SIZE = 5000
+
+# Rows saved in transactions that committed after a run started can carry an
+# `updated_at` from before it; the next run re-reads this window to catch them
+WATERMARK_OVERLAP = timedelta(minutes=1)
+
+
+def get_index(model, using="default"):
+    return connections[using].get_unified_index().get_index(model)
+
+
+def get_watermark(model):
+    return (
+        SearchIndexWatermark.objects.filter(model=model._meta.label_lower)
+        .values_list("indexed_until", flat=True)
+        .first()
+    )
+
+
+def set_watermark(model, indexed_until):
+    SearchIndexWatermark.objects.update_or_create(
+        model=model._meta.label_lower, defaults={"indexed_until": indexed_until}
+    )
+
+
+def get_pk_ranges(queryset, chunk_size):
+    """
+    Splits the rows of `queryset` into `(start, end)` primary key ranges of
+    `chunk_size` rows each. `end` is exclusive, and None for the last range.
+    """
+    starts = [
+        pk
+        for position, pk in enumerate(
+            queryset.order_by("pk")
+            .values_list("pk", flat=True)
+            .iterator(chunk_size=chunk_size)
+        )
+        if position % chunk_size == 0
+    ]
+    return list(zip(starts, starts[1:] + [None]))
+
+
+def index_range(label, start, end, using="default"):
+    """
+    Indexes the rows of model `label` with primary keys in `[start, end)`.
+
+    :return: The number of rows indexed.
+    """
+    index = get_index(apps.get_model(label), using)
+    queryset = index.index_queryset(using=using).filter(pk__gte=start)
+    if end is not None:
+        queryset = queryset.filter(pk__lt=end)
+    objects = list(queryset)
+    if objects:
+        connections[using].get_backend().update(index, objects)
+    return len(objects)
+
+
+def remove_stale(model, using="default", chunk_size=None):
+    """
+    Removes the documents of `model` whose rows are no longer indexed.
+
+    Documents are listed before the rows are read, so rows created in
+    between, which may already be indexed, are never removed.
+
+    :return: The number of documents removed.
+    """
+    chunk_size = chunk_size or REINDEX_CHUNK_SIZE
+    documents = SearchQuerySet(using=using).models(model)
+    indexed = set()
+    for start in range(0, documents.count(), chunk_size):
+        indexed.update(result.pk for result in documents[start : start + chunk_size])
+
+    index = get_index(model, using)
+    for pk in (
+        index.index_queryset(using=using)
+        .values_list("pk", flat=True)
+        .iterator(chunk_size=chunk_size)
+    ):
+        indexed.discard(str(pk))
+
+    backend = connections[using].get_backend()
+    for django_id in indexed:
+        backend.remove(f"{model._meta.label_lower}.{django_id}")
+    return len(indexed)
+
+
+def reindex_full(model, using="default", workers=1, chunk_size=None):
+    """
+    Rebuilds the documents of `model`, in parallel when `workers` > 1,
+    then removes those of deleted rows.
+
+    :return: The number of rows indexed.
+    """
+    chunk_size = chunk_size or REINDEX_CHUNK_SIZE
+    started_at = timezone.now()
+    index = get_index(model, using)
+
+    label = model._meta.label_lower
+    ranges = get_pk_ranges(index.index_queryset(using=using), chunk_size)
+    if workers > 1 and len(ranges) > 1:
+        # Forked workers must open their own database connections
+        db.connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")
+        ) as pool:
+            starts, ends = zip(*ranges)
+            count = sum(
+                pool.map(index_range, repeat(label), starts, ends, repeat(using))
+            )
+    else:
+        count = sum(index_range(label, start, end, using) for start, end in ranges)
+
+    remove_stale(model, using, chunk_size)
+    set_watermark(model, started_at)
+    return count
+
+
+def reindex_changed(model, using="default", chunk_size=None):
+    """
+    Indexes the rows of `model` changed since its watermark. Models without
+    a watermark are not indexed; run a full rebuild first.
+
+    :return: The number of rows indexed, or None without a watermark.
+    """
+    chunk_size = chunk_size or REINDEX_CHUNK_SIZE
+    watermark = get_watermark(model)
+    if watermark is None:
+        return None
+
+    started_at = timezone.now()
+    index = get_index(model, using)
+    backend = connections[using].get_backend()
+    queryset = index.index_queryset(using=using).filter(
+        **{f"{index.get_updated_field()}__gte": watermark - WATERMARK_OVERLAP}
+    )
+
+    count = 0
+    objects = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        objects.append(obj)
+        if len(objects) >= chunk_size:
+            backend.update(index, objects)
+            count += len(objects)
+            objects = []
+    if objects:
+        backend.update(index, objects)
+        count += len(objects)
+
+    set_watermark(model, started_at)
+    return count
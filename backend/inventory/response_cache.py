@@ -0,0 +1,153 @@
+"""
+Cached list responses.
+
+`CachedListMixin` stores the data of list responses in the cache named by
+`INVENTORY_RESPONSE_CACHE["CACHE_ALIAS"]`, a local-memory or file-based
+Django cache, for example:
+
+    "responses": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": "/var/tmp/inventory-responses",
+    }
+
+Entries are keyed by the model, the host, the query parameters in a
+canonical order and the permission scope of the requester: the bitmask of
+their permissions. Keys also embed the generations of every table the list
+reads, see generations.py, so saves, deletes, batch operations and imports
+invalidate all dependent entries at once by bumping a counter. Entries also
+expire after `TIMEOUT` seconds.
+
+Generations are read from the ``inventory`` cache, not this one, so lists
+are only cached while the ``inventory`` cache is shared between processes;
+with a process-local one, entries would outlive the writes of other
+processes. This cache may be process-local or shared either way.
+
+Hits and misses are counted in the same cache; `get_cache_stats` reports
+them with the hit rate, see the `response_cache_stats` command. The
+file-based cache increments with a read and a write, so counts are
+incremented under a lock file in its directory. Searches are not cached;
+the search index changes out of band.
+"""
+
+import fcntl
+import hashlib
+import os
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+from backend.authen.authentication import authenticate_request
+from backend.users.claims import PERMISSIONS_CLAIM, SUPERUSER_CLAIM
+from backend.users.helpers import encode_permissions
+
+from .generations import get_generations
+
+DEFAULTS = {
+    "ENABLED": True,
+    "CACHE_ALIAS": "responses",
+    "TIMEOUT": 300,
+}
+
+OUTCOMES = ("hits", "misses")
+
+
+def get_setting(name):
+    return getattr(settings, "INVENTORY_RESPONSE_CACHE", {}).get(name, DEFAULTS[name])
+
+
+def get_cache():
+    return caches[get_setting("CACHE_ALIAS")]
+
+
+def get_permission_scope(request):
+    """
+    Returns the permissions of the requester as a `(bitmask, is_superuser)`
+    tuple, taken from the token's claims when it has them.
+    """
+    auth_result = authenticate_request(request)
+    if auth_result is None:
+        return None
+    user, token = auth_result
+    if PERMISSIONS_CLAIM in token:
+        return token[PERMISSIONS_CLAIM], bool(token.get(SUPERUSER_CLAIM))
+    return encode_permissions(user.permissions), user.is_superuser
+
+
+def get_cache_key(model, request, tables):
+    """
+    Returns the key of the list of `model` requested by `request`, valid
+    for the current generations of `tables`.
+    """
+    params = sorted(request.query_params.lists())
+    signature = hashlib.md5(
+        repr((request.get_host(), params, get_permission_scope(request))).encode(
+            "utf-8"
+        )
+    ).hexdigest()
+    generations = "-".join(str(g) for g in get_generations(tables))
+    return f"list:{model._meta.label_lower}:{signature}:{generations}"
+
+
+@contextmanager
+def counter_lock(cache):
+    """
+    Serializes counter increments of a file-based cache across processes;
+    other backends increment atomically.
+    """
+    if not isinstance(cache, FileBasedCache):
+        yield
+        return
+    location = settings.CACHES[get_setting("CACHE_ALIAS")]["LOCATION"]
+    os.makedirs(location, exist_ok=True)
+    with open(os.path.join(location, "counters.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def count_outcome(outcome):
+    cache = get_cache()
+    key = f"response-cache:{outcome}"
+    with counter_lock(cache):
+        if cache.add(key, 1, None):
+            return
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Evicted since the add
+            cache.set(key, 1, None)
+
+
+def get_cached_data(key):
+    """
+    Returns the cached response data under `key`, or None, and counts the
+    lookup as a hit or a miss.
+    """
+    data = get_cache().get(key)
+    count_outcome("misses" if data is None else "hits")
+    return data
+
+
+def set_cached_data(key, data):
+    get_cache().set(key, data, get_setting("TIMEOUT"))
+
+
+def get_cache_stats():
+    """
+    Returns the number of hits and misses and the hit rate.
+    """
+    counts = get_cache().get_many([f"response-cache:{outcome}" for outcome in OUTCOMES])
+    stats = {
+        outcome: counts.get(f"response-cache:{outcome}", 0) for outcome in OUTCOMES
+    }
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+
+def reset_cache_stats():
+    get_cache().delete_many([f"response-cache:{outcome}" for outcome in OUTCOMES])
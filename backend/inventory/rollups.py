@@ -0,0 +1,663 @@
+"""
+Pre-aggregated device statistics, kept current on write.
+
+Rollups:
+- InventoryRollup: the number and value of devices per end location, type
+  and physical condition, read by `get_inventory_summary`.
+- HistoryRollup: the devices received (by `date_received`) and donated (by
+  `date_of_donation`) per day, week and month, donor and type, read by
+  `get_history_report`.
+
+Reads cost O(groups) whatever the number of devices. Writes to devices add
+deltas to the rows of the groups they leave and join. The deltas of a
+write are applied with one batched upsert per rollup that increments
+existing rows (SQLite, PostgreSQL and MySQL), or with `F()` updates on
+other databases:
+
+- Saves compare the values a device was loaded with (recorded by
+  `Device.from_db`) with the ones it is saved with.
+- Deletes remove the device from the groups it was loaded in.
+- `bulk_changed` creates, updates and deletes use the `previous` values
+  sent with the signal.
+
+Deltas of the writes inside `batched_deltas()`, such as the per-object
+`post_delete` signals of a queryset delete, are grouped and applied once.
+
+Locations and donors are stored as plain primary keys, 0 for none, so that
+deleting them does not write to the rollups; reads report the groups of
+deleted ones like those of devices without one.
+
+Writes that bypass all of these, such as raw SQL, are reconciled by
+`rebuild_inventory_rollups` and `backfill_history_rollups`, see the
+commands of the same names.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.base import DEFERRED
+
+from .models import Device, Donor, HistoryRollup, InventoryRollup, Location
+
+# Device fields the rollups are computed from
+TRACKED_FIELDS = (
+    "end_location",
+    "type",
+    "physical_condition",
+    "value",
+    "donor",
+    "date_received",
+    "date_of_donation",
+)
+FIELDS_BY_ATTNAME = {
+    Device._meta.get_field(name).attname: Device._meta.get_field(name)
+    for name in TRACKED_FIELDS
+}
+TRACKED_ATTNAMES = tuple(FIELDS_BY_ATTNAME)
+
+# Device columns whose stored values are kept on instances
+STORED_ATTNAMES = tuple(field.attname for field in Device._meta.concrete_fields)
+
+# Device fields identifying an inventory rollup group
+GROUP_FIELDS = ("end_location", "type", "physical_condition")
+
+# Dimensions the inventory summary can be grouped by
+SUMMARY_DIMENSIONS = ("end_location", "type", "physical_condition")
+
+# Periods of the history rollups, and the dimensions reports can be grouped by
+GRANULARITIES = ("day", "week", "month")
+HISTORY_DIMENSIONS = ("donor", "type")
+
+# Devices read per query by backfill_history_rollups
+HISTORY_CHUNK_SIZE = 5000
+
+
+def to_decimal(value):
+    if value is None:
+        return Decimal(0)
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
+
+
+def clean_values(values):
+    """
+    Converts a {attname: value} dict of the tracked fields of a device, as
+    they may be set before a save, to the types they are loaded with.
+    """
+    return {
+        name: (
+            to_decimal(value)
+            if name == "value"
+            else FIELDS_BY_ATTNAME[name].to_python(value)
+        )
+        for name, value in values.items()
+    }
+
+
+def get_period_start(day, granularity):
+    """
+    Returns the first day of the `granularity` period containing `day`.
+    Weeks start on Mondays.
+    """
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def get_inventory_contributions(values):
+    return [
+        (
+            (
+                values["end_location_id"] or 0,
+                values["type"],
+                values["physical_condition"],
+            ),
+            (1, values["value"]),
+        )
+    ]
+
+
+def get_history_contributions(values):
+    donor_id = values["donor_id"] or 0
+    contributions = []
+    for granularity in GRANULARITIES:
+        for day, measures in (
+            (values["date_received"], (1, values["value"], 0, 0)),
+            (values["date_of_donation"], (0, 0, 1, values["value"])),
+        ):
+            if day is not None:
+                period_start = get_period_start(day, granularity)
+                contributions.append(
+                    ((granularity, period_start, donor_id, values["type"]), measures)
+                )
+    return contributions
+
+
+class Rollup:
+    """
+    A rollup table: the columns identifying its groups, the columns summed
+    per group, and a function returning the `(group, measures)` a device
+    adds to it from the dict of its tracked values.
+    """
+
+    def __init__(self, model, group_columns, measure_columns, get_contributions):
+        self.model = model
+        self.group_columns = group_columns
+        self.measure_columns = measure_columns
+        self.get_contributions = get_contributions
+
+    def get_upsert_sql(self, connection):
+        """
+        Returns an INSERT adding its measures to an existing row of the same
+        group, or None if the database has no such statement.
+        """
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        groups = ", ".join(qn(column) for column in self.group_columns)
+        columns = [*self.group_columns, *self.measure_columns]
+        insert = (
+            f"INSERT INTO {table} ({', '.join(qn(column) for column in columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))})"
+        )
+        if connection.vendor in ("sqlite", "postgresql"):
+            increments = ", ".join(
+                f"{qn(column)} = {table}.{qn(column)} + excluded.{qn(column)}"
+                for column in self.measure_columns
+            )
+            return f"{insert} ON CONFLICT ({groups}) DO UPDATE SET {increments}"
+        if connection.vendor == "mysql":
+            increments = ", ".join(
+                f"{qn(column)} = {qn(column)} + VALUES({qn(column)})"
+                for column in self.measure_columns
+            )
+            return f"{insert} ON DUPLICATE KEY UPDATE {increments}"
+        return None
+
+    def apply(self, rows):
+        """
+        Adds the measures of `rows`, `(group, measures)` tuples, to their
+        groups, creating missing ones.
+        """
+        sql = self.get_upsert_sql(connection)
+        if sql is not None:
+            fields = [
+                self.model._meta.get_field(column)
+                for column in (*self.group_columns, *self.measure_columns)
+            ]
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    sql,
+                    [
+                        [
+                            field.get_db_prep_save(value, connection)
+                            for field, value in zip(fields, (*group, *measures))
+                        ]
+                        for group, measures in rows
+                    ],
+                )
+            return
+        for group, measures in rows:
+            self.update_or_create_row(group, measures)
+
+    def update_or_create_row(self, group, measures):
+        rows = self.model.objects.filter(**dict(zip(self.group_columns, group)))
+        changes = {
+            column: F(column) + measure
+            for column, measure in zip(self.measure_columns, measures)
+        }
+        if rows.update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                self.model.objects.create(
+                    **dict(zip(self.group_columns, group)),
+                    **dict(zip(self.measure_columns, measures)),
+                )
+        except IntegrityError:
+            # Another writer created the row since the update
+            rows.update(**changes)
+
+
+INVENTORY = Rollup(
+    InventoryRollup,
+    ("end_location_id", "type", "physical_condition"),
+    ("device_count", "total_value"),
+    get_inventory_contributions,
+)
+HISTORY = Rollup(
+    HistoryRollup,
+    ("granularity", "period_start", "donor_id", "type"),
+    ("received_count", "received_value", "donated_count", "donated_value"),
+    get_history_contributions,
+)
+ROLLUPS = (INVENTORY, HISTORY)
+
+
+def get_values(instance):
+    """
+    Returns the tracked values of `instance` as it is in memory.
+    """
+    return clean_values({name: getattr(instance, name) for name in TRACKED_ATTNAMES})
+
+
+def get_loaded_values(instance):
+    """
+    Returns the tracked values `instance` was loaded from the database
+    with, or None if they were not all loaded.
+    """
+    loaded = getattr(instance, "_loaded_values", None) or {}
+    if any(loaded.get(name, DEFERRED) is DEFERRED for name in TRACKED_ATTNAMES):
+        return None
+    return clean_values({name: loaded[name] for name in TRACKED_ATTNAMES})
+
+
+def remember_values(instance):
+    """
+    Records the current values of `instance` as its stored ones, after it
+    was saved.
+    """
+    loaded = getattr(instance, "_loaded_values", None) or {}
+    for name in STORED_ATTNAMES:
+        loaded[name] = getattr(instance, name)
+    instance._loaded_values = loaded
+
+
+def load_stored_values(instance):
+    """
+    Loads the stored values of a device about to be updated that it was not
+    loaded with. The change log compares every field, see events.py.
+    """
+    if instance._state.adding:
+        return
+    loaded = getattr(instance, "_loaded_values", None) or {}
+    missing = [
+        name for name in STORED_ATTNAMES if loaded.get(name, DEFERRED) is DEFERRED
+    ]
+    if not missing:
+        return
+    stored = Device.objects.filter(pk=instance.pk).values(*missing).first()
+    if stored is not None:
+        instance._loaded_values = loaded | stored
+
+
+class Deltas:
+    """
+    Accumulates changes to `rollups`, applied with `apply`.
+    """
+
+    def __init__(self, rollups=ROLLUPS):
+        self.rollups = rollups
+        self.rows = {}
+
+    def add_measures(self, rollup, group, measures):
+        current = self.rows.setdefault((rollup, group), [0] * len(measures))
+        for index, measure in enumerate(measures):
+            current[index] += measure
+
+    def add(self, values, sign):
+        """
+        Adds (`sign` 1) or removes (-1) the contributions of a device, given
+        the dict of its tracked values.
+        """
+        for rollup in self.rollups:
+            for group, measures in rollup.get_contributions(values):
+                self.add_measures(
+                    rollup, group, [sign * measure for measure in measures]
+                )
+
+    def merge(self, other):
+        for (rollup, group), measures in other.rows.items():
+            self.add_measures(rollup, group, measures)
+
+    def move(self, old, new):
+        if old != new:
+            self.add(old, -1)
+            self.add(new, 1)
+
+    def apply(self):
+        """
+        Adds the accumulated deltas to their rows, creating missing ones.
+        """
+        rows = {}
+        for (rollup, group), measures in self.rows.items():
+            if any(measures):
+                rows.setdefault(rollup, []).append((group, measures))
+        self.rows = {}
+        for rollup in self.rollups:
+            if rollup in rows:
+                # A stable order keeps concurrent writers from deadlocking
+                rollup.apply(sorted(rows[rollup]))
+
+
+pending_deltas = ContextVar("pending_deltas", default=None)
+
+
+@contextmanager
+def batched_deltas():
+    """
+    Groups the deltas of the writes in the block and applies them once it
+    exits without an error.
+    """
+    deltas = Deltas()
+    token = pending_deltas.set(deltas)
+    try:
+        yield
+    finally:
+        pending_deltas.reset(token)
+    deltas.apply()
+
+
+def apply_deltas(deltas):
+    batch = pending_deltas.get()
+    if batch is None:
+        deltas.apply()
+    else:
+        batch.merge(deltas)
+
+
+def get_saved_deltas(instance, created, update_fields=None):
+    """
+    Returns the deltas of saving `instance`.
+    """
+    deltas = Deltas()
+    if created:
+        deltas.add(get_values(instance), 1)
+        return deltas
+
+    old = get_loaded_values(instance)
+    if old is None:
+        return deltas
+    new = {name: getattr(instance, name) for name in TRACKED_ATTNAMES}
+    if update_fields is not None:
+        # Fields that were not written keep their stored values
+        for name, attname in zip(TRACKED_FIELDS, TRACKED_ATTNAMES):
+            if name not in update_fields and attname not in update_fields:
+                new[attname] = instance._loaded_values[attname]
+    deltas.move(old, clean_values(new))
+    return deltas
+
+
+def get_deleted_deltas(instance):
+    deltas = Deltas()
+    deltas.add(get_loaded_values(instance) or get_values(instance), -1)
+    return deltas
+
+
+def get_bulk_deltas(action, instances, fields, previous):
+    """
+    Returns the deltas of a `bulk_changed` write.
+    """
+    deltas = Deltas()
+    if action == "create":
+        for instance in instances:
+            deltas.add(get_values(instance), 1)
+    elif action == "delete":
+        for instance in instances:
+            deltas.add(get_loaded_values(instance) or get_values(instance), -1)
+    elif set(TRACKED_FIELDS) & set(fields):
+        for instance in instances:
+            changed = previous.get(instance.pk, {})
+            old = {
+                attname: changed.get(name, getattr(instance, attname))
+                for name, attname in zip(TRACKED_FIELDS, TRACKED_ATTNAMES)
+            }
+            deltas.move(clean_values(old), get_values(instance))
+    return deltas
+
+
+def get_device_groups():
+    """
+    Computes the inventory rollups from the devices, with one GROUP BY query.
+
+    :return: A {(end_location_id, type, physical_condition): (count, value)}
+        dict.
+    """
+    groups = (
+        Device.objects.values(*GROUP_FIELDS)
+        .annotate(device_count=Count("pk"), total_value=Sum("value"))
+        .order_by()
+    )
+    return {
+        (group["end_location"] or 0, group["type"], group["physical_condition"]): (
+            group["device_count"],
+            to_decimal(group["total_value"]),
+        )
+        for group in groups
+    }
+
+
+def rebuild_inventory_rollups():
+    """
+    Recomputes the inventory rollups from the devices and corrects the rows that
+    differ. Groups without devices are dropped.
+
+    :return: The number of groups corrected.
+    """
+    with transaction.atomic():
+        expected = get_device_groups()
+        rows = {
+            (row.end_location_id, row.type, row.physical_condition): row
+            for row in InventoryRollup.objects.select_for_update()
+        }
+        stored = {
+            group: (row.device_count, row.total_value) for group, row in rows.items()
+        }
+        wrong = {
+            group
+            for group in stored.keys() | expected.keys()
+            if stored.get(group) != expected.get(group)
+        }
+
+        InventoryRollup.objects.filter(
+            pk__in=[rows[group].pk for group in wrong if group in rows]
+        ).delete()
+        InventoryRollup.objects.bulk_create(
+            [
+                InventoryRollup(
+                    end_location_id=group[0],
+                    type=group[1],
+                    physical_condition=group[2],
+                    device_count=expected[group][0],
+                    total_value=expected[group][1],
+                )
+                for group in wrong
+                if group in expected
+            ],
+            batch_size=1000,
+        )
+    return len(wrong)
+
+
+def get_inventory_summary(group_by=SUMMARY_DIMENSIONS, **filters):
+    """
+    Returns the device counts and values per group, read from the rollups.
+
+    Groups of locations that no longer exist are reported without a
+    location, like their devices.
+
+    :param group_by: The dimensions of `SUMMARY_DIMENSIONS` to group by.
+    :param filters: Optional `end_location` (a primary key), `type` and
+        `physical_condition` values to filter by.
+    :return: A dict with the groups, in order, and the grand totals.
+    """
+    rows = InventoryRollup.objects.exclude(device_count=0)
+    if filters.get("end_location") is not None:
+        rows = rows.filter(end_location_id=filters["end_location"])
+    for name in ("type", "physical_condition"):
+        if filters.get(name) is not None:
+            rows = rows.filter(**{name: filters[name]})
+    rows = list(
+        rows.values_list(
+            "end_location_id",
+            "type",
+            "physical_condition",
+            "device_count",
+            "total_value",
+        )
+    )
+
+    names = dict(
+        Location.objects.filter(pk__in={row[0] for row in rows if row[0]}).values_list(
+            "pk", "name"
+        )
+    )
+    totals = {}
+    for end_location_id, type, physical_condition, count, value in rows:
+        if end_location_id not in names:
+            end_location_id = None
+        group = {
+            "end_location": end_location_id,
+            "type": type,
+            "physical_condition": physical_condition,
+        }
+        key = tuple(group[name] for name in group_by)
+        total = totals.setdefault(key, [0, Decimal(0)])
+        total[0] += count
+        total[1] += value
+
+    groups = []
+    # Groups without a location last
+    for key, (count, value) in sorted(
+        totals.items(), key=lambda item: [(part is None, part) for part in item[0]]
+    ):
+        if not count:
+            continue
+        group = dict(zip(group_by, key))
+        if "end_location" in group:
+            group["end_location_name"] = names.get(group["end_location"])
+        group["device_count"] = count
+        group["total_value"] = f"{value:.2f}"
+        groups.append(group)
+
+    return {
+        "groups": groups,
+        "device_count": sum(group["device_count"] for group in groups),
+        "total_value": f"{sum(total[1] for total in totals.values()):.2f}",
+    }
+
+
+def backfill_history_rollups(chunk_size=HISTORY_CHUNK_SIZE, progress=None):
+    """
+    Recomputes the history rollups from the devices, read in primary key
+    order `chunk_size` at a time. The rows of each chunk are added with one
+    upsert, so memory stays bounded by the chunk size.
+
+    Devices written while the backfill runs can be counted twice or not at
+    all; run it while devices are not written to.
+
+    :param progress: Optional callable, called with the number of devices
+        read so far after each chunk.
+    :return: The number of devices read.
+    """
+    HistoryRollup.objects.all().delete()
+    devices = Device.objects.order_by("pk").values_list("pk", *TRACKED_ATTNAMES)
+    count = 0
+    last_pk = None
+    while True:
+        chunk = devices if last_pk is None else devices.filter(pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            return count
+
+        deltas = Deltas(rollups=[HISTORY])
+        for pk, *values in chunk:
+            # Loaded values need no cleaning
+            deltas.add(dict(zip(TRACKED_ATTNAMES, values)), 1)
+        deltas.apply()
+
+        count += len(chunk)
+        last_pk = chunk[-1][0]
+        if progress:
+            progress(count)
+
+
+def get_history_report(
+    granularity, start, end, group_by=HISTORY_DIMENSIONS, donor=None, type=None
+):
+    """
+    Returns the devices received and donated per `granularity` period from
+    `start` to `end`, read from the history rollups.
+
+    Periods are whole: the first is the one containing `start`. Groups of
+    donors that no longer exist are reported without a donor, like their
+    devices.
+
+    :param group_by: The dimensions of `HISTORY_DIMENSIONS` to group the
+        periods by.
+    :param donor: Optional primary key of the donor to report on.
+    :param type: Optional device type to report on.
+    :return: A dict with the periods, in order, and the totals.
+    """
+    rows = HistoryRollup.objects.filter(
+        granularity=granularity,
+        period_start__gte=get_period_start(start, granularity),
+        period_start__lte=end,
+    )
+    if donor is not None:
+        rows = rows.filter(donor_id=donor)
+    if type is not None:
+        rows = rows.filter(type=type)
+    rows = list(
+        rows.values_list(
+            "period_start",
+            "donor_id",
+            "type",
+            "received_count",
+            "received_value",
+            "donated_count",
+            "donated_value",
+        )
+    )
+
+    names = dict(
+        Donor.objects.filter(pk__in={row[1] for row in rows if row[1]}).values_list(
+            "pk", "name"
+        )
+    )
+    totals = {}
+    for period_start, donor_id, type, *measures in rows:
+        if donor_id not in names:
+            donor_id = None
+        group = {"donor": donor_id, "type": type}
+        key = (period_start, *(group[name] for name in group_by))
+        total = totals.setdefault(key, [0, Decimal(0), 0, Decimal(0)])
+        for index, measure in enumerate(measures):
+            total[index] += measure
+
+    periods = []
+    # Groups without a donor last within their period
+    for key, measures in sorted(
+        totals.items(), key=lambda item: [(part is None, part) for part in item[0]]
+    ):
+        if not any(measures):
+            continue
+        period = {"period_start": key[0].isoformat()} | dict(zip(group_by, key[1:]))
+        if "donor" in period:
+            period["donor_name"] = names.get(period["donor"])
+        periods.append(period | format_history_measures(measures))
+
+    return {
+        "granularity": granularity,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "periods": periods,
+    } | format_history_measures(
+        [sum(measures[index] for measures in totals.values()) for index in range(4)]
+    )
+
+
+def format_history_measures(measures):
+    received_count, received_value, donated_count, donated_value = measures
+    return {
+        "received_count": received_count,
+        "received_value": f"{received_value:.2f}",
+        "donated_count": donated_count,
+        "donated_value": f"{donated_value:.2f}",
+    }
@@ -0,0 +1,150 @@
+"""
+Device lookups for barcode and QR scanning stations.
+
+A scanned code is a device UUID, a serial number or a MAC id. Codes are
+resolved with one query over the primary key and the unique
+`serial_number`/`mac_id` indexes, to a compact payload.
+
+Resolved codes, including codes that matched nothing, are kept in an
+in-process LRU cache of `SCAN_CACHE_SIZE` entries. The cache is dropped as
+soon as the generation of a table the payload reads changes, see
+generations.py. Generations only see the writes of other processes when
+the ``inventory`` cache is shared, so entries also expire after
+`SCAN_CACHE_TTL` seconds, which bounds how stale a scan can be otherwise.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.db.models import F, Q
+
+from .generations import get_generations
+from .models import Device, Location
+
+SCAN_CACHE_SIZE = 10000
+
+# Seconds an entry is served for
+SCAN_CACHE_TTL = 30
+
+# Codes accepted per batch request
+MAX_SCAN_CODES = 200
+
+SCAN_FIELDS = [
+    "device_id",
+    "serial_number",
+    "mac_id",
+    "type",
+    "make",
+    "model",
+    "physical_condition",
+]
+
+SCAN_TABLES = [Device._meta.db_table, Location._meta.db_table]
+
+
+class ScanCache:
+    """
+    A thread-safe LRU mapping of codes to payloads, valid for one set of
+    table generations and `ttl` seconds.
+    """
+
+    def __init__(self, max_size=SCAN_CACHE_SIZE, ttl=SCAN_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.generations = None
+        self.lock = threading.Lock()
+
+    def get_many(self, codes, generations):
+        """
+        Returns the cached payloads of `codes` as a {code: payload} dict.
+        """
+        with self.lock:
+            if generations != self.generations:
+                self.entries.clear()
+                self.generations = generations
+                return {}
+            found = {}
+            now = time.monotonic()
+            for code in codes:
+                if code not in self.entries:
+                    continue
+                payload, expires = self.entries[code]
+                if expires <= now:
+                    del self.entries[code]
+                    continue
+                self.entries.move_to_end(code)
+                found[code] = payload
+            return found
+
+    def set_many(self, payloads, generations):
+        with self.lock:
+            if generations != self.generations:
+                return
+            expires = time.monotonic() + self.ttl
+            for code, payload in payloads.items():
+                self.entries[code] = (payload, expires)
+                self.entries.move_to_end(code)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generations = None
+
+
+scan_cache = ScanCache()
+
+
+def lookup_codes(codes):
+    """
+    Resolves `codes` with one query.
+
+    :return: A {code: payload} dict, with None for codes matching no device.
+    """
+    # Codes that parse as UUIDs, in canonical form
+    device_ids = {}
+    for code in codes:
+        try:
+            device_ids[code] = str(uuid.UUID(code))
+        except ValueError:
+            pass
+
+    lookup = Q(serial_number__in=codes) | Q(mac_id__in=codes)
+    if device_ids:
+        lookup |= Q(device_id__in=list(device_ids.values()))
+
+    by_code = {}
+    for row in Device.objects.filter(lookup).values(
+        *SCAN_FIELDS, location=F("end_location__name")
+    ):
+        row["device_id"] = str(row["device_id"])
+        for field in ("device_id", "serial_number", "mac_id"):
+            if row[field]:
+                by_code.setdefault(row[field], row)
+    return {
+        code: by_code.get(code) or by_code.get(device_ids.get(code)) for code in codes
+    }
+
+
+def resolve_codes(codes):
+    """
+    Resolves scanned codes to device payloads, serving repeated codes from
+    the in-process cache.
+
+    :return: A list of `(code, payload)` pairs in the order of `codes`;
+        `payload` is None for unknown codes.
+    """
+    codes = [str(code).strip() for code in codes]
+    generations = get_generations(SCAN_TABLES)
+    payloads = scan_cache.get_many(codes, generations)
+
+    missing = list(dict.fromkeys(code for code in codes if code not in payloads))
+    if missing:
+        found = lookup_codes(missing)
+        scan_cache.set_many(found, generations)
+        payloads.update(found)
+    return [(code, payloads[code]) for code in codes]
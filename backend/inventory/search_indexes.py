@@ -10,12 +10,16 @@ class DeviceIndex(indexes.SearchIndex, indexes.Indexable):
     make = indexes.CharField(model_attr="make")
     model = indexes.CharField(model_attr="model")
     year_of_manufacture = indexes.IntegerField(model_attr="year_of_manufacture")
-    status = indexes.CharField(model_attr="status")
     operating_system = indexes.CharField(model_attr="operating_system")
     physical_condition = indexes.CharField(model_attr="physical_condition")
-    donor_name = indexes.CharField(model_attr="donor__name")
-    location_name = indexes.CharField(model_attr="location__name")
-    created_by_username = indexes.CharField(model_attr="created_by__username")
+    donor_name = indexes.CharField(model_attr="donor__name", null=True)
+    start_location_name = indexes.CharField(
+        model_attr="start_location__name", null=True
+    )
+    end_location_name = indexes.CharField(model_attr="end_location__name", null=True)
+    created_by_username = indexes.CharField(
+        model_attr="created_by__username", null=True
+    )
     mac_id = indexes.CharField(model_attr="mac_id")
     serial_number = indexes.CharField(model_attr="serial_number")
 
@@ -24,7 +28,12 @@ class DeviceIndex(indexes.SearchIndex, indexes.Indexable):
         return Device
 
     def index_queryset(self, using=None):
-        return self.get_model().objects.all()
+        return self.get_model().objects.select_related(
+            "donor", "start_location", "end_location", "created_by", "received_by"
+        )
+
+    def get_updated_field(self):
+        return "updated_at"
 
 
 class DonorIndex(indexes.SearchIndex, indexes.Indexable):
@@ -42,6 +51,9 @@ class DonorIndex(indexes.SearchIndex, indexes.Indexable):
     def index_queryset(self, using=None):
         return self.get_model().objects.all()
 
+    def get_updated_field(self):
+        return "updated_at"
+
 
 class LocationIndex(indexes.SearchIndex, indexes.Indexable):
     text = indexes.CharField(document=True, use_template=True)
@@ -58,3 +70,6 @@ class LocationIndex(indexes.SearchIndex, indexes.Indexable):
 
     def index_queryset(self, using=None):
         return self.get_model().objects.all()
+
+    def get_updated_field(self):
+        return "updated_at"
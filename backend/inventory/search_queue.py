@@ -0,0 +1,132 @@
+"""
+Queued search index updates.
+
+`QueuedSignalProcessor` replaces Haystack's realtime processor. Saves and
+deletes of indexed models, and `bulk_changed` writes, only insert
+`SearchIndexQueue` rows in the same transaction, so requests never open the
+index or wait for its writer lock.
+
+The `drain_search_queue` command is the single writer. It reads the queue
+in batches of `BATCH_SIZE` entries, coalesces entries for the same object,
+re-indexes the objects that still exist with one `update` per model and
+removes the others. The indexing lag is the age of the oldest entry, see
+`get_queue_stats`.
+"""
+
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Count, Min
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+from haystack import connections
+from haystack.signals import BaseSignalProcessor
+
+from .models import SearchIndexQueue
+from .signals import bulk_changed
+
+DEFAULTS = {
+    "BATCH_SIZE": 500,
+    "POLL_INTERVAL": 1,
+    "LOCK_FILE": None,
+}
+
+
+def get_setting(name):
+    return getattr(settings, "SEARCH_QUEUE", {}).get(name, DEFAULTS[name])
+
+
+def enqueue(model, pks):
+    """
+    Marks the search documents of `model` objects with primary keys `pks`
+    as out of date.
+    """
+    label = model._meta.label_lower
+    SearchIndexQueue.objects.bulk_create(
+        [SearchIndexQueue(model=label, object_pk=str(pk)) for pk in pks],
+        batch_size=get_setting("BATCH_SIZE"),
+    )
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    """
+    Queues index updates of saved and deleted objects instead of writing
+    them to the index.
+    """
+
+    def setup(self):
+        post_save.connect(self.handle_save)
+        post_delete.connect(self.handle_delete)
+        bulk_changed.connect(self.handle_bulk_change)
+
+    def teardown(self):
+        post_save.disconnect(self.handle_save)
+        post_delete.disconnect(self.handle_delete)
+        bulk_changed.disconnect(self.handle_bulk_change)
+
+    def is_indexed(self, model):
+        return (
+            model
+            in self.connections["default"].get_unified_index().get_indexed_models()
+        )
+
+    def handle_save(self, sender, instance, **kwargs):
+        if self.is_indexed(sender):
+            enqueue(sender, [instance.pk])
+
+    def handle_delete(self, sender, instance, **kwargs):
+        if self.is_indexed(sender):
+            enqueue(sender, [instance.pk])
+
+    def handle_bulk_change(self, sender, instances, **kwargs):
+        if self.is_indexed(sender):
+            enqueue(sender, [instance.pk for instance in instances])
+
+
+def drain_batch(using="default", batch_size=None):
+    """
+    Indexes the oldest batch of queued entries.
+
+    :return: The number of queue entries processed.
+    """
+    entries = list(
+        SearchIndexQueue.objects.order_by("id").values_list("id", "model", "object_pk")[
+            : batch_size or get_setting("BATCH_SIZE")
+        ]
+    )
+    if not entries:
+        return 0
+
+    pks_by_model = defaultdict(set)
+    for _, label, pk in entries:
+        pks_by_model[label].add(pk)
+
+    backend = connections[using].get_backend()
+    unified_index = connections[using].get_unified_index()
+    for label, pks in pks_by_model.items():
+        index = unified_index.get_index(apps.get_model(label))
+        objects = list(index.index_queryset(using=using).filter(pk__in=pks))
+        if objects:
+            backend.update(index, objects)
+        for pk in pks - {str(obj.pk) for obj in objects}:
+            backend.remove(f"{label}.{pk}")
+
+    # Entries queued while the batch was indexed are kept for the next one
+    SearchIndexQueue.objects.filter(id__in=[entry[0] for entry in entries]).delete()
+    return len(entries)
+
+
+def get_queue_stats():
+    """
+    Returns the number of pending entries and the indexing lag, the age in
+    seconds of the oldest entry.
+    """
+    stats = SearchIndexQueue.objects.aggregate(
+        pending=Count("id"), oldest=Min("queued_at")
+    )
+    oldest = stats["oldest"]
+    return {
+        "pending": stats["pending"],
+        "lag": (timezone.now() - oldest).total_seconds() if oldest else 0.0,
+    }
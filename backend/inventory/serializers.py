@@ -2,30 +2,103 @@
 Serializers for Device, Warehouse and Donor models.
 
 Serializers:
+- DynamicFieldsModelSerializer: ModelSerializer rendering a subset of its fields.
 - DeviceSerializer: Serializes Device model instances.
+- DeviceImportSerializer: Validates the scalar fields of imported devices.
 - WarehouseSerializer: Serializes Warehouse model instances.
 - DonorSerializer: Serializes Donor model instances.
+- ShippingSerializer: Serializes Shipping model instances.
+- DispatchSerializer: Validates bulk dispatches of devices.
+- DeviceEventSerializer: Serializes entries of the device change log.
 """
 
 from rest_framework import serializers
 
-from .models import Device, Donor, Location
+from backend.instrumentation import TimedSerializerMixin
 
+from .models import Device, DeviceEvent, Donor, Location, Shipping
 
-class DeviceSerializer(serializers.ModelSerializer):
+
+class DynamicFieldsModelSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    A ModelSerializer that takes an additional `fields` argument controlling
+    which fields are rendered. Unknown names are ignored; if none of the
+    names is known, all fields are rendered.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None and set(fields) & set(self.fields):
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class DeviceSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Device
         fields = "__all__"
         read_only_fields = ["device_id"]
 
 
-class WarehouseSerializer(serializers.ModelSerializer):
+class DeviceImportSerializer(DeviceSerializer):
+    """
+    Validates a single row of a device import. Relations and uniqueness are
+    checked by the importer for the whole file at once, see
+    helpers/device_import.py.
+    """
+
+    class Meta(DeviceSerializer.Meta):
+        fields = None
+        exclude = [
+            "created_by",
+            "received_by",
+            "donor",
+            "start_location",
+            "end_location",
+            "shipping_infos",
+        ]
+        extra_kwargs = {
+            "serial_number": {"validators": []},
+            "mac_id": {"validators": []},
+        }
+
+
+class WarehouseSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Location
         fields = "__all__"
 
 
-class DonorSerializer(serializers.ModelSerializer):
+class DonorSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Donor
         fields = "__all__"
+
+
+class ShippingSerializer(DynamicFieldsModelSerializer):
+    class Meta:
+        model = Shipping
+        fields = "__all__"
+        # Set when the shipment is marked as arrived
+        read_only_fields = ["arrived", "date_delivered"]
+
+
+class DispatchSerializer(serializers.ModelSerializer):
+    """
+    Validates a shipment together with the ids of the devices it carries.
+    Device ids are checked by the dispatch itself, in one query.
+    """
+
+    devices = serializers.ListField(child=serializers.UUIDField(), allow_empty=False)
+
+    class Meta:
+        model = Shipping
+        fields = ["destination", "date_shipped", "tracking_identifier", "devices"]
+
+
+class DeviceEventSerializer(DynamicFieldsModelSerializer):
+    class Meta:
+        model = DeviceEvent
+        fields = "__all__"
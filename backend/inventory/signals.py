@@ -0,0 +1,126 @@
+from django.core.signals import request_finished
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from . import db_search, events, rollups
+from .generations import bump_generation_on_commit
+from .models import Device, Donor, Location, Shipping, User
+
+# Sent after set-based writes that bypass post_save/post_delete, such as
+# bulk_create, bulk_update and queryset.update(). Arguments:
+#   action: "create", "update" or "delete".
+#   instances: The affected instances, with their new values.
+#   fields: Names of the fields that were written.
+#   previous: For updates, {pk: {field: old value}} of the written fields,
+#       with foreign keys given as primary keys.
+bulk_changed = Signal()
+
+GENERATION_MODELS = [Device, Donor, Location, Shipping, User]
+
+
+def bump_model_generation(sender, **kwargs):
+    bump_generation_on_commit(sender)
+
+
+def bump_related_generations(sender, **kwargs):
+    # Deletes null or remove the rows pointing at the deleted object with
+    # writes that send no signals
+    for relation in sender._meta.related_objects:
+        bump_generation_on_commit(
+            relation.through if relation.many_to_many else relation.related_model
+        )
+
+
+for model in GENERATION_MODELS:
+    post_save.connect(bump_model_generation, sender=model)
+    post_delete.connect(bump_model_generation, sender=model)
+    post_delete.connect(bump_related_generations, sender=model)
+    bulk_changed.connect(bump_model_generation, sender=model)
+
+
+@receiver(m2m_changed, sender=Device.shipping_infos.through)
+def bump_shipping_infos_generation(sender, action, **kwargs):
+    if action.startswith("post_"):
+        bump_generation_on_commit(sender)
+
+
+bulk_changed.connect(bump_model_generation, sender=Device.shipping_infos.through)
+
+
+def save_search_document(sender, instance, **kwargs):
+    if db_search.is_enabled():
+        db_search.update_search_documents(sender, [instance])
+
+
+def delete_search_document(sender, instance, **kwargs):
+    if db_search.is_enabled():
+        db_search.delete_search_documents(sender, [instance.pk])
+
+
+def bulk_change_search_documents(sender, action, instances, **kwargs):
+    if not db_search.is_enabled():
+        return
+    pks = [instance.pk for instance in instances]
+    if action == "delete":
+        db_search.delete_search_documents(sender, pks)
+    else:
+        db_search.refresh_search_documents(sender, pks)
+
+
+for model in db_search.SEARCH_MODELS:
+    post_save.connect(save_search_document, sender=model)
+    post_delete.connect(delete_search_document, sender=model)
+    bulk_changed.connect(bulk_change_search_documents, sender=model)
+
+
+@receiver(pre_save, sender=Device)
+def load_rollup_values(sender, instance, **kwargs):
+    rollups.load_stored_values(instance)
+
+
+@receiver(post_save, sender=Device)
+def update_rollups_on_save(sender, instance, created, update_fields=None, **kwargs):
+    rollups.apply_deltas(rollups.get_saved_deltas(instance, created, update_fields))
+
+
+@receiver(post_delete, sender=Device)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    rollups.apply_deltas(rollups.get_deleted_deltas(instance))
+
+
+@receiver(bulk_changed, sender=Device)
+def update_rollups_on_bulk_change(
+    sender, action, instances, fields, previous, **kwargs
+):
+    rollups.apply_deltas(rollups.get_bulk_deltas(action, instances, fields, previous))
+
+
+@receiver(post_save, sender=Device)
+def record_save_events(sender, instance, created, update_fields=None, **kwargs):
+    events.record_events(events.get_saved_events(instance, created, update_fields))
+
+
+@receiver(post_delete, sender=Device)
+def record_delete_events(sender, instance, **kwargs):
+    events.record_events([events.get_deleted_event(instance)])
+
+
+@receiver(bulk_changed, sender=Device)
+def record_bulk_events(sender, action, instances, fields, previous, **kwargs):
+    events.record_events(events.get_bulk_events(action, instances, fields, previous))
+
+
+@receiver(bulk_changed, sender=Device.shipping_infos.through)
+def record_dispatch_events(sender, action, instances, **kwargs):
+    if action == "create":
+        events.record_events(events.get_dispatch_events(instances))
+
+
+request_finished.connect(events.flush_events)
+
+
+# Connected last: the receivers above compare with the values the device
+# was loaded with
+@receiver(post_save, sender=Device)
+def remember_saved_values(sender, instance, **kwargs):
+    rollups.remember_values(instance)
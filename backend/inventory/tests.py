@@ -1 +1,2477 @@
+"""
+Unit tests for the inventory API endpoints.
 
+Endpoints:
+- {BaseURL}/inventory/devices/:
+    - GET: Retrieve devices with page-number or keyset (cursor) pagination.
+- {BaseURL}/inventory/donors/:
+    - GET: Retrieve donors, unpaginated unless paging parameters are sent.
+
+Test Cases:
+- test_cursor_pages_cover_all_devices: Tests that following `next` links
+  visits every device exactly once in the requested order.
+- test_cursor_previous_link: Tests that `previous` links walk back a page.
+- test_limit_rejected_with_cursor: Tests that `?limit=` applies after
+  ordering, and is a 400 with `?cursor=` or when not positive.
+- test_page_number_envelope_is_kept: Tests the default page-number envelope.
+- test_donors_unpaginated_by_default: Tests that donors are only paginated
+  on request.
+- test_cached_count_invalidated_by_joined_table: Tests that cached counts are
+  reused and dropped when a table the query joins is written to.
+- test_estimated_count_for_unfiltered_list: Tests estimates from SQLite stats.
+- test_response_reports_count_strategy: Tests the `count_strategy` field.
+- test_query_count_independent_of_page_size: Tests that a device page takes
+  the same number of queries regardless of its size.
+- test_fields_parameter_prunes_output_and_columns: Tests `?fields=`.
+- test_unknown_fields_share_plans: Tests that unknown `?fields=` names do
+  not grow the query plan cache.
+- test_batch_edit_reports_each_item: Tests per-object results of a batch edit.
+- test_batch_edit_rejects_duplicates_within_batch: Tests that items setting
+  the same unique value are invalid while the others are written.
+- test_batch_edit_conflict_writes_nothing: Tests that a unique value taken
+  by another writer after validation is a 409 that writes nothing.
+- test_batch_edit_query_count_independent_of_size: Tests that batch edits
+  take the same number of queries regardless of their size.
+- test_batch_edit_rejects_unknown_model: Tests models without batch support.
+- test_batch_operations_require_model_permissions: Tests that batch edits and
+  deletes require the permissions of the model's viewset.
+- test_import_csv_reports_failed_rows: Tests a CSV import with invalid,
+  unknown-donor and duplicate rows.
+- test_import_jsonl_in_chunks: Tests a JSONL import spanning several chunks.
+- test_export_csv_honors_filters: Tests that the CSV export streams the
+  filtered devices with donor and location names.
+- test_export_jsonl: Tests the JSONL export.
+- test_search_paged_in_engine: Tests that plain searches fetch only the
+  current page of hits and keep relevance order.
+- test_search_with_filters_intersects_in_database: Tests the fallback for
+  searches combined with filters.
+- test_saves_are_queued: Tests that saves, deletes and bulk writes of indexed
+  models are queued instead of written to the index.
+- test_drain_coalesces_entries: Tests that draining indexes each object once
+  and removes deleted objects from the index.
+- test_pk_ranges_cover_all_rows: Tests the primary key ranges of full rebuilds.
+- test_full_then_incremental_reindex: Tests that a full rebuild indexes every
+  device and later runs only index rows changed since the watermark.
+- test_full_reindex_keeps_documents_searchable: Tests that documents stay
+  searchable during a full rebuild and those of deleted rows are removed.
+- test_database_search_with_filters_in_one_query: Tests that database full-text
+  search is combined with filters in the list query.
+- test_search_documents_follow_saves: Tests that search documents are updated
+  and deleted with their objects.
+- test_scan_single_code: Tests scanning a serial number, MAC id and UUID.
+- test_scan_batch_uses_hot_cache: Tests batch scans, their cache and its
+  invalidation by writes and expiry.
+- test_label_sheets_stream_filtered_devices: Tests streamed label sheets.
+- test_qr_codes_are_cached_by_content: Tests that reprints reuse cached codes.
+- test_tampered_qr_codes_are_rendered_again: Tests that cached files holding
+  anything but a QR code are not embedded.
+- test_sheets_span_fetched_chunks: Tests that sheets are split independently
+  of the rows fetched per round trip.
+- test_dispatch_query_count_independent_of_size: Tests that dispatching
+  devices takes the same number of queries regardless of their number.
+- test_dispatch_rejects_unknown_devices: Tests that nothing is written when
+  a device does not exist.
+- test_arrival_moves_devices: Tests that arrival moves every device of the
+  shipment to its destination, and that arriving again is a 409.
+- test_arrival_moves_devices_once: Tests that arriving a shipment loaded
+  before another arrival moves nothing.
+- test_dataset_is_reproducible: Tests that a seed generates the same rows
+  with and without worker processes, with the expected counts.
+- test_dataset_seed_is_not_reused: Tests that a loaded seed is refused.
+- test_mock_data_requires_authentication: Tests that the mock data endpoint
+  rejects anonymous and oversized requests.
+- test_benchmarks_report_percentiles: Tests that benchmark scenarios succeed
+  and report latency percentiles per dataset size.
+- test_benchmarks_separate_cached_lists: Tests that lists are benchmarked
+  uncached, and cached only in separate results, without recording
+  metrics in the configured directory.
+- test_compare_flags_p95_regressions: Tests baseline comparisons.
+- test_server_timing_header: Tests the phase breakdown and query count of
+  the Server-Timing header.
+- test_metrics_aggregate_routes: Tests that /metrics serves per-route
+  latency histograms summed over every worker's file.
+- test_metrics_only_served_locally: Tests that other hosts are refused.
+- test_stale_metrics_cleared: Tests that files of processes that are no
+  longer running are removed.
+- test_rollups_follow_writes: Tests that creates, edits, batch edits,
+  imports, arrivals and deletes keep the rollups equal to the devices.
+- test_rebuild_corrects_drift: Tests that the rebuild command corrects,
+  adds and drops groups.
+- test_summary_endpoint: Tests grouping, filters and groups of deleted
+  locations, in a number of queries independent of the devices.
+- test_history_backfill_in_chunks: Tests that a chunked backfill rebuilds
+  the history rollups maintained on write.
+- test_history_migration_builds_rollups: Tests that the migration creating
+  the history rollups fills them from existing devices.
+- test_history_report: Tests periods, whole-period date ranges, grouping,
+  deleted donors and a multi-year report that reads no device rows.
+- test_events_follow_writes: Tests the change log events of creates, edits,
+  batch edits, dispatches, arrivals and deletes, with their source and user.
+- test_events_buffered_until_commit_and_flush: Tests that events are only
+  buffered once committed and inserted when a request finishes or the
+  buffer is full.
+- test_events_keyset_pages: Tests that a device's log is paged newest first
+  in the same number of queries per page.
+- test_list_not_modified_until_written: Tests list ETags, 304 responses that
+  read no devices, and their invalidation by writes and location deletes.
+- test_list_versioned_by_shared_generations: Tests that list ETags see
+  bumps made through another instance of the shared `inventory` cache, and
+  are off while it is process-local.
+- test_detail_versioned_per_row: Tests that detail ETags only change with
+  their own row and shipments, and `If-Modified-Since`.
+- test_list_cached_until_written: Tests cache hits regardless of parameter
+  order that run no queries, their invalidation by writes to listed and
+  joined tables, and the hit rate.
+- test_file_cache_keyed_by_permission_scope: Tests the file-based backend,
+  separate entries per permission scope, and concurrent hit counts.
+- test_entries_computed_before_commit_are_dropped: Tests that writes bump
+  generations again once their transaction commits.
+- test_entries_see_bumps_of_other_processes: Tests that entries are
+  invalidated by bumps made through another instance of the shared
+  `inventory` cache, and that lists are not cached while it is
+  process-local.
+- test_every_route_has_a_query_budget: Tests that QUERY_BUDGETS covers every
+  named route of backend/urls.py.
+- test_query_budgets: Tests that every route stays within its query budget
+  and that its query count does not grow with the dataset or page size.
+"""
+
+import csv
+import glob
+import importlib
+import io
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+from collections import Counter, namedtuple
+from datetime import date, timedelta
+from types import SimpleNamespace
+from urllib.parse import urlencode, urlsplit
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, reverse
+from django.utils import timezone
+from haystack import connections as haystack_connections
+from haystack.query import SearchQuerySet
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from backend.instrumentation import clear_stale_metrics, collect_metrics
+from backend.inventory import db_search, labels, reindex
+from backend.inventory.benchmarks import compare_results, run_benchmarks
+from backend.inventory.counting import CachedCount, EstimatedCount
+from backend.inventory.events import event_buffer
+from backend.inventory.generations import get_cache_key
+from backend.inventory.helpers import batch_operations, device_import
+from backend.inventory.helpers.dataset import create_dataset
+from backend.inventory.helpers.shipping import mark_arrived
+from backend.inventory.labels import get_qr, get_qr_path, prerender_qr_codes
+from backend.inventory.models import (
+    Device,
+    DeviceEvent,
+    Donor,
+    HistoryRollup,
+    InventoryRollup,
+    Location,
+    SearchDocument,
+    SearchIndexQueue,
+    Shipping,
+)
+from backend.inventory.query_planning import get_query_plan
+from backend.inventory.reindex import (
+    get_pk_ranges,
+    get_watermark,
+    reindex_changed,
+    reindex_full,
+    remove_stale,
+)
+from backend.inventory.response_cache import (
+    count_outcome,
+    get_cache_stats,
+    reset_cache_stats,
+)
+from backend.inventory.rollups import (
+    backfill_history_rollups,
+    get_device_groups,
+    get_inventory_summary,
+    rebuild_inventory_rollups,
+)
+from backend.inventory.scanning import SCAN_CACHE_TTL, scan_cache
+from backend.inventory.search_queue import drain_batch, get_queue_stats
+from backend.test_runner import temporary_search_index
+from backend.users.models import User
+from backend.users.serializers import UserLoginSerializer
+from backend.users.utils import allPermissions
+
+
+def create_api_client(username="inventory", permissions=None):
+    """
+    Creates a user and returns an APIClient authenticated with their token.
+    """
+    User.objects.create(
+        username=username,
+        email=f"{username}@example.com",
+        password="Str0ng!Password",
+        role="staff",
+        first_name="Inventory",
+        last_name="Tester",
+        permissions=allPermissions if permissions is None else permissions,
+    )
+    serializer = UserLoginSerializer(
+        data={"username": username, "password": "Str0ng!Password"}
+    )
+    serializer.is_valid(raise_exception=True)
+    client = APIClient()
+    client.credentials(
+        HTTP_AUTHORIZATION=(
+            f"Bearer {serializer.validated_data['tokens']['access_token']}"
+        )
+    )
+    return client
+
+
+def create_devices(count, **overrides):
+    """
+    Bulk creates `count` devices spread over a few types and donors.
+    """
+    donors = Donor.objects.bulk_create(
+        [
+            Donor(
+                name=f"Donor {index}",
+                contact_info="Contact",
+                address="Address",
+                email=f"donor{index}-{count}@example.com",
+                phone="555-0100",
+            )
+            for index in range(3)
+        ]
+    )
+    (location,) = Location.objects.bulk_create(
+        [
+            Location(
+                name="Main Warehouse",
+                type="Warehouse",
+                address="1 Main St",
+                country="USA",
+                city="Springfield",
+                postal_code="12345",
+            )
+        ]
+    )
+    devices = [
+        Device(
+            type=["Laptop", "Desktop", "Tablet"][index % 3],
+            make=["Dell", "HP"][index % 2],
+            model=f"Model {index}",
+            serial_number=f"SN-{index:05d}",
+            mac_id=f"MAC-{index:05d}",
+            year_of_manufacture=2015 + index % 8,
+            date_received=date(2024, 1, 1 + index % 28),
+            physical_condition=["Good", "Fair"][index % 2],
+            operating_system="Linux",
+            donor=donors[index % 3] if index % 4 else None,
+            date_of_donation=date(2023, 1 + index % 12, 1),
+            value="100.00",
+            start_location=location,
+            end_location=location,
+        )
+        for index in range(count)
+    ]
+    for device in devices:
+        for field, value in overrides.items():
+            setattr(device, field, value)
+    return Device.objects.bulk_create(devices)
+
+
+def follow(client, url):
+    # Links are absolute; the test client only needs the path and query
+    parts = urlsplit(url)
+    return client.get(f"{parts.path}?{parts.query}")
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        caches["auth"].clear()
+        caches["responses"].clear()
+        self.client = create_api_client()
+        self.devices = create_devices(23)
+
+    def collect(self, ordering):
+        url = reverse("device-list")
+        response = self.client.get(
+            url, {"cursor": "", "page_size": 5, "ordering": ordering}
+        )
+        pages = []
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            pages.append([item["device_id"] for item in response.data["results"]])
+            if not response.data["links"]["next"]:
+                return pages, response
+            response = follow(self.client, response.data["links"]["next"])
+
+    def test_cursor_pages_cover_all_devices(self):
+        for ordering in ("type", "-year_of_manufacture", "donor__name"):
+            pages, _ = self.collect(ordering)
+            seen = [device_id for page in pages for device_id in page]
+
+            expected = [
+                str(pk)
+                for pk in Device.objects.order_by(ordering, "device_id").values_list(
+                    "pk", flat=True
+                )
+            ]
+            self.assertEqual(seen, expected, ordering)
+
+    def test_cursor_previous_link(self):
+        pages, last = self.collect("make")
+
+        response = follow(self.client, last.data["links"]["previous"])
+
+        self.assertEqual(
+            [item["device_id"] for item in response.data["results"]], pages[-2]
+        )
+
+    def test_page_number_envelope_is_kept(self):
+        response = self.client.get(reverse("device-list"), {"page_size": 5})
+
+        self.assertEqual(response.data["count"], 23)
+        self.assertEqual(response.data["total_pages"], 5)
+        self.assertEqual(len(response.data["results"]), 5)
+
+    def test_limit_rejected_with_cursor(self):
+        url = reverse("device-list")
+        response = self.client.get(url, {"cursor": "", "limit": 3})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("limit", response.data)
+
+        response = self.client.get(url, {"limit": "many"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(url, {"limit": 3, "ordering": "make"})
+        self.assertEqual(len(response.data["results"]), 3)
+
+    def test_donors_unpaginated_by_default(self):
+        response = self.client.get(reverse("donor-list"))
+        self.assertEqual(len(response.data), 3)
+
+        response = self.client.get(reverse("donor-list"), {"cursor": ""})
+        self.assertEqual(len(response.data["results"]), 3)
+
+
+class CountStrategyTests(TestCase):
+    def setUp(self):
+        caches["auth"].clear()
+        caches["inventory"].clear()
+        self.client = create_api_client()
+        create_devices(12, created_by=User.objects.get())
+
+    def test_cached_count_invalidated_by_joined_table(self):
+        queryset = Device.objects.filter(created_by__username="inventory")
+        self.assertEqual(CachedCount().count(queryset), (12, "cached"))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(CachedCount().count(queryset), (12, "cached"))
+
+        user = User.objects.get()
+        user.username = "renamed"
+        user.save()
+
+        self.assertEqual(CachedCount().count(queryset), (0, "cached"))
+
+    def test_estimated_count_for_unfiltered_list(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        with override_settings(INVENTORY_PAGINATION={"ESTIMATE_THRESHOLD": 0}):
+            self.assertEqual(
+                EstimatedCount().count(Device.objects.all()), (12, "estimated")
+            )
+            self.assertEqual(
+                EstimatedCount().count(Device.objects.filter(type="Laptop")),
+                (4, "cached"),
+            )
+
+    def test_response_reports_count_strategy(self):
+        response = self.client.get(reverse("device-list"), {"type": "Laptop"})
+
+        self.assertEqual(response.data["count"], 4)
+        self.assertEqual(response.data["count_strategy"], "cached")
+
+
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        caches["auth"].clear()
+        caches["responses"].clear()
+        self.client = create_api_client()
+        devices = create_devices(30)
+        shipping = Shipping.objects.create(date_shipped=date(2024, 2, 1))
+        for device in devices[:10]:
+            device.shipping_infos.add(shipping)
+
+    def count_queries(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("device-list"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_query_count_independent_of_page_size(self):
+        # Warm the token and count caches
+        self.count_queries({"page_size": 2})
+        self.count_queries({"page_size": 30})
+
+        self.assertEqual(
+            self.count_queries({"page_size": 2}),
+            self.count_queries({"page_size": 30}),
+        )
+
+    def test_fields_parameter_prunes_output_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("device-list"), {"fields": "serial_number,shipping_infos"}
+            )
+
+        self.assertEqual(
+            set(response.data["results"][0]), {"serial_number", "shipping_infos"}
+        )
+        select = next(
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith('SELECT "inventory_device"."device_id"')
+        )
+        self.assertNotIn("notes", select)
+
+    def test_unknown_fields_share_plans(self):
+        get_query_plan.cache_clear()
+        for suffix in range(5):
+            self.client.get(
+                reverse("device-list"), {"fields": f"serial_number,unknown{suffix}"}
+            )
+        self.client.get(reverse("device-list"), {"fields": "unknown"})
+
+        # One plan for serial_number and one for all fields
+        self.assertEqual(get_query_plan.cache_info().currsize, 2)
+
+
+class BatchEditTests(TestCase):
+    def setUp(self):
+        caches["auth"].clear()
+        self.client = create_api_client()
+        self.devices = create_devices(20)
+        (self.location,) = Location.objects.bulk_create(
+            [
+                Location(
+                    name="Second Warehouse",
+                    type="Warehouse",
+                    address="2 Main St",
+                    country="USA",
+                    city="Springfield",
+                    postal_code="12345",
+                )
+            ]
+        )
+
+    def batch_edit(self, objects):
+        return self.client.patch(
+            f"{reverse('batch-operations')}?model=device",
+            {"objects": objects},
+            format="json",
+        )
+
+    def test_batch_edit_reports_each_item(self):
+        first, second, third = self.devices[:3]
+        response = self.batch_edit(
+            [
+                {
+                    "id": str(first.pk),
+                    "end_location": self.location.pk,
+                    "physical_condition": "Poor",
+                },
+                {"id": str(second.pk), "physical_condition": second.physical_condition},
+                {"id": str(third.pk), "end_location": 999999},
+                {"id": "00000000-0000-0000-0000-000000000000"},
+            ]
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["updated", "unchanged", "invalid", "not_found"],
+        )
+        self.assertIn("end_location", response.data["results"][2]["errors"])
+        first.refresh_from_db()
+        self.assertEqual(first.end_location, self.location)
+        self.assertEqual(first.physical_condition, "Poor")
+
+    def test_batch_edit_rejects_duplicates_within_batch(self):
+        first, second, third = self.devices[:3]
+        response = self.batch_edit(
+            [
+                {"id": str(first.pk), "serial_number": "SN-NEW", "mac_id": "MAC-1"},
+                {"id": str(second.pk), "serial_number": "SN-NEW", "mac_id": "MAC-2"},
+                {"id": str(third.pk), "serial_number": "SN-OTHER"},
+            ]
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual(
+            [result["status"] for result in results], ["invalid", "invalid", "updated"]
+        )
+        self.assertEqual(set(results[0]["errors"]), {"serial_number"})
+        first.refresh_from_db()
+        self.assertEqual(first.serial_number, "SN-00000")
+        third.refresh_from_db()
+        self.assertEqual(third.serial_number, "SN-OTHER")
+
+    def test_batch_edit_conflict_writes_nothing(self):
+        first, second, third = self.devices[:3]
+
+        def validate_item(*args):
+            result = real_validate_item(*args)
+            # Another writer takes the serial number after its validation
+            Device.objects.filter(pk=third.pk).update(serial_number="SN-NEW")
+            return result
+
+        real_validate_item = batch_operations.validate_item
+        with unittest.mock.patch.object(
+            batch_operations, "validate_item", validate_item
+        ):
+            response = self.batch_edit(
+                [
+                    {"id": str(first.pk), "serial_number": "SN-NEW"},
+                    {"id": str(second.pk), "physical_condition": "Poor"},
+                ]
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["conflict", "conflict"],
+        )
+        second.refresh_from_db()
+        self.assertEqual(second.physical_condition, "Fair")
+
+    def test_batch_edit_query_count_independent_of_size(self):
+        def count_queries(devices):
+            objects = [
+                {"id": str(device.pk), "end_location": self.location.pk}
+                for device in devices
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.batch_edit(objects)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(queries)
+
+        # Warm the token cache
+        self.batch_edit([])
+
+        self.assertEqual(
+            count_queries(self.devices[:2]), count_queries(self.devices[2:20])
+        )
+
+    def test_batch_edit_rejects_unknown_model(self):
+        response = self.client.patch(
+            f"{reverse('batch-operations')}?model=shipping",
+            {"objects": [{"id": 1}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_operations_require_model_permissions(self):
+        client = create_api_client("reader", permissions=["readDevices", "editDevices"])
+        url = reverse("batch-operations")
+        device = self.devices[0]
+
+        response = client.delete(
+            f"{url}?model=device", {"ids": [str(device.pk)]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = client.patch(
+            f"{url}?model=location",
+            {"objects": [{"id": self.location.pk, "name": "Renamed"}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertTrue(Device.objects.filter(pk=device.pk).exists())
+        self.assertFalse(Location.objects.filter(name="Renamed").exists())
+
+        response = client.patch(
+            f"{url}?model=device",
+            {"objects": [{"id": str(device.pk), "notes": "Checked"}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class DeviceImportTests(TestCase):
+    def setUp(self):
+        caches["auth"].clear()
+        self.client = create_api_client()
+        create_devices(1)
+
+    def upload(self, name, content):
+        return self.client.post(
+            reverse("device-import"),
+            {"file": SimpleUploadedFile(name, content.encode("utf-8"))},
+            format="multipart",
+        )
+
+    def test_import_csv_reports_failed_rows(self):
+        header = (
+            "type,make,model,serial_number,mac_id,year_of_manufacture,"
+            "date_received,physical_condition,operating_system,donor,"
+            "date_of_donation,value,start_location"
+        )
+        row = (
+            "Laptop,Dell,XPS,{serial},{mac},2020,2024-03-01,Good,Linux,{donor},"
+            "2024-02-01,{value},Main Warehouse"
+        )
+        content = "\n".join(
+            [
+                header,
+                row.format(serial="NEW-1", mac="M-1", donor="Donor 1", value="50"),
+                row.format(serial="NEW-2", mac="M-2", donor="Nobody", value="50"),
+                row.format(serial="NEW-3", mac="M-3", donor="", value="lots"),
+                row.format(serial="NEW-1", mac="M-4", donor="", value="50"),
+                row.format(serial="SN-00000", mac="M-5", donor="", value="50"),
+                row.format(serial="NEW-6", mac="M-6", donor="", value="50"),
+            ]
+        )
+
+        response = self.upload("devices.csv", content)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual(response.data["failed"], 4)
+        self.assertEqual(
+            [
+                (error["row"], list(error["errors"]))
+                for error in response.data["errors"]
+            ],
+            [
+                (3, ["donor"]),
+                (4, ["value"]),
+                (5, ["serial_number"]),
+                (6, ["serial_number"]),
+            ],
+        )
+        device = Device.objects.get(serial_number="NEW-1")
+        self.assertEqual(device.donor.name, "Donor 1")
+        self.assertEqual(device.start_location.name, "Main Warehouse")
+        self.assertEqual(device.created_by.username, "inventory")
+
+    def test_import_jsonl_in_chunks(self):
+        lines = [
+            json.dumps(
+                {
+                    "type": "Tablet",
+                    "make": "HP",
+                    "model": "Slate",
+                    "serial_number": f"JL-{index}",
+                    "mac_id": f"JM-{index}",
+                    "year_of_manufacture": 2021,
+                    "date_received": "2024-03-01",
+                    "physical_condition": "Fair",
+                    "operating_system": "Android",
+                    "date_of_donation": "2024-02-01",
+                    "value": "20.00",
+                    "end_location": "Main Warehouse",
+                }
+            )
+            for index in range(7)
+        ]
+        lines.insert(3, "not json")
+
+        with unittest.mock.patch.object(device_import, "BATCH_CHUNK_SIZE", 3):
+            response = self.upload("devices.jsonl", "\n".join(lines))
+
+        self.assertEqual(response.data["created"], 7)
+        self.assertEqual([error["row"] for error in response.data["errors"]], [4])
+        self.assertEqual(Device.objects.filter(type="Tablet").count(), 7)
+
+
+class DeviceExportTests(TestCase):
+    def setUp(self):
+        caches["auth"].clear()
+        self.client = create_api_client()
+        create_devices(12)
+
+    def export(self, params):
+        response = self.client.get(reverse("device-export"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def test_export_csv_honors_filters(self):
+        content = self.export({"type": "Laptop", "ordering": "model"})
+
+        rows = list(csv.DictReader(content.splitlines()))
+        expected = Device.objects.filter(type="Laptop").order_by("model")
+        self.assertEqual(
+            [row["serial_number"] for row in rows],
+            [device.serial_number for device in expected],
+        )
+        self.assertEqual(rows[0]["end_location"], "Main Warehouse")
+        self.assertEqual(rows[0]["value"], "100.00")
+
+    def test_export_jsonl(self):
+        content = self.export({"file_format": "jsonl", "donor__name": "Donor 1"})
+
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            len(rows), Device.objects.filter(donor__name="Donor 1").count()
+        )
+        self.assertEqual({row["donor"] for row in rows}, {"Donor 1"})
+
+
+class FakeSearchQuerySet:
+    """
+    Stands in for a Haystack SearchQuerySet returning `pks` in order, and
+    records the slices taken from it.
+    """
+
+    def __init__(self, pks):
+        self.pks = [str(pk) for pk in pks]
+        self.slices = []
+
+    def models(self, *models):
+        return self
+
+    def filter(self, **kwargs):
+        return self
+
+    def count(self):
+        return len(self.pks)
+
+    def __len__(self):
+        return len(self.pks)
+
+    def __iter__(self):
+        self.slices.append(slice(None))
+        return iter(SimpleNamespace(pk=pk) for pk in self.pks)
+
+    def __getitem__(self, index):
+        self.slices.append(index)
+        return [SimpleNamespace(pk=pk) for pk in self.pks[index]]
+
+
+class SearchPagingTests(TestCase):
+    def setUp(self):
+        caches["auth"].clear()
+        self.client = create_api_client()
+        self.devices = create_devices(12)
+        # Relevance order differs from the default ordering
+        self.hits = [device.pk for device in reversed(self.devices[:9])]
+        self.sqs = FakeSearchQuerySet(self.hits)
+        patcher = unittest.mock.patch(
+            "backend.inventory.mixins.SearchQuerySet", return_value=self.sqs
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_search_paged_in_engine(self):
+        response = self.client.get(
+            reverse("device-list"), {"search": "Dell", "page": 2, "page_size": 4}
+        )
+
+        self.assertEqual(response.data["count"], 9)
+        self.assertEqual(
+            [item["device_id"] for item in response.data["results"]],
+            [str(pk) for pk in self.hits[4:8]],
+        )
+        self.assertEqual(self.sqs.slices, [slice(4, 8)])
+
+    def test_search_with_filters_intersects_in_database(self):
+        response = self.client.get(
+            reverse("device-list"), {"search": "Model", "type": "Laptop"}
+        )
+
+        expected = Device.objects.filter(pk__in=self.hits, type="Laptop")
+        self.assertEqual(response.data["count"], expected.count())
+        self.assertEqual(self.sqs.slices, [slice(None)])
+
+
+class SearchQueueTests(TestCase):
+    def setUp(self):
+        self.devices = create_devices(3)
+
+    def test_saves_are_queued(self):
+        device = self.devices[0]
+        device.notes = "Refurbished"
+        device.save()
+        Shipping.objects.create(date_shipped=date(2024, 2, 1))
+        donor = Donor.objects.get(name="Donor 2")
+        donor_pk = donor.pk
+        donor.delete()
+
+        self.assertEqual(
+            list(SearchIndexQueue.objects.values_list("model", "object_pk")),
+            [
+                ("inventory.device", str(device.pk)),
+                ("inventory.donor", str(donor_pk)),
+            ],
+        )
+        self.assertEqual(get_queue_stats()["pending"], 2)
+
+    def test_drain_coalesces_entries(self):
+        first, second, _ = self.devices
+        second_pk = second.pk
+        for _ in range(3):
+            first.save()
+        second.delete()
+        backend = unittest.mock.Mock()
+
+        with unittest.mock.patch.object(
+            haystack_connections["default"], "get_backend", return_value=backend
+        ):
+            self.assertEqual(drain_batch(batch_size=2), 2)
+            self.assertEqual(drain_batch(), 2)
+            self.assertEqual(drain_batch(), 0)
+
+        updated = [
+            obj.pk for call in backend.update.call_args_list for obj in call.args[1]
+        ]
+        self.assertEqual(updated, [first.pk, first.pk])
+        backend.remove.assert_called_once_with(f"inventory.device.{second_pk}")
+        self.assertEqual(get_queue_stats(), {"pending": 0, "lag": 0.0})
+
+
+class ReindexTests(TestCase):
+    def setUp(self):
+        self.enterContext(temporary_search_index())
+        self.devices = create_devices(7)
+
+    def search(self, text):
+        return SearchQuerySet().models(Device).filter(content=text).count()
+
+    def test_pk_ranges_cover_all_rows(self):
+        ranges = get_pk_ranges(Device.objects.all(), 3)
+
+        self.assertEqual(len(ranges), 3)
+        self.assertIsNone(ranges[-1][1])
+        covered = [
+            pk
+            for start, end in ranges
+            for pk in Device.objects.filter(pk__gte=start)
+            .filter(**({"pk__lt": end} if end else {}))
+            .values_list("pk", flat=True)
+        ]
+        self.assertCountEqual(covered, [device.pk for device in self.devices])
+
+    def test_full_then_incremental_reindex(self):
+        self.assertIsNone(reindex_changed(Device))
+        self.assertEqual(reindex_full(Device, chunk_size=3), 7)
+        self.assertEqual(self.search("Linux"), 7)
+
+        # Only rows saved since the watermark (minus the overlap) are read
+        watermark = get_watermark(Device)
+        Device.objects.update(updated_at=watermark - timedelta(hours=1))
+        device = self.devices[0]
+        device.operating_system = "FreeBSD"
+        device.save()
+
+        self.assertEqual(reindex_changed(Device), 1)
+        self.assertEqual(self.search("FreeBSD"), 1)
+        self.assertGreater(get_watermark(Device), watermark)
+
+    def test_full_reindex_keeps_documents_searchable(self):
+        reindex_full(Device)
+        # Deleted without signals, so the search queue does not see it
+        Device.objects.filter(pk=self.devices[0].pk)._raw_delete(connection.alias)
+
+        searched = []
+
+        def index_range(*args):
+            searched.append(self.search("Linux"))
+            return real_index_range(*args)
+
+        real_index_range = reindex.index_range
+        with unittest.mock.patch.object(reindex, "index_range", index_range):
+            self.assertEqual(reindex_full(Device, chunk_size=3), 6)
+
+        self.assertEqual(searched, [7, 7])
+        self.assertEqual(self.search("Linux"), 6)
+        self.assertEqual(remove_stale(Device), 0)
+
+
+@override_settings(INVENTORY_SEARCH={"BACKEND": "database"})
+class DatabaseSearchTests(TestCase):
+    def setUp(self):
+        caches["auth"].clear()
+        self.client = create_api_client()
+        self.devices = create_devices(12)
+        db_search.rebuild_search_documents(Device)
+
+    def test_database_search_with_filters_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("device-list"),
+                {"search": "dell linu", "type": "Laptop", "page_size": 50},
+            )
+
+        expected = Device.objects.filter(make="Dell", type="Laptop")
+        self.assertCountEqual(
+            [item["device_id"] for item in response.data["results"]],
+            [str(device.pk) for device in expected],
+        )
+        page_queries = [
+            query["sql"]
+            for query in queries
+            if "inventory_searchdocument" in query["sql"]
+        ]
+        self.assertTrue(page_queries)
+        self.assertTrue(all('"type" = ' in sql for sql in page_queries))
+
+    def test_search_documents_follow_saves(self):
+        device = self.devices[0]
+        device.notes = "Cracked hinge"
+        device.save()
+        pk = device.pk
+
+        self.assertEqual(
+            list(
+                Device.objects.filter(pk__in=db_search.search_filter(Device, "hinge"))
+            ),
+            [device],
+        )
+
+        device.delete()
+
+        self.assertFalse(
+            Device.objects.filter(pk__in=db_search.search_filter(Device, "hinge"))
+        )
+        self.assertFalse(
+            SearchDocument.objects.filter(
+                object_pk=db_search.get_document_pk(Device, pk)
+            )
+        )
+
+
+class ScanTests(TestCase):
+    def setUp(self):
+        caches["auth"].clear()
+        caches["inventory"].clear()
+        scan_cache.clear()
+        self.client = create_api_client()
+        self.devices = create_devices(5)
+
+    def test_scan_single_code(self):
+        device = self.devices[1]
+        for code in (device.serial_number, device.mac_id, str(device.pk).upper()):
+            response = self.client.get(reverse("device-scan"), {"code": code})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data["device_id"], str(device.pk))
+            self.assertEqual(response.data["location"], "Main Warehouse")
+
+        response = self.client.get(reverse("device-scan"), {"code": "UNKNOWN"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_scan_batch_uses_hot_cache(self):
+        codes = [device.serial_number for device in self.devices] + ["UNKNOWN"]
+        url = reverse("device-scan")
+
+        response = self.client.post(url, {"codes": codes}, format="json")
+        self.assertEqual(
+            [result["device"] is not None for result in response.data["results"]],
+            [True] * 5 + [False],
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url, {"codes": codes}, format="json")
+        self.assertFalse(
+            [query for query in queries if "inventory_device" in query["sql"]]
+        )
+
+        device = self.devices[0]
+        device.physical_condition = "Broken"
+        device.save()
+        response = self.client.post(url, {"codes": codes[:1]}, format="json")
+        self.assertEqual(
+            response.data["results"][0]["device"]["physical_condition"], "Broken"
+        )
+
+        # Writes unseen by the generations, as those of other processes, are
+        # served once entries expire
+        Device.objects.filter(pk=device.pk).update(physical_condition="Good")
+        response = self.client.post(url, {"codes": codes[:1]}, format="json")
+        self.assertEqual(
+            response.data["results"][0]["device"]["physical_condition"], "Broken"
+        )
+        expired = time.monotonic() + SCAN_CACHE_TTL
+        with unittest.mock.patch("time.monotonic", return_value=expired):
+            response = self.client.post(url, {"codes": codes[:1]}, format="json")
+        self.assertEqual(
+            response.data["results"][0]["device"]["physical_condition"], "Good"
+        )
+
+
+class LabelTests(TestCase):
+    def setUp(self):
+        caches["auth"].clear()
+        self.client = create_api_client()
+        self.devices = create_devices(7)
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings_override = override_settings(
+            INVENTORY_LABELS={"QR_CACHE_DIR": cache_dir.name}
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_label_sheets_stream_filtered_devices(self):
+        response = self.client.get(reverse("device-labels"), {"type": "Laptop"})
+
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode("utf-8")
+        laptops = Device.objects.filter(type="Laptop")
+        self.assertEqual(content.count('<div class="label">'), laptops.count())
+        self.assertEqual(content.count('<section class="sheet">'), 1)
+        for device in laptops:
+            self.assertIn(device.serial_number, content)
+
+    def test_qr_codes_are_cached_by_content(self):
+        self.assertEqual(prerender_qr_codes(Device.objects.all()), (7, 0))
+        self.assertEqual(prerender_qr_codes(Device.objects.all()), (0, 7))
+
+        payload = str(self.devices[0].pk)
+        with open(get_qr_path(payload), encoding="utf-8") as file:
+            self.assertEqual(get_qr(payload), file.read())
+        self.assertTrue(get_qr(payload).startswith("<svg"))
+
+    def test_tampered_qr_codes_are_rendered_again(self):
+        payload = str(self.devices[0].pk)
+        svg = get_qr(payload)
+        for tampered in (
+            svg.replace("<path ", "<script>alert(1)</script><path "),
+            svg.replace("<svg ", '<svg onload="alert(1)" '),
+            "alert(1)",
+        ):
+            with open(get_qr_path(payload), "w", encoding="utf-8") as file:
+                file.write(tampered)
+            self.assertEqual(get_qr(payload), svg)
+
+    def test_sheets_span_fetched_chunks(self):
+        with unittest.mock.patch.object(labels, "LABEL_CHUNK_SIZE", 2):
+            content = "".join(
+                labels.stream_label_sheets(Device.objects.all(), labels_per_sheet=3)
+            )
+
+        sheets = content.split('<section class="sheet">')[1:]
+        self.assertEqual(
+            [sheet.count('<div class="label">') for sheet in sheets], [3, 3, 1]
+        )
+
+
+class ShippingTests(TestCase):
+    def setUp(self):
+        caches["auth"].clear()
+        caches["inventory"].clear()
+        self.client = create_api_client()
+        self.devices = create_devices(30)
+        self.destination = Location.objects.create(
+            name="Field Office",
+            type="Office",
+            address="2 Side St",
+            country="Kenya",
+            city="Nairobi",
+            postal_code="00100",
+        )
+
+    def dispatch(self, devices):
+        return self.client.post(
+            reverse("shipping-dispatch"),
+            {
+                "destination": self.destination.pk,
+                "date_shipped": "2024-08-01",
+                "tracking_identifier": "TRACK-1",
+                "devices": [str(device.pk) for device in devices],
+            },
+            format="json",
+        )
+
+    def test_dispatch_query_count_independent_of_size(self):
+        # Warms the token and permission caches
+        self.dispatch(self.devices[:1])
+
+        query_counts = []
+        for devices in (self.devices[1:3], self.devices[3:]):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.dispatch(devices)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(response.data["device_count"], len(devices))
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+        shipment = Shipping.objects.get(pk=response.data["shipping_id"])
+        self.assertEqual(
+            Device.objects.filter(shipping_infos=shipment).count(), len(devices)
+        )
+
+    def test_dispatch_rejects_unknown_devices(self):
+        missing = Device(serial_number="SN-MISSING")
+        response = self.dispatch(self.devices[:3] + [missing])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["missing"], [str(missing.pk)])
+        self.assertFalse(Shipping.objects.exists())
+
+    def test_arrival_moves_devices(self):
+        shipment_id = self.dispatch(self.devices[:10]).data["shipping_id"]
+        url = reverse("shipping-arrive", args=[shipment_id])
+
+        response = self.client.post(
+            url, {"date_delivered": "2024-08-05"}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["devices_moved"], 10)
+        self.assertTrue(response.data["arrived"])
+        self.assertEqual(response.data["date_delivered"], "2024-08-05")
+        self.assertEqual(
+            Device.objects.filter(end_location=self.destination).count(), 10
+        )
+        self.assertEqual(
+            Device.objects.filter(start_location=self.destination).count(), 0
+        )
+
+        response = self.client.post(url, {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_arrival_moves_devices_once(self):
+        shipment_id = self.dispatch(self.devices[:2]).data["shipping_id"]
+        # Loaded by a concurrent request before the arrival
+        stale = Shipping.objects.get(pk=shipment_id)
+        self.client.post(reverse("shipping-arrive", args=[shipment_id]), {})
+
+        with unittest.mock.patch(
+            "backend.inventory.helpers.shipping.bulk_changed.send"
+        ) as send:
+            self.assertIsNone(mark_arrived(stale))
+        send.assert_not_called()
+
+
+class DatasetTests(TestCase):
+    def snapshot(self):
+        return list(
+            Device.objects.order_by("serial_number").values_list(
+                "device_id",
+                "serial_number",
+                "type",
+                "make",
+                "value",
+                "donor__name",
+                "end_location__name",
+                "shipping_infos__tracking_identifier",
+            )
+        )
+
+    def test_dataset_is_reproducible(self):
+        options = {"locations": 4, "donors": 6, "shipments": 5, "chunk_size": 10}
+        counts = create_dataset(3, 25, **options)
+        self.assertEqual(counts["devices"], 25)
+        self.assertEqual(Device.objects.count(), 25)
+        self.assertEqual(Location.objects.count(), 4)
+        self.assertEqual(
+            Device.shipping_infos.through.objects.count(), counts["shipment_links"]
+        )
+        snapshot = self.snapshot()
+
+        Device.objects.all().delete()
+        for model in (Donor, Location, Shipping):
+            model.objects.all().delete()
+        create_dataset(3, 25, workers=2, **options)
+        self.assertEqual(self.snapshot(), snapshot)
+
+    def test_dataset_seed_is_not_reused(self):
+        call_command("generate_dataset", devices=5, shipments=2, stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command("generate_dataset", devices=5, stdout=io.StringIO())
+        call_command("generate_dataset", devices=5, seed=2, stdout=io.StringIO())
+        self.assertEqual(Device.objects.count(), 10)
+
+    def test_mock_data_requires_authentication(self):
+        url = reverse("generate-mock-data")
+        response = APIClient().post(url, {"num_devices": 5}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        client = create_api_client()
+        response = client.post(url, {"num_devices": 10**6}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = client.post(url, {"num_devices": 5}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Device.objects.count(), 5)
+
+
+class BenchmarkTests(TestCase):
+    def test_benchmarks_report_percentiles(self):
+        results = run_benchmarks(
+            [10, 20],
+            ["device-retrieve", "device-search", "batch-edit"],
+            requests=3,
+            warmup=0,
+        )
+
+        self.assertEqual(Device.objects.count(), 20)
+        self.assertEqual(
+            [(result["size"], result["scenario"]) for result in results["results"]],
+            [
+                (size, scenario)
+                for size in (10, 20)
+                for scenario in ("device-retrieve", "device-search", "batch-edit")
+            ],
+        )
+        for result in results["results"]:
+            self.assertEqual(result["errors"], 0)
+            self.assertLessEqual(result["p50_ms"], result["p95_ms"])
+            self.assertLessEqual(result["p95_ms"], result["p99_ms"])
+
+    def test_benchmarks_separate_cached_lists(self):
+        reset_cache_stats()
+        self.addCleanup(reset_cache_stats)
+        metrics = collect_metrics()
+        run_benchmarks([10], ["device-list", "login"], requests=3, warmup=0)
+        self.assertEqual(get_cache_stats()["hits"], 0)
+        self.assertEqual(collect_metrics(), metrics)
+
+        results = run_benchmarks(
+            [10], ["device-list", "login"], requests=3, warmup=0, cached=True
+        )
+
+        self.assertEqual(
+            [(result["scenario"], result["cached"]) for result in results["results"]],
+            [("device-list", False), ("login", False), ("device-list", True)],
+        )
+        # The first cached request misses
+        self.assertEqual(get_cache_stats()["hits"], 2)
+        self.assertEqual(collect_metrics(), metrics)
+
+    def test_compare_flags_p95_regressions(self):
+        def document(*p95s):
+            return {
+                "results": [
+                    {"size": 100, "scenario": scenario, "p95_ms": p95}
+                    for scenario, p95 in zip(["device-list", "login"], p95s)
+                ]
+            }
+
+        self.assertEqual(compare_results(document(10, 100), document(10, 100)), [])
+        # +50% on device-list; login is within the threshold
+        (regression,) = compare_results(document(15, 110), document(10, 100))
+        self.assertEqual(regression["scenario"], "device-list")
+        self.assertEqual(regression["change"], 0.5)
+        # Below the absolute noise floor
+        self.assertEqual(compare_results(document(0.5, 100), document(0.2, 100)), [])
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        # Counts cached here would be served to later tests
+        caches["inventory"].clear()
+        self.addCleanup(caches["inventory"].clear)
+        self.client = create_api_client(permissions=["readDevices"])
+        create_devices(3)
+        metrics_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(metrics_dir.cleanup)
+        self.metrics_dir = metrics_dir.name
+        settings_override = override_settings(
+            METRICS={"DIRECTORY": self.metrics_dir, "ALLOWED_IPS": ["127.0.0.1"]}
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_server_timing_header(self):
+        caches["auth"].clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("device-list"))
+
+        entries = dict(
+            entry.split(";", 1) for entry in response["Server-Timing"].split(", ")
+        )
+        self.assertEqual(entries["queries"], f'desc="{len(queries)}"')
+        for phase in ("auth", "db", "serialize", "render", "total"):
+            self.assertRegex(entries[phase], r"^dur=\d+\.\d$")
+
+    def test_metrics_aggregate_routes(self):
+        for _ in range(3):
+            self.client.get(reverse("device-list"))
+        self.client.get(reverse("donor-list"))
+        # Another worker's file
+        (path,) = glob.glob(os.path.join(self.metrics_dir, "metrics-*.bin"))
+        shutil.copy(path, os.path.join(self.metrics_dir, "metrics-1.bin"))
+
+        totals = collect_metrics()
+        self.assertEqual(totals[("device-list", "GET")][0], 6)
+        self.assertEqual(totals[("donor-list", "GET")][0], 2)
+
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn(
+            'http_request_duration_seconds_count{route="device-list",method="GET"} 6',
+            body,
+        )
+        self.assertIn(
+            'http_request_duration_seconds_bucket{route="device-list",method="GET",'
+            'le="+Inf"} 6',
+            body,
+        )
+        self.assertIn('phase="db"', body)
+        self.assertNotIn('route="metrics"', body)
+
+    def test_metrics_only_served_locally(self):
+        response = self.client.get(reverse("metrics"), REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_stale_metrics_cleared(self):
+        self.client.get(reverse("device-list"))
+        exited = subprocess.Popen(["true"])
+        exited.wait()
+        stale = os.path.join(self.metrics_dir, f"metrics-{exited.pid}.bin")
+        shutil.copy(os.path.join(self.metrics_dir, f"metrics-{os.getpid()}.bin"), stale)
+
+        self.assertEqual(clear_stale_metrics(), 1)
+        self.assertEqual(os.listdir(self.metrics_dir), [f"metrics-{os.getpid()}.bin"])
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        caches["auth"].clear()
+        self.client = create_api_client()
+        self.devices = create_devices(12)
+        # Bulk created devices send no signals
+        rebuild_inventory_rollups()
+        backfill_history_rollups()
+        self.location = self.devices[0].end_location
+        self.destination = Location.objects.create(
+            name="Field Office",
+            type="Office",
+            address="2 Side St",
+            country="Kenya",
+            city="Nairobi",
+            postal_code="00100",
+        )
+
+    def assert_rollups_match(self):
+        stored = {
+            (row.end_location_id, row.type, row.physical_condition): (
+                row.device_count,
+                row.total_value,
+            )
+            for row in InventoryRollup.objects.exclude(device_count=0)
+        }
+        self.assertEqual(stored, get_device_groups())
+
+        history = self.get_history_rows()
+        backfill_history_rollups()
+        self.assertEqual(history, self.get_history_rows())
+
+    def get_history_rows(self):
+        return {
+            row
+            for row in HistoryRollup.objects.values_list(
+                "granularity",
+                "period_start",
+                "donor_id",
+                "type",
+                "received_count",
+                "received_value",
+                "donated_count",
+                "donated_value",
+            )
+            if any(row[4:])
+        }
+
+    def test_rollups_follow_writes(self):
+        response = self.client.post(
+            reverse("device-list"),
+            {
+                "type": "Phone",
+                "make": "Nokia",
+                "model": "3310",
+                "serial_number": "NEW-1",
+                "mac_id": "NEW-1",
+                "year_of_manufacture": 2020,
+                "date_received": "2024-03-01",
+                "physical_condition": "Good",
+                "operating_system": "Linux",
+                "date_of_donation": "2024-02-01",
+                "value": "50.00",
+                "end_location": self.location.pk,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assert_rollups_match()
+
+        device_id = response.data["device_id"]
+        self.client.patch(
+            reverse("device-detail", args=[device_id]),
+            {
+                "physical_condition": "Poor",
+                "value": "20.50",
+                "donor": Donor.objects.first().pk,
+                "date_of_donation": "2023-06-15",
+            },
+            format="json",
+        )
+        self.assert_rollups_match()
+
+        self.client.patch(
+            f"{reverse('batch-operations')}?model=device",
+            {
+                "objects": [
+                    {"id": str(device.pk), "type": "Server", "value": "300.00"}
+                    for device in self.devices[:4]
+                ]
+                + [{"id": str(self.devices[4].pk), "end_location": None}]
+            },
+            format="json",
+        )
+        self.assert_rollups_match()
+
+        self.client.post(
+            reverse("device-import"),
+            {
+                "file": SimpleUploadedFile(
+                    "devices.csv", DEVICE_CSV.format(size=1).encode()
+                )
+            },
+            format="multipart",
+        )
+        self.assert_rollups_match()
+
+        response = self.client.post(
+            reverse("shipping-dispatch"),
+            {
+                "destination": self.destination.pk,
+                "date_shipped": "2024-08-01",
+                "devices": [str(device.pk) for device in self.devices[2:8]],
+            },
+            format="json",
+        )
+        self.client.post(
+            reverse("shipping-arrive", args=[response.data["shipping_id"]])
+        )
+        self.assert_rollups_match()
+
+        self.client.delete(reverse("device-detail", args=[device_id]))
+        self.client.delete(
+            f"{reverse('batch-operations')}?model=device",
+            {"ids": [str(device.pk) for device in self.devices[6:10]]},
+            format="json",
+        )
+        self.assert_rollups_match()
+
+        # Rows of a deleted location are read as devices without one until
+        # the next rebuild
+        self.destination.delete()
+        summary = get_inventory_summary()
+        rebuild_inventory_rollups()
+        self.assertEqual(get_inventory_summary(), summary)
+
+    def test_rebuild_corrects_drift(self):
+        InventoryRollup.objects.filter(type="Laptop").update(device_count=99)
+        InventoryRollup.objects.filter(type="Tablet").delete()
+        InventoryRollup.objects.create(
+            end_location_id=self.location.pk, type="Ghost", physical_condition="Good"
+        )
+
+        output = io.StringIO()
+        call_command("rebuild_inventory_rollups", stdout=output)
+
+        self.assertIn("Corrected 5 rollup groups", output.getvalue())
+        self.assert_rollups_match()
+        self.assertEqual(rebuild_inventory_rollups(), 0)
+
+    def test_summary_endpoint(self):
+        url = reverse("device-summary")
+        # Warms the token and permission caches
+        self.client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["device_count"], 12)
+        self.assertEqual(response.data["total_value"], "1200.00")
+        self.assertEqual(len(response.data["groups"]), 6)
+        self.assertEqual(
+            response.data["groups"][0],
+            {
+                "end_location": self.location.pk,
+                "type": "Desktop",
+                "physical_condition": "Fair",
+                "end_location_name": "Main Warehouse",
+                "device_count": 2,
+                "total_value": "200.00",
+            },
+        )
+
+        response = self.client.get(
+            url, {"group_by": "type", "physical_condition": "Good"}
+        )
+        self.assertEqual(
+            [
+                (group["type"], group["device_count"])
+                for group in response.data["groups"]
+            ],
+            [("Desktop", 2), ("Laptop", 2), ("Tablet", 2)],
+        )
+
+        # One group per device
+        Device.objects.update(type=F("serial_number"))
+        rebuild_inventory_rollups()
+        with CaptureQueriesContext(connection) as more_queries:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data["groups"]), 12)
+        self.assertEqual(len(more_queries), len(queries))
+
+        # Devices of deleted locations are reported without one
+        Location.objects.filter(pk=self.location.pk).delete()
+        response = self.client.get(url, {"group_by": "end_location"})
+        self.assertEqual(
+            response.data["groups"],
+            [
+                {
+                    "end_location": None,
+                    "end_location_name": None,
+                    "device_count": 12,
+                    "total_value": "1200.00",
+                }
+            ],
+        )
+
+        response = self.client.get(url, {"group_by": "make"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_history_backfill_in_chunks(self):
+        rows = self.get_history_rows()
+
+        output = io.StringIO()
+        call_command("backfill_history_rollups", "--chunk-size", "5", stdout=output)
+
+        self.assertIn("Backfilled the history of 12 devices", output.getvalue())
+        self.assertEqual(self.get_history_rows(), rows)
+        # A device adds one row per granularity for each of its two dates
+        self.assertEqual(HistoryRollup.objects.filter(granularity="day").count(), 24)
+
+    def test_history_migration_builds_rollups(self):
+        rows = self.get_history_rows()
+        HistoryRollup.objects.all().delete()
+
+        migration = importlib.import_module(
+            "backend.inventory.migrations.0008_history_rollup"
+        )
+        migration.build_rollups(django_apps, None)
+
+        self.assertEqual(self.get_history_rows(), rows)
+
+    def test_history_report(self):
+        url = reverse("device-history")
+        response = self.client.get(
+            url,
+            {
+                "granularity": "month",
+                "start": "2023-01-01",
+                "end": "2024-12-31",
+                "group_by": "type",
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["periods"]), 15)
+        self.assertEqual(
+            response.data["periods"][-1],
+            {
+                "period_start": "2024-01-01",
+                "type": "Tablet",
+                "received_count": 4,
+                "received_value": "400.00",
+                "donated_count": 0,
+                "donated_value": "0.00",
+            },
+        )
+        self.assertEqual(response.data["received_count"], 12)
+        self.assertEqual(response.data["donated_value"], "1200.00")
+
+        # Whole weeks: the week of Monday 2024-01-01 is reported
+        response = self.client.get(
+            url,
+            {
+                "granularity": "week",
+                "start": "2024-01-03",
+                "end": "2024-01-07",
+                "group_by": "donor",
+                "type": "Laptop",
+            },
+        )
+        donor = Donor.objects.get(name="Donor 0")
+        self.assertEqual(
+            [
+                (period["period_start"], period["donor"], period["received_count"])
+                for period in response.data["periods"]
+            ],
+            [("2024-01-01", donor.pk, 2), ("2024-01-01", None, 1)],
+        )
+
+        # Devices of deleted donors are reported without one
+        donor.delete()
+        response = self.client.get(
+            url, {"granularity": "month", "start": "2024-01-01", "end": "2024-01-31"}
+        )
+        self.assertEqual(
+            sum(
+                period["received_count"]
+                for period in response.data["periods"]
+                if period["donor"] is None
+            ),
+            # Three devices without a donor and three of Donor 0
+            6,
+        )
+
+        with CaptureQueriesContext(connection) as day_queries:
+            self.client.get(
+                url, {"granularity": "day", "start": "2024-01-02", "end": "2024-01-02"}
+            )
+        with CaptureQueriesContext(connection) as years_queries:
+            response = self.client.get(
+                url, {"granularity": "day", "start": "2019-06-01", "end": "2024-06-01"}
+            )
+        self.assertEqual(len(years_queries), len(day_queries))
+        self.assertEqual(response.data["received_count"], 12)
+        self.assertFalse(
+            any('"inventory_device"' in query["sql"] for query in years_queries)
+        )
+
+        for params in (
+            {"granularity": "year"},
+            {"start": "2024-02-01", "end": "2024-01-01"},
+            {"start": "yesterday"},
+            {"group_by": "make"},
+        ):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class DeviceEventTests(TestCase):
+    def setUp(self):
+        caches["auth"].clear()
+        event_buffer.events.clear()
+        self.addCleanup(event_buffer.events.clear)
+        self.client = create_api_client()
+        self.user = User.objects.get(username="inventory")
+        self.devices = create_devices(6)
+        self.destination = Location.objects.create(
+            name="Field Office",
+            type="Office",
+            address="2 Side St",
+            country="Kenya",
+            city="Nairobi",
+            postal_code="00100",
+        )
+
+    def write(self, method, url, data, params=""):
+        # Test transactions never commit; run the commit hooks of the write
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(
+                f"{url}{params}", data, format="json"
+            )
+        self.assertLess(response.status_code, 300, response.content)
+        return response
+
+    def get_events(self, device_id, **params):
+        response = self.client.get(reverse("device-events", args=[device_id]), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["results"]
+
+    def test_events_follow_writes(self):
+        device_id = self.write(
+            "post",
+            reverse("device-list"),
+            {
+                "type": "Phone",
+                "make": "Nokia",
+                "model": "3310",
+                "serial_number": "NEW-1",
+                "mac_id": "NEW-1",
+                "year_of_manufacture": 2020,
+                "date_received": "2024-03-01",
+                "physical_condition": "Good",
+                "operating_system": "Linux",
+                "date_of_donation": "2024-02-01",
+                "value": "50.00",
+            },
+        ).data["device_id"]
+        self.write(
+            "patch",
+            reverse("device-detail", args=[device_id]),
+            {"physical_condition": "Poor", "value": "20.50", "notes": ""},
+        )
+        self.write(
+            "patch",
+            reverse("batch-operations"),
+            {
+                "objects": [
+                    {"id": device_id, "type": "Handset"},
+                    {"id": str(self.devices[0].pk), "value": "100.00"},
+                ]
+            },
+            params="?model=device",
+        )
+        shipment_id = self.write(
+            "post",
+            reverse("shipping-dispatch"),
+            {
+                "destination": self.destination.pk,
+                "date_shipped": "2024-08-01",
+                "devices": [device_id],
+            },
+        ).data["shipping_id"]
+        self.write("post", reverse("shipping-arrive", args=[shipment_id]), {})
+        self.write("delete", reverse("device-detail", args=[device_id]), {})
+
+        events = self.get_events(device_id)
+        self.assertEqual(
+            [(event["action"], event["source"]) for event in events],
+            [
+                ("delete", "api"),
+                ("update", "shipping"),
+                ("dispatch", "shipping"),
+                ("update", "batch"),
+                ("update", "api"),
+                ("create", "api"),
+            ],
+        )
+        self.assertTrue(all(event["user_id"] == self.user.pk for event in events))
+        delete, arrive, dispatch, batch, patch, create = (
+            event["changes"] for event in events
+        )
+        self.assertEqual(create["serial_number"], [None, "NEW-1"])
+        self.assertNotIn("notes", create)
+        self.assertEqual(
+            patch, {"physical_condition": ["Good", "Poor"], "value": ["50.00", "20.50"]}
+        )
+        self.assertEqual(batch, {"type": ["Phone", "Handset"]})
+        self.assertEqual(dispatch, {"shipment": [None, shipment_id]})
+        self.assertEqual(arrive, {"end_location": [None, self.destination.pk]})
+        self.assertEqual(delete["type"], ["Handset", None])
+        self.assertEqual(delete["end_location"], [self.destination.pk, None])
+
+        # Unchanged values leave no events
+        self.assertEqual(self.get_events(self.devices[0].pk), [])
+
+    def test_events_buffered_until_commit_and_flush(self):
+        device = Device.objects.get(pk=self.devices[0].pk)
+        device.notes = "Rolled back"
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    device.save()
+                    raise RuntimeError
+        self.assertEqual(event_buffer.events, [])
+
+        # Instances keep the values of rolled back saves, as in Django
+        device = Device.objects.get(pk=device.pk)
+        device.notes = "Kept"
+        with self.captureOnCommitCallbacks(execute=True):
+            device.save()
+        self.assertEqual(len(event_buffer.events), 1)
+        self.assertFalse(DeviceEvent.objects.exists())
+
+        # Flushed once a request finishes
+        self.client.get(reverse("device-summary"))
+        self.assertEqual(event_buffer.events, [])
+        event = DeviceEvent.objects.get()
+        self.assertEqual(event.changes, {"notes": ["", "Kept"]})
+        self.assertEqual(event.source, "")
+
+        with unittest.mock.patch("backend.inventory.events.FLUSH_SIZE", 3):
+            with self.captureOnCommitCallbacks(execute=True):
+                Device.objects.filter(pk__in=[d.pk for d in self.devices]).delete()
+        self.assertEqual(DeviceEvent.objects.filter(action="delete").count(), 6)
+
+    def test_events_keyset_pages(self):
+        device_id = self.devices[0].pk
+        DeviceEvent.objects.bulk_create(
+            [
+                DeviceEvent(
+                    device_id=device_id,
+                    action="update",
+                    changes={"notes": [str(index), str(index + 1)]},
+                    recorded_at=timezone.now(),
+                )
+                for index in range(25)
+            ]
+            + [
+                DeviceEvent(
+                    device_id=self.devices[1].pk,
+                    action="update",
+                    recorded_at=timezone.now(),
+                )
+            ]
+        )
+
+        seen = []
+        query_counts = []
+        url = reverse("device-events", args=[device_id]) + "?page_size=10"
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = follow(self.client, url)
+            query_counts.append(len(queries))
+            seen += [event["changes"]["notes"][1] for event in response.data["results"]]
+            url = response.data["links"]["next"]
+        self.assertEqual(seen, [str(index) for index in range(25, 0, -1)])
+        self.assertEqual(len(set(query_counts[1:])), 1)
+
+        response = self.client.get(reverse("device-events", args=["not-a-uuid"]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.cache_dirs = use_shared_caches(self, "inventory")
+        caches["auth"].clear()
+        self.client = create_api_client()
+        self.devices = create_devices(6)
+        self.location = self.devices[0].end_location
+
+    def get(self, url, params=None, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params, headers=headers)
+        self.queries = [query["sql"] for query in queries]
+        return response
+
+    def test_list_not_modified_until_written(self):
+        url = reverse("device-list")
+        response = self.get(url, {"type": "Laptop"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+        self.assertRegex(etag, r'^"[0-9a-f]{32}"$')
+        self.assertIn("Last-Modified", response)
+
+        response = self.get(url, {"type": "Laptop"}, if_none_match=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+        self.assertFalse(any("inventory_device" in sql for sql in self.queries))
+
+        # Other parameters are other representations
+        response = self.get(url, {"type": "Tablet"}, if_none_match=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+        self.client.patch(
+            reverse("device-detail", args=[self.devices[1].pk]),
+            {"notes": "Checked"},
+            format="json",
+        )
+        response = self.get(url, {"type": "Laptop"}, if_none_match=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+
+        # Deleting a location nulls the devices' keys without their signals
+        self.location.delete()
+        response = self.get(url, {"type": "Laptop"}, if_none_match=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data["results"][0]["end_location"])
+
+        response = self.get(url, {"search": "Laptop"}, if_none_match=response["ETag"])
+        self.assertNotIn("ETag", response)
+
+    def test_list_versioned_by_shared_generations(self):
+        url = reverse("device-list")
+        etag = self.get(url)["ETag"]
+
+        # Another process bumping the generation
+        FileBasedCache(self.cache_dirs["inventory"], {}).incr(
+            get_cache_key("inventory_device")
+        )
+        response = self.get(url, if_none_match=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        process_local = {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "inventory",
+        }
+        with override_settings(CACHES={**settings.CACHES, "inventory": process_local}):
+            response = self.get(url)
+        self.assertNotIn("ETag", response)
+        self.assertEqual(len(response.data["results"]), 6)
+
+    def test_detail_versioned_per_row(self):
+        first, second = (
+            reverse("device-detail", args=[device.pk]) for device in self.devices[:2]
+        )
+        etag = self.get(first)["ETag"]
+        response = self.get(first, if_none_match=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # The version read
+        self.assertEqual(sum("inventory_device" in sql for sql in self.queries), 1)
+
+        # Writes to other devices keep the ETag
+        self.client.patch(second, {"notes": "Checked"}, format="json")
+        response = self.get(first, if_none_match=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(first, {"notes": "Checked"}, format="json")
+        response = self.get(first, if_none_match=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+
+        # So do dispatches, which only write the shipping table
+        self.client.post(
+            reverse("shipping-dispatch"),
+            {
+                "destination": self.location.pk,
+                "date_shipped": "2024-08-01",
+                "devices": [str(self.devices[0].pk)],
+            },
+            format="json",
+        )
+        response = self.get(first, if_none_match=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["shipping_infos"]), 1)
+
+        response = self.get(first, if_modified_since=response["Last-Modified"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        donor = Donor.objects.first()
+        url = reverse("donor-detail", args=[donor.pk])
+        etag = self.get(url)["ETag"]
+        self.assertEqual(
+            self.get(url, if_none_match=etag).status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+        self.assertEqual(
+            self.get(reverse("device-detail", args=["missing"])).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dirs = use_shared_caches(self, "inventory")
+        caches["auth"].clear()
+        caches["responses"].clear()
+        self.client = create_api_client()
+        self.devices = create_devices(8)
+
+    def get(self, client, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse("device-list"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.queries = [query["sql"] for query in queries]
+        return response
+
+    def test_list_cached_until_written(self):
+        params = {"type": "Laptop", "ordering": "make", "page_size": 2}
+        response = self.get(self.client, params)
+        self.assertEqual(response["X-Cache"], "MISS")
+        data = response.data
+
+        # Parameters are keyed in a canonical order
+        response = self.get(self.client, dict(reversed(params.items())))
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.data["results"], data["results"])
+        self.assertEqual(self.queries, [])
+
+        self.client.patch(
+            f"{reverse('batch-operations')}?model=device",
+            {"objects": [{"id": str(self.devices[0].pk), "make": "Acer"}]},
+            format="json",
+        )
+        response = self.get(self.client, params)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"][0]["make"], "Acer")
+
+        # Writes to a table the filters join invalidate too
+        params = {"donor__name": "Donor 1"}
+        self.assertEqual(self.get(self.client, params)["X-Cache"], "MISS")
+        Donor.objects.filter(name="Donor 1").get().save()
+        self.assertEqual(self.get(self.client, params)["X-Cache"], "MISS")
+        self.assertEqual(self.get(self.client, params)["X-Cache"], "HIT")
+
+        self.assertNotIn("X-Cache", self.get(self.client, {"search": "Laptop"}))
+        self.assertEqual(get_cache_stats(), {"hits": 2, "misses": 4, "hit_rate": 2 / 6})
+
+    def test_file_cache_keyed_by_permission_scope(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        backends = get_shared_caches(responses=directory)
+        reader = create_api_client("reader", permissions=["readDevices"])
+        with override_settings(CACHES=backends):
+            self.assertEqual(self.get(self.client, {})["X-Cache"], "MISS")
+            self.assertEqual(self.get(self.client, {})["X-Cache"], "HIT")
+            self.assertEqual(self.get(reader, {})["X-Cache"], "MISS")
+            response = self.get(reader, {})
+            self.assertEqual(response["X-Cache"], "HIT")
+            self.assertEqual(response.data["count"], 8)
+            self.assertEqual(get_cache_stats()["hit_rate"], 0.5)
+            self.assertTrue(os.listdir(directory))
+
+            # Increments of concurrent lookups are not lost
+            threads = [
+                threading.Thread(
+                    target=lambda: [count_outcome("hits") for _ in range(25)]
+                )
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(get_cache_stats()["hits"], 102)
+
+    def test_entries_computed_before_commit_are_dropped(self):
+        self.assertEqual(self.get(self.client, {})["X-Cache"], "MISS")
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.devices[0].save()
+            # A reader before the commit caches under the first bump
+            self.assertEqual(self.get(self.client, {})["X-Cache"], "MISS")
+            self.assertEqual(self.get(self.client, {})["X-Cache"], "HIT")
+        self.assertTrue(callbacks)
+
+        self.assertEqual(self.get(self.client, {})["X-Cache"], "MISS")
+
+    def test_entries_see_bumps_of_other_processes(self):
+        self.assertEqual(self.get(self.client, {})["X-Cache"], "MISS")
+        self.assertEqual(self.get(self.client, {})["X-Cache"], "HIT")
+
+        # Another process bumping the generation of a rendered table
+        FileBasedCache(self.cache_dirs["inventory"], {}).incr(
+            get_cache_key(Device.shipping_infos.through._meta.db_table)
+        )
+        self.assertEqual(self.get(self.client, {})["X-Cache"], "MISS")
+
+        process_local = {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "inventory",
+        }
+        with override_settings(CACHES={**settings.CACHES, "inventory": process_local}):
+            self.assertNotIn("X-Cache", self.get(self.client, {}))
+
+
+def use_shared_caches(test_case, *aliases):
+    """
+    Stores the given cache aliases in temporary directories for the test,
+    as caches shared by the workers would be.
+
+    :return: A {alias: directory} dict.
+    """
+    directories = {}
+    for alias in aliases:
+        directory = tempfile.TemporaryDirectory()
+        test_case.addCleanup(directory.cleanup)
+        directories[alias] = directory.name
+    settings_override = override_settings(CACHES=get_shared_caches(**directories))
+    settings_override.enable()
+    test_case.addCleanup(settings_override.disable)
+    return directories
+
+
+def get_shared_caches(**directories):
+    """
+    Returns `settings.CACHES` with the given aliases stored under their
+    directories, shared with any other cache instance on them.
+    """
+    return {
+        **settings.CACHES,
+        **{
+            alias: {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": directory,
+            }
+            for alias, directory in directories.items()
+        },
+    }
+
+
+def fingerprint(sql):
+    """
+    Normalizes `sql` so that queries differing only in literals compare equal.
+    """
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    sql = re.sub(r"IN \((?:\?, )*\?\)", "IN (...)", sql)
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def get_query_time(queries):
+    return round(sum(float(query["time"]) for query in queries) * 1000, 3)
+
+
+def format_queries(queries):
+    counts = Counter(fingerprint(query["sql"]) for query in queries)
+    return f"  {get_query_time(queries)} ms in total\n" + "\n".join(
+        f"  {count}x {sql}" for sql, count in counts.most_common()
+    )
+
+
+def get_route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            if not str(pattern.pattern).startswith("admin"):
+                yield from get_route_names(pattern.url_patterns)
+        elif pattern.name:
+            yield pattern.name
+
+
+# The maximum number of queries of one request, with cold caches. `args`,
+# `data` and `params` take the fixtures of QueryBudgetTests.
+RouteBudget = namedtuple(
+    "RouteBudget", "route method max_queries args data params", defaults=(None,) * 3
+)
+
+DEVICE_CSV = (
+    "type,make,model,serial_number,mac_id,year_of_manufacture,date_received,"
+    "physical_condition,operating_system,donor,date_of_donation,value\n"
+    "Laptop,Dell,XPS,IMPORT-{size}-1,IMPORT-{size}-1,2020,2024-03-01,Good,Linux,"
+    ",2024-02-01,50\n"
+    "Laptop,Dell,XPS,IMPORT-{size}-2,IMPORT-{size}-2,2020,2024-03-01,Good,Linux,"
+    ",2024-02-01,50\n"
+)
+
+QUERY_BUDGETS = [
+    RouteBudget(
+        "user-login",
+        "post",
+        2,
+        data=lambda f: {"username": "inventory", "password": "Str0ng!Password"},
+    ),
+    RouteBudget("api-root", "get", 0),
+    RouteBudget("metrics", "get", 0),
+    RouteBudget("device-list", "get", 6, params=lambda f: {"page_size": 100}),
+    RouteBudget(
+        "device-list",
+        "post",
+        12,
+        data=lambda f: {
+            "type": "Laptop",
+            "make": "Dell",
+            "model": "XPS",
+            "serial_number": f"NEW-{f.size}",
+            "mac_id": f"NEW-{f.size}",
+            "year_of_manufacture": 2020,
+            "date_received": "2024-03-01",
+            "physical_condition": "Good",
+            "operating_system": "Linux",
+            "date_of_donation": "2024-02-01",
+            "value": "50.00",
+            "donor": f.donor.pk,
+            "start_location": f.location.pk,
+            "end_location": f.location.pk,
+        },
+    ),
+    RouteBudget("device-detail", "get", 5, args=lambda f: [f.device.pk]),
+    RouteBudget(
+        "device-detail",
+        "patch",
+        7,
+        args=lambda f: [f.device.pk],
+        data=lambda f: {"notes": "Checked"},
+    ),
+    RouteBudget("device-export", "get", 3, params=lambda f: {"file_format": "csv"}),
+    RouteBudget(
+        "device-import",
+        "post",
+        11,
+        data=lambda f: {
+            "file": SimpleUploadedFile(
+                "devices.csv", DEVICE_CSV.format(size=f.size).encode("utf-8")
+            )
+        },
+    ),
+    RouteBudget("device-labels", "get", 3),
+    RouteBudget("device-summary", "get", 4),
+    RouteBudget("device-events", "get", 3, args=lambda f: [f.device.pk]),
+    RouteBudget(
+        "device-history",
+        "get",
+        4,
+        params=lambda f: {"granularity": "day", "start": "2020-01-01"},
+    ),
+    RouteBudget(
+        "device-scan", "get", 3, params=lambda f: {"code": f.device.serial_number}
+    ),
+    RouteBudget("location-list", "get", 4, params=lambda f: {"page_size": 100}),
+    RouteBudget(
+        "location-list",
+        "post",
+        4,
+        data=lambda f: {
+            "name": f"New Location {f.size}",
+            "type": "Warehouse",
+            "address": "1 New St",
+            "country": "Kenya",
+            "city": "Nairobi",
+            "postal_code": "00100",
+        },
+    ),
+    RouteBudget("location-detail", "get", 4, args=lambda f: [f.location.pk]),
+    RouteBudget(
+        "location-detail",
+        "patch",
+        5,
+        args=lambda f: [f.location.pk],
+        data=lambda f: {"city": "Mombasa"},
+    ),
+    RouteBudget("donor-list", "get", 4, params=lambda f: {"page_size": 100}),
+    RouteBudget("donor-detail", "get", 4, args=lambda f: [f.donor.pk]),
+    RouteBudget(
+        "donor-detail",
+        "patch",
+        5,
+        args=lambda f: [f.donor.pk],
+        data=lambda f: {"phone": "555-0199"},
+    ),
+    RouteBudget("shipping-list", "get", 4, params=lambda f: {"page_size": 100}),
+    RouteBudget("shipping-detail", "get", 3, args=lambda f: [f.shipment.pk]),
+    RouteBudget(
+        "shipping-dispatch",
+        "post",
+        8,
+        data=lambda f: {
+            "destination": f.location.pk,
+            "date_shipped": "2024-08-01",
+            "devices": f.device_ids,
+        },
+    ),
+    RouteBudget("shipping-arrive", "post", 9, args=lambda f: [f.shipment.pk]),
+    RouteBudget(
+        "batch-operations",
+        "patch",
+        7,
+        params=lambda f: {"model": "device"},
+        data=lambda f: {
+            "objects": [{"id": pk, "notes": "Batch"} for pk in f.device_ids]
+        },
+    ),
+    RouteBudget(
+        "generate-mock-data",
+        "post",
+        17,
+        data=lambda f: {
+            "num_locations": 1,
+            "num_donors": 1,
+            "num_devices": 2,
+            "num_shipping": 1,
+        },
+    ),
+    RouteBudget("user-list", "get", 4, params=lambda f: {"page_size": 100}),
+    RouteBudget(
+        "user-create",
+        "post",
+        3,
+        data=lambda f: {
+            "username": f"new{f.size}",
+            "password": "Str0ng!Password",
+            "email": f"new{f.size}@example.com",
+            "role": "staff",
+            "first_name": "New",
+            "last_name": "User",
+        },
+    ),
+    RouteBudget("user-detail", "get", 3, args=lambda f: [f.user.pk]),
+    RouteBudget(
+        "user-detail",
+        "patch",
+        5,
+        args=lambda f: [f.user.pk],
+        data=lambda f: {"role": "manager"},
+    ),
+    RouteBudget(
+        "user-password-update",
+        "patch",
+        5,
+        # Unchanged, as later requests log in with it
+        data=lambda f: {"password": "Str0ng!Password"},
+    ),
+    RouteBudget("user-permissions-detail", "get", 3, args=lambda f: [f.user.username]),
+    RouteBudget(
+        "user-permissions-detail",
+        "patch",
+        5,
+        args=lambda f: [f.user.username],
+        data=lambda f: {"permissions": ["readDevices"]},
+    ),
+    RouteBudget(
+        "user-permissions-clear", "delete", 5, args=lambda f: [f.user.username]
+    ),
+    RouteBudget(
+        "user-permissions-delete-all-permissions",
+        "delete",
+        5,
+        args=lambda f: [f.user.username],
+    ),
+    # Deletes last, as they remove fixtures
+    RouteBudget("shipping-detail", "delete", 5, args=lambda f: [f.shipment.pk]),
+    RouteBudget("device-detail", "delete", 10, args=lambda f: [f.device.pk]),
+    RouteBudget("location-detail", "delete", 8, args=lambda f: [f.location.pk]),
+]
+
+
+class QueryBudgetTests(TestCase):
+    sizes = [5, 25]
+
+    def setUp(self):
+        caches["auth"].clear()
+        self.client = create_api_client()
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings_override = override_settings(
+            INVENTORY_LABELS={"QR_CACHE_DIR": cache_dir.name}
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def get_fixtures(self, size):
+        """
+        Grows the dataset to `size` devices and users, and returns fresh
+        objects for the budgeted requests.
+        """
+        missing = size - Device.objects.filter(serial_number__startswith="SN-").count()
+        create_dataset(
+            size, missing, locations=3, donors=size, shipments=size, chunk_size=10
+        )
+        User.objects.bulk_create(
+            [
+                User(
+                    username=f"member{size}-{index}",
+                    email=f"member{size}-{index}@example.com",
+                    password="Str0ng!Password",
+                    role="staff",
+                    first_name="Member",
+                    last_name="User",
+                    permissions=["readDevices"],
+                )
+                for index in range(size - User.objects.count())
+            ]
+        )
+        device_ids = [
+            str(pk)
+            for pk in Device.objects.filter(serial_number__startswith="SN-")
+            .order_by("serial_number")
+            .values_list("pk", flat=True)
+        ]
+        location = Location.objects.order_by("-pk").first()
+        user = User.objects.create(
+            username=f"member{size}",
+            email=f"member{size}@example.com",
+            password="Str0ng!Password",
+            role="staff",
+            first_name="Member",
+            last_name="User",
+            permissions=["readDevices"],
+        )
+        return SimpleNamespace(
+            size=size,
+            device_ids=device_ids,
+            device=Device.objects.get(pk=device_ids[-1]),
+            donor=Donor.objects.order_by("-pk").first(),
+            location=location,
+            shipment=Shipping.objects.create(
+                destination=location, date_shipped=date(2024, 8, 1)
+            ),
+            user=user,
+        )
+
+    def send(self, budget, fixtures):
+        url = reverse(budget.route, args=budget.args(fixtures) if budget.args else [])
+        if budget.params:
+            url = f"{url}?{urlencode(budget.params(fixtures))}"
+        data = budget.data(fixtures) if budget.data else None
+        is_upload = data is not None and any(
+            isinstance(value, SimpleUploadedFile) for value in data.values()
+        )
+        response = getattr(self.client, budget.method)(
+            url, data, format="multipart" if is_upload else "json"
+        )
+        if response.streaming:
+            return response, b"".join(response.streaming_content)
+        return response, response.content
+
+    def test_every_route_has_a_query_budget(self):
+        self.assertEqual(
+            set(get_route_names(get_resolver().url_patterns)),
+            {budget.route for budget in QUERY_BUDGETS},
+        )
+
+    def test_query_budgets(self):
+        report = {}
+        for size in self.sizes:
+            fixtures = self.get_fixtures(size)
+            for budget in QUERY_BUDGETS:
+                # Cold caches, so every size pays the same cache misses
+                caches["auth"].clear()
+                caches["inventory"].clear()
+                caches["responses"].clear()
+                scan_cache.clear()
+                # Mock data makes the same random choices at every size
+                random.seed(0)
+                with CaptureQueriesContext(connection) as queries:
+                    response, content = self.send(budget, fixtures)
+                key = f"{budget.method.upper()} {budget.route}"
+                report.setdefault(key, {})[size] = {
+                    "queries": list(queries),
+                    "status": response.status_code,
+                }
+
+                with self.subTest(route=key, size=size):
+                    self.assertLess(response.status_code, 400, content[:500])
+                    self.assertLessEqual(
+                        len(queries),
+                        budget.max_queries,
+                        f"{key} made {len(queries)} queries at {size} devices, "
+                        f"over its budget of {budget.max_queries}:\n"
+                        + format_queries(queries),
+                    )
+
+        small, large = self.sizes
+        for key, by_size in report.items():
+            with self.subTest(route=key):
+                self.assertEqual(
+                    len(by_size[small]["queries"]),
+                    len(by_size[large]["queries"]),
+                    f"{key} query count grows with the dataset:\n"
+                    f"{small} devices:\n{format_queries(by_size[small]['queries'])}\n"
+                    f"{large} devices:\n{format_queries(by_size[large]['queries'])}",
+                )
+
+        path = os.environ.get("QUERY_BUDGET_REPORT")
+        if path:
+            with open(path, "w") as file:
+                json.dump(
+                    {
+                        key: {
+                            size: {
+                                "status": result["status"],
+                                "queries": len(result["queries"]),
+                                "time_ms": get_query_time(result["queries"]),
+                            }
+                            for size, result in by_size.items()
+                        }
+                        for key, by_size in report.items()
+                    },
+                    file,
+                    indent=2,
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
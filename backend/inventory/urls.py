@@ -5,6 +5,7 @@ from .views import (
     DeviceViewSet,
     DonorViewSet,
     LocationViewSet,
+    ShippingViewSet,
     batch_operations,
     generate_mock_data,
 )
@@ -13,6 +14,7 @@ router = DefaultRouter()
 router.register(r"devices", DeviceViewSet, basename="device")
 router.register(r"locations", LocationViewSet, basename="location")
 router.register(r"donors", DonorViewSet, basename="donor")
+router.register(r"shipping", ShippingViewSet, basename="shipping")
 
 urlpatterns = [
     path("", include(router.urls)),
@@ -1,26 +1,98 @@
+import csv
+import uuid
+from datetime import date, timedelta
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, status, viewsets
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework import filters, serializers, status, viewsets
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 
+from backend.authen.authentication import authenticate_request
 from backend.authen.permissions import IsBlacklisted
-from backend.inventory.helpers.batch_operations import get_model, validate_ids
+from backend.inventory.helpers.batch_operations import (
+    bulk_edit,
+    get_model,
+    validate_ids,
+)
+from backend.inventory.helpers.device_import import (
+    DeviceImporter,
+    get_import_format,
+    iter_rows,
+)
+from backend.inventory.helpers.export import EXPORT_CONTENT_TYPES, stream_export
 from backend.inventory.helpers.mock_data import create_mock_data
+from backend.inventory.helpers.shipping import dispatch_devices, mark_arrived
 from backend.users.decorators import permission_required
 
 from .error_utils import handle_exception
-from .mixins import SearchAndLimitMixin
-from .models import Device, Donor, Location, User
-from .pagination import CustomPagination
-from .serializers import DeviceSerializer, DonorSerializer, WarehouseSerializer
+from .events import flush_events, recording_events
+from .labels import stream_label_sheets
+from .mixins import (
+    CachedListMixin,
+    ConditionalGetMixin,
+    QueryPlanMixin,
+    SearchAndLimitMixin,
+)
+from .models import Device, DeviceEvent, Donor, Location, Shipping, User
+from .pagination import CustomPagination, KeysetPagination, OptionalPagination
+from .rollups import (
+    GRANULARITIES,
+    HISTORY_DIMENSIONS,
+    SUMMARY_DIMENSIONS,
+    batched_deltas,
+    get_history_report,
+    get_inventory_summary,
+)
+from .scanning import MAX_SCAN_CODES, resolve_codes
+from .serializers import (
+    DeviceEventSerializer,
+    DeviceSerializer,
+    DispatchSerializer,
+    DonorSerializer,
+    ShippingSerializer,
+    WarehouseSerializer,
+)
+
+
+def get_group_by(request, dimensions):
+    """
+    Returns the dimensions listed by `?group_by=`, all of `dimensions` if it
+    is missing or empty, or None if it lists unknown or repeated ones.
+    """
+    group_by = request.query_params.get("group_by")
+    if not group_by:
+        return list(dimensions)
+    group_by = [name.strip() for name in group_by.split(",") if name.strip()]
+    if set(group_by) - set(dimensions) or len(set(group_by)) != len(group_by):
+        return None
+    return group_by
+
+
+def recording(request, source):
+    """
+    Records `source` and the user of `request` with the device change log
+    events of the writes in the block, see events.py.
+    """
+    authenticated = authenticate_request(request)
+    return recording_events(source, authenticated and authenticated[1].get("user_id"))
 
 
 @permission_classes([IsBlacklisted])
-class DeviceViewSet(SearchAndLimitMixin, viewsets.ModelViewSet):
+class DeviceViewSet(
+    ConditionalGetMixin,
+    CachedListMixin,
+    SearchAndLimitMixin,
+    QueryPlanMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Device.objects.all()
     serializer_class = DeviceSerializer
     serializer_class = DeviceSerializer
     pagination_class = CustomPagination
+    count_strategy = "estimated"
     filter_backends = [
         DjangoFilterBackend,
         filters.OrderingFilter,
@@ -94,11 +166,289 @@ class DeviceViewSet(SearchAndLimitMixin, viewsets.ModelViewSet):
         self.perform_destroy(instance)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    def perform_create(self, serializer):
+        with recording(self.request, "api"):
+            super().perform_create(serializer)
+
+    def perform_update(self, serializer):
+        with recording(self.request, "api"):
+            super().perform_update(serializer)
+
+    def perform_destroy(self, instance):
+        with recording(self.request, "api"):
+            super().perform_destroy(instance)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        url_name="import",
+        parser_classes=[MultiPartParser],
+    )
+    @permission_required(["bulkUploadDevices"])
+    def import_devices(self, request):
+        """
+        Imports devices from an uploaded CSV or JSONL `file`, streamed row by
+        row. Donors and locations are referenced by name. Responds with the
+        number of devices created and the errors of the rows that failed.
+        """
+        uploaded_file = request.FILES.get("file")
+        if uploaded_file is None:
+            return Response(
+                {"error": "Request must contain a CSV or JSONL 'file'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        file_format = get_import_format(uploaded_file)
+        if file_format is None:
+            return Response(
+                {"error": "Unsupported file format, expected CSV or JSONL."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        _, token = authenticate_request(request)
+        importer = DeviceImporter(created_by_id=token.get("user_id"))
+        try:
+            with recording_events("import", token.get("user_id")):
+                report = importer.run(iter_rows(uploaded_file, file_format))
+        except (UnicodeDecodeError, csv.Error) as e:
+            # Chunks before the unreadable line have been written
+            return Response(
+                {"error": "Could not read the file.", "details": str(e)}
+                | importer.get_report(),
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except Exception as e:
+            return handle_exception(e)
+
+        return Response(
+            report,
+            status=(
+                status.HTTP_201_CREATED
+                if report["created"]
+                else status.HTTP_400_BAD_REQUEST
+            ),
+        )
+
+    @action(detail=False, methods=["get"], url_path="export", url_name="export")
+    @permission_required(["readDevices"])
+    def export(self, request):
+        """
+        Streams every device matching the list filters and `search` as CSV or
+        JSONL, selected with `?file_format=` (CSV by default).
+        """
+        file_format = request.query_params.get("file_format", "csv")
+        if file_format not in EXPORT_CONTENT_TYPES:
+            return Response(
+                {"error": "Unsupported file format, expected csv or jsonl."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            stream_export(queryset, file_format),
+            content_type=EXPORT_CONTENT_TYPES[file_format],
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="devices.{file_format}"'
+        )
+        return response
+
+    @action(detail=False, methods=["get", "post"], url_path="scan", url_name="scan")
+    @permission_required(["scanDevices"])
+    def scan(self, request):
+        """
+        Resolves scanned device UUIDs, serial numbers or MAC ids.
+
+        GET `?code=` returns a single device; POST `{"codes": [...]}` returns
+        one result per code, with `device` set to null for unknown codes.
+        """
+        if request.method == "GET":
+            code = request.query_params.get("code", "").strip()
+            if not code:
+                return Response(
+                    {"error": "Request must contain a 'code' to scan."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            [(code, device)] = resolve_codes([code])
+            if device is None:
+                return Response(
+                    {"error": f"No device matches {code}."},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            return Response(device, status=status.HTTP_200_OK)
+
+        codes = request.data.get("codes")
+        if not codes or not isinstance(codes, list):
+            return Response(
+                {"error": "Request must contain a list of 'codes' to scan."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(codes) > MAX_SCAN_CODES:
+            return Response(
+                {"error": f"At most {MAX_SCAN_CODES} codes can be scanned at once."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            {
+                "results": [
+                    {"code": code, "device": device}
+                    for code, device in resolve_codes(codes)
+                ]
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=["get"], url_path="labels", url_name="labels")
+    @permission_required(["generateQRCodes"])
+    def labels(self, request):
+        """
+        Streams printable QR code label sheets for every device matching the
+        list filters and `search`, one sheet at a time.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        return StreamingHttpResponse(
+            stream_label_sheets(queryset), content_type="text/html; charset=utf-8"
+        )
+
+    @action(detail=False, methods=["get"], url_path="summary", url_name="summary")
+    @permission_required(["readDevices"])
+    def summary(self, request):
+        """
+        Returns the number and total value of devices per end location, type
+        and physical condition, read from the rollups in O(groups).
+
+        `?group_by=` takes a comma separated subset of the three dimensions;
+        `?end_location=`, `?type=` and `?physical_condition=` filter groups.
+        """
+        group_by = get_group_by(request, SUMMARY_DIMENSIONS)
+        if group_by is None:
+            return Response(
+                {
+                    "error": "'group_by' must list distinct dimensions of "
+                    f"{', '.join(SUMMARY_DIMENSIONS)}."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        filters = {
+            name: request.query_params.get(name)
+            for name in ("type", "physical_condition")
+        }
+        end_location = request.query_params.get("end_location")
+        if end_location is not None:
+            try:
+                filters["end_location"] = int(end_location)
+            except ValueError:
+                return Response(
+                    {"error": "'end_location' must be a location id."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        return Response(
+            get_inventory_summary(group_by, **filters), status=status.HTTP_200_OK
+        )
+
+    @action(detail=False, methods=["get"], url_path="history", url_name="history")
+    @permission_required(["readDevices"])
+    def history(self, request):
+        """
+        Returns the devices received and donated per `?granularity=` period
+        (day, week or month) from `?start=` to `?end=`, ISO dates defaulting
+        to the last year, read from the history rollups.
+
+        `?group_by=` takes a comma separated subset of donor and type;
+        `?donor=` and `?type=` filter the devices reported on.
+        """
+        granularity = request.query_params.get("granularity", "month")
+        if granularity not in GRANULARITIES:
+            return Response(
+                {"error": f"'granularity' must be one of {', '.join(GRANULARITIES)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            end = date.fromisoformat(
+                request.query_params.get("end", timezone.localdate().isoformat())
+            )
+            start = date.fromisoformat(
+                request.query_params.get(
+                    "start", (end - timedelta(days=365)).isoformat()
+                )
+            )
+            donor = request.query_params.get("donor")
+            donor = None if donor is None else int(donor)
+        except ValueError:
+            return Response(
+                {
+                    "error": "'start' and 'end' must be ISO dates and 'donor' "
+                    "a donor id."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if start > end:
+            return Response(
+                {"error": "'start' must not be after 'end'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        group_by = get_group_by(request, HISTORY_DIMENSIONS)
+        if group_by is None:
+            return Response(
+                {
+                    "error": "'group_by' must list distinct dimensions of "
+                    f"{', '.join(HISTORY_DIMENSIONS)}."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(
+            get_history_report(
+                granularity,
+                start,
+                end,
+                group_by,
+                donor=donor,
+                type=request.query_params.get("type"),
+            ),
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=True, methods=["get"], url_path="events", url_name="events")
+    @permission_required(["readDevices"])
+    def events(self, request, pk=None):
+        """
+        Returns the change log of the device, newest first, in keyset pages
+        linked by `next` and `previous`. Deleted devices keep their log.
+        """
+        try:
+            device_id = uuid.UUID(pk)
+        except ValueError:
+            return Response(
+                {"error": "Not a device id."}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        # Events of this process's committed writes are still buffered
+        flush_events()
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(
+            DeviceEvent.objects.filter(device_id=device_id).order_by("-id"), request
+        )
+        return paginator.get_paginated_response(
+            DeviceEventSerializer(page, many=True).data
+        )
+
 
 @permission_classes([IsBlacklisted])
-class LocationViewSet(SearchAndLimitMixin, viewsets.ModelViewSet):
+class LocationViewSet(
+    ConditionalGetMixin,
+    CachedListMixin,
+    SearchAndLimitMixin,
+    QueryPlanMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Location.objects.all()
     serializer_class = WarehouseSerializer
+    pagination_class = OptionalPagination
     filter_backends = [
         DjangoFilterBackend,
         filters.OrderingFilter,
@@ -159,9 +509,16 @@ class LocationViewSet(SearchAndLimitMixin, viewsets.ModelViewSet):
 
 
 @permission_classes([IsBlacklisted])
-class DonorViewSet(SearchAndLimitMixin, viewsets.ModelViewSet):
+class DonorViewSet(
+    ConditionalGetMixin,
+    CachedListMixin,
+    SearchAndLimitMixin,
+    QueryPlanMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Donor.objects.all()
     serializer_class = DonorSerializer
+    pagination_class = OptionalPagination
     filter_backends = [
         DjangoFilterBackend,
         filters.OrderingFilter,
@@ -214,22 +571,158 @@ class DonorViewSet(SearchAndLimitMixin, viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+@permission_classes([IsBlacklisted])
+class ShippingViewSet(QueryPlanMixin, viewsets.ModelViewSet):
+    queryset = Shipping.objects.all()
+    serializer_class = ShippingSerializer
+    pagination_class = CustomPagination
+    filter_backends = [
+        DjangoFilterBackend,
+        filters.OrderingFilter,
+    ]
+    filterset_fields = {
+        "destination": ["exact"],
+        "destination__name": ["exact", "icontains"],
+        "arrived": ["exact"],
+        "date_shipped": ["exact", "gte", "lte"],
+        "date_delivered": ["exact", "gte", "lte"],
+        "tracking_identifier": ["exact"],
+    }
+    ordering_fields = ["shipping_id", "date_shipped", "date_delivered"]
+    ordering = ["-date_shipped", "-shipping_id"]
+
+    @permission_required(["manageShipping"])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @permission_required(["manageShipping"])
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @permission_required(["manageShipping"])
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    @permission_required(["manageShipping"])
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    @permission_required(["manageShipping"])
+    def partial_update(self, request, *args, **kwargs):
+        return super().partial_update(request, *args, **kwargs)
+
+    @permission_required(["manageShipping"])
+    def destroy(self, request, *args, **kwargs):
+        instance = self.get_object()
+        serializer = self.get_serializer(instance)
+        self.perform_destroy(instance)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    # Not named `dispatch`, which would shadow APIView.dispatch
+    @action(detail=False, methods=["post"], url_path="dispatch", url_name="dispatch")
+    @permission_required(["manageShipping"])
+    def dispatch_devices(self, request):
+        """
+        Creates a shipment carrying the listed `devices` in one call.
+        """
+        serializer = DispatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        shipment_data = dict(serializer.validated_data)
+        device_ids = shipment_data.pop("devices")
+
+        try:
+            with recording(request, "shipping"):
+                shipment, missing = dispatch_devices(shipment_data, device_ids)
+        except Exception as e:
+            return handle_exception(e)
+        if missing:
+            return Response(
+                {
+                    "error": "Some devices do not exist.",
+                    "missing": [str(pk) for pk in missing],
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            {**ShippingSerializer(shipment).data, "device_count": len(device_ids)},
+            status=status.HTTP_201_CREATED,
+        )
+
+    def already_arrived(self):
+        return Response(
+            {"error": "The shipment has already arrived."},
+            status=status.HTTP_409_CONFLICT,
+        )
+
+    @action(detail=True, methods=["post"], url_path="arrive", url_name="arrive")
+    @permission_required(["manageShipping"])
+    def arrive(self, request, pk=None):
+        """
+        Marks the shipment as delivered on `date_delivered` (today by default)
+        and moves its devices to the shipment's destination.
+        """
+        shipment = self.get_object()
+        if shipment.arrived:
+            return self.already_arrived()
+        date_field = serializers.DateField(required=False, allow_null=True)
+        try:
+            date_delivered = date_field.run_validation(
+                request.data.get("date_delivered")
+            )
+        except serializers.ValidationError as e:
+            return Response(
+                {"date_delivered": e.detail}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            with recording(request, "shipping"):
+                moved = mark_arrived(shipment, date_delivered)
+        except Exception as e:
+            return handle_exception(e)
+        if moved is None:
+            return self.already_arrived()
+        return Response(
+            {**ShippingSerializer(shipment).data, "devices_moved": moved},
+            status=status.HTTP_200_OK,
+        )
+
+
+# Serializers validating batch edits, per model that supports batch operations
+BATCH_SERIALIZERS = {
+    Device: DeviceSerializer,
+    Donor: DonorSerializer,
+    Location: WarehouseSerializer,
+}
+
+# Permissions of batch operations, the ones the model's viewset requires
+BATCH_PERMISSIONS = {
+    (Device, "PATCH"): "editDevices",
+    (Device, "DELETE"): "deleteDevices",
+    (Donor, "PATCH"): "manageDonors",
+    (Donor, "DELETE"): "manageDonors",
+    (Location, "PATCH"): "manageWarehouses",
+    (Location, "DELETE"): "manageWarehouses",
+}
+
+
 @api_view(["PATCH", "DELETE"])
 @permission_classes([IsBlacklisted])
 def batch_operations(request):
-    model_name = "devices." + request.query_params.get("model").capitalize()
+    model_name = "inventory." + request.query_params.get("model", "").capitalize()
     model = get_model(model_name)
 
-    if model is None:
+    if model not in BATCH_SERIALIZERS:
         return Response(
             {"error": f"Invalid model specified. {model_name}"},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    if request.method == "PATCH":
-        return batch_edit(request, model)
-    elif request.method == "DELETE":
-        return batch_delete(request, model)
+    operation = batch_edit if request.method == "PATCH" else batch_delete
+    operation = permission_required([BATCH_PERMISSIONS[model, request.method]])(
+        operation
+    )
+    with recording(request, "batch"):
+        return operation(request, model)
 
 
 def batch_edit(request, model):
@@ -240,25 +733,24 @@ def batch_edit(request, model):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    if any(not isinstance(data, dict) or "id" not in data for data in data_list):
+        return Response(
+            {"error": "Each object must contain an 'id' field."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
     try:
-        updated_count = 0
-        for data in data_list:
-            if "id" not in data:
-                return Response(
-                    {"error": "Each object must contain an 'id' field."},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            obj_id = data.pop("id")
-            obj = model.objects.filter(pk=obj_id).first()
-            if obj:
-                for key, value in data.items():
-                    setattr(obj, key, value)
-                obj.save()
-                updated_count += 1
+        results = bulk_edit(model, BATCH_SERIALIZERS[model], data_list)
+        updated_count = sum(result["status"] == "updated" for result in results)
+        # Nothing is written when another writer took a unique value
+        conflict = any(result["status"] == "conflict" for result in results)
 
         return Response(
-            {"message": f"{updated_count} records updated successfully."},
-            status=status.HTTP_200_OK,
+            {
+                "message": f"{updated_count} records updated successfully.",
+                "results": results,
+            },
+            status=status.HTTP_409_CONFLICT if conflict else status.HTTP_200_OK,
         )
     except Exception as e:
         return handle_exception(e)
@@ -273,7 +765,9 @@ def batch_delete(request, model):
         )
 
     try:
-        deleted_count, _ = model.objects.filter(pk__in=ids).delete()
+        # Rollup deltas of the deleted devices are applied once per group
+        with batched_deltas():
+            deleted_count, _ = model.objects.filter(pk__in=ids).delete()
         return Response(
             {"message": f"{deleted_count} records deleted successfully."},
             status=status.HTTP_200_OK,
@@ -282,21 +776,35 @@ def batch_delete(request, model):
         return handle_exception(e)
 
 
+# Larger datasets are generated with the generate_dataset command
+MAX_MOCK_ROWS = 1000
+
+
 @api_view(["POST"])
+@permission_classes([IsBlacklisted])
+@permission_required(["bulkUploadDevices"])
 def generate_mock_data(request):
-    try:
-        num_locations = request.data.get("num_locations", 5)
-        num_donors = request.data.get("num_donors", 10)
-        num_devices = request.data.get("num_devices", 50)
-        num_shipping = request.data.get("num_shipping", 20)
+    counts = {}
+    for name, default in (
+        ("num_locations", 5),
+        ("num_donors", 10),
+        ("num_devices", 50),
+        ("num_shipping", 20),
+    ):
+        try:
+            counts[name] = int(request.data.get(name, default))
+        except (TypeError, ValueError):
+            counts[name] = -1
+        if not 0 <= counts[name] <= MAX_MOCK_ROWS:
+            return Response(
+                {"error": f"'{name}' must be between 0 and {MAX_MOCK_ROWS}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
+    try:
         # Generate mock data
-        result = create_mock_data(
-            num_locations=num_locations,
-            num_donors=num_donors,
-            num_devices=num_devices,
-            num_shipping=num_shipping,
-        )
+        with recording(request, "mock_data"):
+            result = create_mock_data(**counts)
 
         return Response(
             {"message": "Mock data generated successfully", **result},
@@ -55,6 +55,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "backend.instrumentation.ServerTimingMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -102,7 +103,44 @@ HAYSTACK_CONNECTIONS = {
     },
 }
 
-HAYSTACK_SIGNAL_PROCESSOR = "haystack.signals.RealtimeSignalProcessor"
+# Index updates are queued and written by the drain_search_queue command,
+# see backend/inventory/search_queue.py
+HAYSTACK_SIGNAL_PROCESSOR = "backend.inventory.search_queue.QueuedSignalProcessor"
+
+# "haystack" searches the Haystack index above, "database" the database's own
+# full-text engine, see backend/inventory/db_search.py
+INVENTORY_SEARCH = {
+    "BACKEND": "haystack",
+}
+
+# Device labels, see backend/inventory/labels.py
+INVENTORY_LABELS = {
+    "QR_CACHE_DIR": os.path.join(BASE_DIR, "qr_cache"),
+}
+
+# Tests run with a temporary METRICS["DIRECTORY"] and search index, see
+# backend/test_runner.py
+TEST_RUNNER = "backend.test_runner.TestRunner"
+
+# Server-Timing headers and the /metrics endpoint, see
+# backend/instrumentation.py
+METRICS = {
+    "DIRECTORY": os.path.join(BASE_DIR, "metrics"),
+    "ALLOWED_IPS": ["127.0.0.1", "::1"],
+}
+
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "backend.instrumentation.TimedJSONRenderer",
+        "backend.instrumentation.TimedBrowsableAPIRenderer",
+    ],
+}
+
+SEARCH_QUEUE = {
+    "BATCH_SIZE": 500,
+    "POLL_INTERVAL": 1,
+    "LOCK_FILE": os.path.join(BASE_DIR, "whoosh_index.lock"),
+}
 
 
 # JWT settings
@@ -115,6 +153,24 @@ SIMPLE_JWT = {
     "USER_ID_CLAIM": "user_id",
 }
 
+# Token revocation
+# Valid/revoked states of access tokens are cached in-process, see
+# backend/authen/revocation.py
+TOKEN_REVOCATION = {
+    "CACHE_ALIAS": "auth",
+    "VALID_TIMEOUT": 60,
+    "REVOKED_TIMEOUT": 3600,
+}
+
+# Permission claims
+# Access tokens carry the user's permissions as a bitmask, see
+# backend/users/claims.py
+PERMISSION_CLAIMS = {
+    "ENABLED": True,
+    "CACHE_ALIAS": "auth",
+    "VERSION_TIMEOUT": 60,
+}
+
 AUTHENTICATION_BACKENDS = [
     "django.contrib.auth.backends.ModelBackend",
 ]
@@ -144,6 +200,48 @@ DATABASES = (
     }
 )
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "auth": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "auth",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    # Generation counters and derived data, see backend/inventory/generations.py.
+    # Process-local, which turns list ETags and cached lists off; use a cache
+    # shared by the workers (e.g. Redis) to enable them.
+    "inventory": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "inventory",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    # List responses, see backend/inventory/response_cache.py
+    "responses": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "responses",
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
+}
+
+# List response cache, see backend/inventory/response_cache.py
+INVENTORY_RESPONSE_CACHE = {
+    "ENABLED": True,
+    "CACHE_ALIAS": "responses",
+    "TIMEOUT": 300,
+}
+
+# Pagination counts, see backend/inventory/counting.py
+INVENTORY_PAGINATION = {
+    "COUNT_STRATEGY": "cached",
+    "COUNT_CACHE_TIMEOUT": 300,
+    "ESTIMATE_THRESHOLD": 10000,
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
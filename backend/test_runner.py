@@ -0,0 +1,64 @@
+"""
+The test runner, see ``TEST_RUNNER`` in settings.py.
+
+Tests write through the same code as the server, so the run points
+``METRICS["DIRECTORY"]`` and the Haystack index at temporary directories
+instead of adding to the metrics and the search index of the development
+server. Tests that rebuild or clear the index use `temporary_search_index`
+for an index of their own.
+"""
+
+import os
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from haystack import connections
+
+
+@contextmanager
+def temporary_search_index():
+    """
+    Points every Haystack connection at an index in a temporary directory
+    for the duration of the block.
+
+    :return: The directory.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        connections_info = {
+            alias: {**options, "PATH": os.path.join(directory, alias)}
+            for alias, options in settings.HAYSTACK_CONNECTIONS.items()
+        }
+        previous = connections.connections_info
+        with override_settings(HAYSTACK_CONNECTIONS=connections_info):
+            # Haystack reads the setting once, when it is imported
+            connections.connections_info = connections_info
+            for alias in connections_info:
+                connections.reload(alias)
+            try:
+                yield directory
+            finally:
+                connections.connections_info = previous
+                for alias in previous:
+                    connections.reload(alias)
+
+
+@contextmanager
+def temporary_metrics_directory():
+    with tempfile.TemporaryDirectory() as directory:
+        with override_settings(METRICS={**settings.METRICS, "DIRECTORY": directory}):
+            yield directory
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.temporary_directories = ExitStack()
+        self.temporary_directories.enter_context(temporary_metrics_directory())
+        self.temporary_directories.enter_context(temporary_search_index())
+
+    def teardown_test_environment(self, **kwargs):
+        self.temporary_directories.close()
+        super().teardown_test_environment(**kwargs)
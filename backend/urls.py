@@ -18,9 +18,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
+from backend.instrumentation import metrics
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("authen/", include("backend.authen.urls")),
     path("inventory/", include("backend.inventory.urls")),
     path("users/", include("backend.users.urls")),
+    path("metrics", metrics, name="metrics"),
 ]
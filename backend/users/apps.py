@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class UsersConfig(AppConfig):
+    name = "backend.users"
+    label = "users"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -3,6 +3,10 @@ from functools import wraps
 from django.http import HttpResponseForbidden
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from backend.authen.authentication import authenticate_request
+
+from .claims import claims_grant, has_current_claims
+from .helpers import encode_permissions
 from .models import User
 
 
@@ -20,6 +24,7 @@ def get_user_from_token(token):
 def permission_required(permissions):
     if isinstance(permissions, str):
         permissions = [permissions]
+    required_mask = encode_permissions(permissions)
 
     def decorator(view_func):
         @wraps(view_func)
@@ -32,16 +37,24 @@ def permission_required(permissions):
             else:
                 request = self_or_request
 
-            jwt_auth = JWTAuthentication()
             try:
-                auth_result = jwt_auth.authenticate(request)
+                auth_result = authenticate_request(request)
             except Exception as e:
                 return HttpResponseForbidden(f"Access denied: {e}")
 
             if auth_result is None:
                 return HttpResponseForbidden("Access denied: Invalid or missing token.")
 
-            user, _ = auth_result
+            user, token = auth_result
+
+            # Tokens with up-to-date permission claims are checked without
+            # loading the user
+            if has_current_claims(token):
+                if not claims_grant(token, required_mask):
+                    return HttpResponseForbidden(
+                        "Access denied: Insufficient permissions."
+                    )
+                return view_func(self_or_request, *args, **kwargs)
 
             # Superuser check
             if user.is_superuser:
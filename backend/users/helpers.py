@@ -1,10 +1,23 @@
 from .utils import allPermissions
 
+# Bit assigned to each permission in token permission claims
+PERMISSION_BITS = {perm: 1 << index for index, perm in enumerate(allPermissions)}
+
 
 def getAllPermissions():
     return allPermissions
 
 
+def encode_permissions(permissions):
+    """
+    Encodes a list of permissions as a bitmask.
+    """
+    mask = 0
+    for perm in permissions:
+        mask |= PERMISSION_BITS[perm]
+    return mask
+
+
 def getValidPermissions(request_data):
     permissions = request_data.get("permissions")
     return permissions
@@ -23,4 +36,6 @@ def updatePermissions(instance, new_permissions, operation="add"):
         instance.permissions = []
     else:
         raise ValueError("Invalid operation.")
+    # Invalidates permission claims in previously issued tokens
+    instance.permissions_version += 1
     instance.save()
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2024-08-14 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_user_is_active_user_is_staff"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="permissions_version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
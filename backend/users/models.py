@@ -94,6 +94,12 @@ class User(AbstractBaseUser, PermissionsMixin):
         last_name (str): The last name of the user.
             - Constraints:
                 - Must be between 2 and 30 characters in length.
+
+        permissions_version (int): Incremented whenever the permissions change.
+            - Constraints:
+                - Used to detect stale permission claims in access tokens.
+                - Incremented on save when `permissions`, `is_superuser` or
+                  `is_active` differ from the stored values.
     """
 
     username = models.CharField(
@@ -123,6 +129,7 @@ class User(AbstractBaseUser, PermissionsMixin):
         validators=[MinLengthValidator(2)],
     )
     permissions = models.JSONField(default=list, blank=True)
+    permissions_version = models.PositiveIntegerField(default=0)
     is_superuser = models.BooleanField(default=False)
     is_staff = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
@@ -152,11 +159,37 @@ class User(AbstractBaseUser, PermissionsMixin):
         except ValidationError as e:
             raise ValidationError({"password": e.message})
 
+    # Fields whose changes make the permission claims of issued tokens stale
+    RIGHTS_FIELDS = ("permissions", "is_superuser", "is_active")
+
     def save(self, *args, **kwargs):
         if not self.pk:
             self.password = make_password(self.password)
         self.clean()
+        update_fields = kwargs.get("update_fields")
+        if self.pk and (
+            update_fields is None or set(update_fields) & set(self.RIGHTS_FIELDS)
+        ):
+            self.bump_permissions_version_if_changed()
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "permissions_version"}
         super().save(*args, **kwargs)
 
+    def bump_permissions_version_if_changed(self):
+        """
+        Increments `permissions_version` if the rights differ from the
+        stored ones and it was not incremented yet, as `updatePermissions`
+        does.
+        """
+        stored = (
+            User.objects.filter(pk=self.pk)
+            .values_list("permissions_version", *self.RIGHTS_FIELDS)
+            .first()
+        )
+        if stored is None or stored[0] != self.permissions_version:
+            return
+        if list(stored[1:]) != [getattr(self, name) for name in self.RIGHTS_FIELDS]:
+            self.permissions_version += 1
+
     def __str__(self):
         return self.username
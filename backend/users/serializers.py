@@ -27,16 +27,17 @@ from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from django.utils import timezone
-from rest_framework import serializers, status
-from rest_framework.response import Response
+from rest_framework import serializers
 from rest_framework_simplejwt.tokens import RefreshToken
 
 from backend.authen.models import JWTToken
+from backend.instrumentation import TimedSerializerMixin
 
+from .claims import add_permission_claims
 from .models import User
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     permissions = serializers.ListField(child=serializers.CharField(), required=False)
 
     class Meta:
@@ -74,9 +75,9 @@ class UserPasswordSerializer(serializers.ModelSerializer):
             message="Password must be at least 10 characters long and include at least one digit, one special character, and one uppercase letter.",
         )
         try:
-            password_validator(self.password)
+            password_validator(value)
         except ValidationError as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            raise serializers.ValidationError(e.messages)
         return value
 
 
@@ -95,7 +96,9 @@ class UserLoginSerializer(serializers.Serializer):
             )
 
         refresh = RefreshToken.for_user(user)
-        access_token = str(refresh.access_token)
+        access = refresh.access_token
+        add_permission_claims(access, user)
+        access_token = str(access)
 
         expires_at = timezone.now() + settings.SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"]
 
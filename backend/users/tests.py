@@ -0,0 +1,121 @@
+"""
+Unit tests for permission checks based on access token claims.
+
+Test Cases:
+- test_claims_are_checked_without_queries: Tests that a token with current
+  permission claims is authorized without touching the database.
+- test_missing_permission_is_denied: Tests that claims without the required
+  permission are rejected.
+- test_permission_update_invalidates_claims: Tests that updatePermissions
+  makes previously issued claims stale.
+- test_saved_rights_invalidate_claims: Tests that saving changed permissions
+  or demoting a superuser makes previously issued claims stale.
+- test_deactivated_user_is_rejected: Tests that tokens of deactivated users
+  fail IsBlacklisted although their claims skip the user lookup.
+"""
+
+import unittest
+
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.test import TestCase
+from rest_framework import status
+from rest_framework.test import APIRequestFactory
+
+from backend.authen.permissions import IsBlacklisted
+from backend.users.decorators import permission_required
+from backend.users.helpers import updatePermissions
+from backend.users.models import User
+from backend.users.serializers import UserLoginSerializer
+
+
+@permission_required(["readDevices"])
+def read_devices_view(request):
+    return HttpResponse("ok")
+
+
+class PermissionClaimsTests(TestCase):
+    def setUp(self):
+        caches["auth"].clear()
+        self.user = User.objects.create(
+            username="reader",
+            email="reader@example.com",
+            password="Str0ng!Password",
+            role="staff",
+            first_name="Read",
+            last_name="Er",
+            permissions=["readDevices"],
+        )
+        self.access_token = self.login()
+
+    def login(self):
+        serializer = UserLoginSerializer(
+            data={"username": "reader", "password": "Str0ng!Password"}
+        )
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data["tokens"]["access_token"]
+
+    def request(self, access_token):
+        return APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {access_token}")
+
+    def test_claims_are_checked_without_queries(self):
+        read_devices_view(self.request(self.access_token))
+
+        with self.assertNumQueries(0):
+            response = read_devices_view(self.request(self.access_token))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_missing_permission_is_denied(self):
+        view = permission_required(["deleteDevices"])(read_devices_view)
+
+        response = view(self.request(self.access_token))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_permission_update_invalidates_claims(self):
+        updatePermissions(self.user, ["readDevices"], operation="remove")
+
+        response = read_devices_view(self.request(self.access_token))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_saved_rights_invalidate_claims(self):
+        self.user.permissions = []
+        self.user.save()
+
+        response = read_devices_view(self.request(self.access_token))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_superuser = True
+        self.user.save()
+        superuser_token = self.login()
+        self.assertEqual(
+            read_devices_view(self.request(superuser_token)).status_code,
+            status.HTTP_200_OK,
+        )
+
+        self.user.is_superuser = False
+        self.user.permissions = []
+        self.user.save()
+
+        response = read_devices_view(self.request(superuser_token))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertTrue(
+            IsBlacklisted().has_permission(self.request(self.access_token), None)
+        )
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertFalse(
+            IsBlacklisted().has_permission(self.request(self.access_token), None)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
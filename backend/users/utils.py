@@ -1,3 +1,4 @@
+# Order defines the bit of each permission in token claims; only append.
 allPermissions = [
     "readDevices",
     "createDevices",
@@ -8,4 +9,5 @@ allPermissions = [
     "manageWarehouses",
     "manageDonors",
     "generateQRCodes",
+    "manageShipping",
 ]
@@ -4,8 +4,8 @@ from rest_framework import filters, generics, status, viewsets
 from rest_framework.decorators import action, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from backend.authen.authentication import authenticate_request
 from backend.authen.permissions import IsBlacklisted
 from backend.inventory.pagination import CustomPagination
 
@@ -60,9 +60,7 @@ class UserPasswordUpdateView(generics.UpdateAPIView):
     serializer_class = UserPasswordSerializer
 
     def get_object(self):
-        jwt_auth = JWTAuthentication()
-        request = self.request
-        auth_result = jwt_auth.authenticate(request)
+        auth_result = authenticate_request(self.request)
         if auth_result is None:
             return Response(
                 {"Error: Missing authentication token"},